@@ -71,7 +71,7 @@ def add_payment_api_routes(app):
                 session_data = payment_manager.get_payment_session(session_id)
                 if session_data and session_data.get('order_id'):
                     # Update order to completed status
-                    from models import get_db
+                    from models import get_db, sales_rollup
                     conn = get_db()
                     cur = conn.cursor()
                     try:
@@ -81,6 +81,7 @@ def add_payment_api_routes(app):
                             WHERE id = %s
                         """, (session_data['md5_hash'], session_data['order_id']))
                         conn.commit()
+                        sales_rollup.refresh_orders([session_data['order_id']])
                     finally:
                         cur.close()
                         conn.close()
@@ -366,7 +367,7 @@ def add_payment_api_routes(app):
             relative_path = f"payment_screenshots/{filename}"
             
             # Update order status to completed
-            from models import get_db
+            from models import get_db, sales_rollup
             conn = get_db()
             cur = conn.cursor()
             
@@ -381,6 +382,7 @@ def add_payment_api_routes(app):
                 """, (order_id,))
                 
                 conn.commit()
+                sales_rollup.refresh_orders([order_id])
                 
                 return jsonify({
                     'success': True,
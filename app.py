@@ -1,17 +1,29 @@
-from flask import Flask, jsonify, request, redirect, url_for, render_template, session, flash, get_flashed_messages, make_response
+from flask import Flask, jsonify, request, redirect, url_for, render_template, session, flash, get_flashed_messages, make_response, send_file
 from auth import auth_bp
 
 app = Flask(__name__)
 
 # Auth blueprint will be registered later with /auth prefix
 
-from flask_mysqldb import MySQL
 from config import Config
 from datetime import datetime, timedelta
-from models import Product, Customer, Order, Supplier, Report, db, Category, PreOrder, Notification, generate_slug, PreOrderPayment, get_db
+from models import Product, Customer, Order, Supplier, Report, db, Category, PreOrder, Notification, VolumeDiscount, generate_slug, PreOrderPayment, get_db, request_db, invalidate_catalog_cache, schema, stock_reservations, idempotency_store, sales_rollup, open_connection, export_jobs
 import os
 from werkzeug.utils import secure_filename
 from utils.bakong_payment import BakongQRGenerator, PaymentSession
+from utils import checkout_engine
+from utils.stock_reservations import ReservationSweeper, restore_quantity
+from utils.idempotency import idempotent
+from utils.keyset import next_cursor, InvalidCursorError
+from utils.sales_analytics import discount_insights
+from utils.csv_export import stream_query, csv_chunks, csv_response, EmptyExport
+from utils.jobs import UnknownJobKind, job_status
+from itertools import groupby
+
+try:
+    import pdfkit  # optional: server-side PDF exports fall back to CSV without it
+except ImportError:
+    pdfkit = None
 
 
 # QR Code Cache for faster generation
@@ -54,7 +66,8 @@ def pregenerate_common_qr_codes():
     app.logger.info(f"Pre-generated {len(common_amounts)} common QR codes")
 
 # Initialize extensions without circular imports
-mysql = MySQL()
+# mysql.connection is the same request-scoped connection that models.get_db() returns
+mysql = request_db
 
 def create_app():
     app = Flask(__name__, static_folder='static')
@@ -76,6 +89,33 @@ def create_app():
     from models import db
     db.init_app(app)
     
+    # Introspect optional columns once instead of probing information_schema per query
+    try:
+        with app.app_context():
+            schema.load()
+            missing = [f"{table}.{column}" for table, columns in schema.snapshot().items()
+                       for column, present in columns.items() if not present]
+            if missing:
+                app.logger.warning(f"Optional columns not present (migrations not run): {', '.join(missing)}")
+    except Exception as e:
+        app.logger.warning(f"Could not introspect database schema at startup: {e}")
+
+    # Build the product search and autocomplete indexes up front so the first keystroke is fast
+    try:
+        with app.app_context():
+            Product.rebuild_search_index()
+    except Exception as e:
+        app.logger.warning(f"Could not build product search index at startup: {e}")
+
+    # Release stock held by abandoned QR payments once their reservations expire
+    if stock_reservations.enabled():
+        def _on_holds_released(count):
+            invalidate_catalog_cache()
+        app.reservation_sweeper = ReservationSweeper(stock_reservations, connect=get_db, app=app,
+                                                     interval=Config.STOCK_HOLD_SWEEP_INTERVAL,
+                                                     on_release=_on_holds_released)
+        app.reservation_sweeper.start()
+
     # Pre-generate common QR codes for faster payment processing
     try:
         pregenerate_common_qr_codes()
@@ -594,43 +634,8 @@ def create_app():
 
     def build_category_hierarchy(category_id):
         """Build dynamic category hierarchy for cascading dropdowns"""
-        from models import get_db
-        conn = get_db()
-        cur = conn.cursor(dictionary=True)
-        
-        try:
-            # Get all categories with their hierarchy information
-            cur.execute("""
-                SELECT id, name, description, parent_id, sort_order
-                FROM categories 
-                WHERE is_active = TRUE
-                ORDER BY parent_id, sort_order, name
-            """)
-            all_categories = cur.fetchall()
-            
-            # Build hierarchy tree
-            hierarchy = {}
-            for cat in all_categories:
-                if cat['parent_id'] not in hierarchy:
-                    hierarchy[cat['parent_id']] = []
-                hierarchy[cat['parent_id']].append(cat)
-            
-            # Get all subcategories for the given category (including nested levels)
-            def get_all_subcategories(parent_id, level=0):
-                subcategories = []
-                if parent_id in hierarchy:
-                    for subcat in hierarchy[parent_id]:
-                        subcat['level'] = level
-                        subcategories.append(subcat)
-                        # Recursively get sub-subcategories
-                        subcategories.extend(get_all_subcategories(subcat['id'], level + 1))
-                return subcategories
-            
-            return get_all_subcategories(category_id)
-            
-        finally:
-            cur.close()
-            conn.close()
+        # Served from the cached category tree (see Category.tree)
+        return Category.get_descendants(category_id)
 
     @app.route('/api/categories/<int:category_id>/subcategories', methods=['GET'])
     def api_get_subcategories(category_id):
@@ -666,25 +671,14 @@ def create_app():
         hierarchy = []
         
         try:
-            categories = Category.get_all()
-            category = next((c for c in categories if c['id'] == category_id), None)
+            category = Category.get_by_id(category_id)
             
             if category:
                 # Build dynamic hierarchy for cascading dropdowns
                 hierarchy = build_category_hierarchy(category_id)
                 
-                # Get all subcategory IDs (including nested levels)
-                subcategory_ids = [cat['id'] for cat in hierarchy]
-                
-                # Always include the parent category ID in the search
-                all_category_ids = [category_id] + subcategory_ids
-                
-                if all_category_ids:
-                    # Get products from parent category and all subcategories
-                    products = Product.get_by_categories(all_category_ids)
-                else:
-                    # Fallback: get products directly from the category
-                    products = Product.get_by_category(category_id)
+                # Products from the category and all its subcategories (including nested levels)
+                products = Product.get_by_categories(Category.get_descendant_ids(category_id))
                     
         except Exception as e:
             app.logger.error(f"Error fetching products for category {category_id}: {e}")
@@ -701,15 +695,14 @@ def create_app():
         products = []
         hierarchy = []
         try:
-            categories = Category.get_all()
             # Parse category_ids from comma-separated string to list of ints
             category_id_list = [int(cid) for cid in category_ids.split(',') if cid.isdigit()]
             # For display, pick the first category or None
-            category = next((c for c in categories if c['id'] == category_id_list[0]), None) if category_id_list else None
+            category = Category.get_by_id(category_id_list[0]) if category_id_list else None
             if category_id_list:
                 products = Product.get_by_categories(category_id_list)
-            # Build category hierarchy for the template
-            hierarchy = build_category_hierarchy(categories)
+                # Build category hierarchy for the template
+                hierarchy = build_category_hierarchy(category_id_list[0])
         except Exception as e:
             products = []
             hierarchy = []
@@ -771,8 +764,10 @@ def create_app():
         if not product:
             return jsonify({'success': False, 'error': 'Product not found'}), 404
 
-        if product['stock'] < quantity:
-            return jsonify({'success': False, 'error': f'Only {product["stock"]} items available in stock'}), 400
+        # Units held for pending QR payments are not available
+        available_stock = product['available_stock']
+        if available_stock < quantity:
+            return jsonify({'success': False, 'error': f'Only {available_stock} items available in stock'}), 400
 
         try:
             # Initialize cart if it doesn't exist
@@ -789,8 +784,8 @@ def create_app():
             if existing_item:
                 # Update quantity of existing item
                 new_quantity = existing_item['quantity'] + quantity
-                if product['stock'] < new_quantity:
-                    return jsonify({'success': False, 'error': f'Only {product["stock"]} items available in stock'}), 400
+                if available_stock < new_quantity:
+                    return jsonify({'success': False, 'error': f'Only {available_stock} items available in stock'}), 400
                 existing_item['quantity'] = new_quantity
                 app.logger.info(f"🛒 Updated existing cart item quantity to {new_quantity}")
             else:
@@ -824,6 +819,7 @@ def create_app():
             return jsonify({'success': False, 'error': str(e)}), 500
 
     @app.route('/api/cart/checkout', methods=['POST'])
+    @idempotent(idempotency_store, scope=lambda: f"cart-checkout:{session.get('user_id')}")
     def checkout_cart():
         """Process checkout for all items in cart with volume discounts"""
         app.logger.info(f"🛒 CHECKOUT CALLED - Session: {dict(session)}")
@@ -867,200 +863,178 @@ def create_app():
             
             cur.close()
 
-            conn = get_db()
-            cur = conn.cursor(dictionary=True)
-
-            try:
-                # Validate all cart items and calculate total
-                cart_items = []
-                preorder_items = []
-                subtotal = 0
-
-                for cart_item in session['cart']:
-                    if cart_item.get('type') == 'preorder':
-                        preorder_items.append(cart_item)
-                        # Add pre-order item price * quantity to subtotal
-                        item_price = float(cart_item.get('price', 0))
-                        item_quantity = int(cart_item.get('quantity', 1))
-                        item_total = item_price * item_quantity
-                        subtotal += item_total
-                        continue
-
-                    product = Product.get_by_id(cart_item['product_id'])
-                    if not product:
-                        return jsonify({'success': False, 'error': f'Product {cart_item["product_id"]} not found'}), 404
-
-                    if product['stock'] < cart_item['quantity']:
-                        return jsonify({'success': False, 'error': f'Only {product["stock"]} items available for {product["name"]}'}), 400
-
-                    # Ensure all values are float for calculations
-                    item_price = float(product['price'])
-                    item_quantity = int(cart_item['quantity'])
-                    item_total = item_quantity * item_price
+            # Validate all cart items and calculate total (prices from one batched query)
+            cart_items = []
+            preorder_items = []
+            subtotal = 0
+
+            # One query for every product in the cart (regular and pre-order lines)
+            products_by_id = Product.get_many(item.get('product_id') for item in session['cart'])
+
+            for cart_item in session['cart']:
+                if cart_item.get('type') == 'preorder':
+                    preorder_items.append(cart_item)
+                    # Add pre-order item price * quantity to subtotal
+                    item_price = float(cart_item.get('price', 0))
+                    item_quantity = int(cart_item.get('quantity', 1))
+                    item_total = item_price * item_quantity
                     subtotal += item_total
+                    continue
+
+                product = products_by_id.get(int(cart_item['product_id']))
+                if not product:
+                    return jsonify({'success': False, 'error': f'Product {cart_item["product_id"]} not found'}), 404
+
+                # Ensure all values are float for calculations
+                item_price = float(product['price'])
+                item_quantity = int(cart_item['quantity'])
+                item_total = item_quantity * item_price
+                subtotal += item_total
+
+                cart_items.append({
+                    'product_id': cart_item['product_id'],
+                    'product': product,
+                    'quantity': item_quantity,
+                    'price': item_price,
+                    'item_total': item_total
+                })
 
-                    cart_items.append({
-                        'product_id': cart_item['product_id'],
-                        'product': product,
-                        'quantity': item_quantity,
-                        'price': item_price,
-                        'item_total': item_total
-                    })
-
-                # Calculate volume discount
-                volume_discount_amount = 0.0
-                volume_discount_rule_id = None
-                volume_discount_percentage = 0.0
-
-                cur.execute("""
-                    SELECT id, name, discount_percentage
-                    FROM volume_discount_rules
-                    WHERE minimum_amount <= %s AND is_active = TRUE
-                    ORDER BY minimum_amount DESC
-                    LIMIT 1
-                """, (subtotal,))
-
-                volume_rule = cur.fetchone()
-                if volume_rule:
-                    volume_discount_rule_id = volume_rule['id']
-                    volume_discount_percentage = float(volume_rule['discount_percentage'])
-
-                    # Calculate volume discount amount - ensure all values are float
-                    volume_discount_amount = float(subtotal) * (volume_discount_percentage / 100.0)
-
-                # Calculate final total - ensure all values are float
-                final_total = float(subtotal) - float(volume_discount_amount)
-
-                # Orders start as 'PENDING' but will be updated to 'COMPLETED' when payment is confirmed
-                # Staff approval is still required for fulfillment
-                initial_status = 'PENDING'
-                
-                # All orders start with 'Pending Approval' status
-                # This will be updated when payment is confirmed
-                approval_status = 'Pending Approval'
-                
-                # Generate transaction ID for QR payments
-                transaction_id = None
-                if payment_method == 'KHQR_BAKONG':
-                    import uuid
-                    import hashlib
-                    # Generate a unique transaction ID using UUID and MD5 hash
-                    unique_id = str(uuid.uuid4())
-                    transaction_id = hashlib.md5(unique_id.encode()).hexdigest()
-                    app.logger.info(f"🔑 Generated transaction ID for KHQR payment: {transaction_id}")
-                
-                # Create order with appropriate initial status and approval status
-                cur.execute("""
-                    INSERT INTO orders (customer_id, order_date, total_amount, status, payment_method, approval_status, volume_discount_rule_id, volume_discount_percentage, volume_discount_amount, transaction_id)
-                    VALUES (%s, NOW(), %s, %s, %s, %s, %s, %s, %s, %s)
-                """, (customer_id, final_total, initial_status, payment_method, approval_status, volume_discount_rule_id, volume_discount_percentage, volume_discount_amount, transaction_id))
-                order_id = cur.lastrowid
-
-                # Add all regular cart items to order
-                for cart_item in cart_items:
-                    product = cart_item['product']
-
-                    # Calculate the selling price before discount for proper invoice display
-                    # If there's a discount, calculate the original selling price
-                    if product.get('discount_percentage') and product['discount_percentage'] > 0:
-                        # Calculate selling price before discount: current_price / (1 - discount_percentage/100)
-                        selling_price_before_discount = float(product['price']) / (1 - float(product['discount_percentage']) / 100)
-                        original_price = round(selling_price_before_discount, 2)
-                        discount_amount = round(selling_price_before_discount - float(product['price']), 2)
-                        discount_percentage = product['discount_percentage']
-                    else:
-                        # No discount, use current price as original
-                        original_price = product['price']
-                        discount_amount = 0
-                        discount_percentage = 0
-
-                    # Get category name for denormalized data
-                    cur.execute("SELECT name FROM categories WHERE id = %s", (product['category_id'],))
-                    category_result = cur.fetchone()
-                    category_name = category_result['name'] if category_result else 'Unknown'
-
-                    cur.execute("""
-                        INSERT INTO order_items (order_id, product_id, product_name, product_description, product_category, quantity, price, original_price, discount_percentage, discount_amount)
-                        VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s, %s)
-                    """, (order_id, cart_item['product_id'], product['name'], product.get('description', ''), category_name, cart_item['quantity'], cart_item['price'],
-                          original_price, discount_percentage, discount_amount))
-
-                    # Reduce stock immediately when order is placed
-                    # This reserves the stock for the customer and prevents overselling
-                    cur.execute("""
-                        UPDATE products 
-                        SET stock = stock - %s 
-                        WHERE id = %s
-                    """, (cart_item['quantity'], cart_item['product_id']))
-                    
-                    # Log inventory change
-                    cur.execute("""
-                        INSERT INTO inventory (product_id, changes, change_date) 
-                        VALUES (%s, %s, NOW())
-                    """, (cart_item['product_id'], -cart_item['quantity']))
-                    
-                    app.logger.info(f"Stock reduced for product {cart_item['product_id']} by {cart_item['quantity']}")
-
-                # Process pre-order items separately
-                for preorder_item in preorder_items:
-                    preorder_id = preorder_item.get('preorder_id')
-                    quantity = preorder_item.get('quantity', 1)
-
-                    # Validate pre-order exists and belongs to customer
-                    from models import PreOrder
-                    preorder = PreOrder.get_by_id(preorder_id)
-                    if not preorder:
-                        return jsonify({'success': False, 'error': f'Pre-order {preorder_id} not found'}), 404
-
-                    if preorder['customer_id'] != customer_id:
-                        return jsonify({'success': False, 'error': 'Unauthorized access to pre-order'}), 403
-
-                    # Get product and category info for denormalized data
-                    cur.execute("SELECT p.name, p.description, c.name as category_name FROM products p JOIN categories c ON p.category_id = c.id WHERE p.id = %s", (preorder_item['product_id'],))
-                    product_result = cur.fetchone()
-                    product_name = product_result['name'] if product_result else 'Unknown Product'
-                    product_description = product_result['description'] if product_result else ''
-                    category_name = product_result['category_name'] if product_result else 'Unknown'
-
-                    # Insert pre-order items into order_items with type 'preorder'
-                    cur.execute("""
-                        INSERT INTO order_items (order_id, product_id, product_name, product_description, product_category, quantity, price, original_price, discount_percentage, discount_amount, type)
-                        VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s, %s, 'preorder')
-                    """, (order_id, preorder_item['product_id'], product_name, product_description, category_name, quantity, preorder_item['price'], preorder_item['price'], 0, 0))
+            # Validate pre-orders exist and belong to customer before writing anything
+            from models import PreOrder
+            for preorder_item in preorder_items:
+                preorder = PreOrder.get_by_id(preorder_item.get('preorder_id'))
+                if not preorder:
+                    return jsonify({'success': False, 'error': f'Pre-order {preorder_item.get("preorder_id")} not found'}), 404
+
+                if preorder['customer_id'] != customer_id:
+                    return jsonify({'success': False, 'error': 'Unauthorized access to pre-order'}), 403
+
+            # Order item rows (denormalized product data)
+            order_item_rows = []
+            for cart_item in cart_items:
+                product = cart_item['product']
+
+                # Calculate the selling price before discount for proper invoice display
+                # If there's a discount, calculate the original selling price
+                if product.get('discount_percentage') and product['discount_percentage'] > 0:
+                    # Calculate selling price before discount: current_price / (1 - discount_percentage/100)
+                    selling_price_before_discount = float(product['price']) / (1 - float(product['discount_percentage']) / 100)
+                    original_price = round(selling_price_before_discount, 2)
+                    discount_amount = round(selling_price_before_discount - float(product['price']), 2)
+                    discount_percentage = product['discount_percentage']
+                else:
+                    # No discount, use current price as original
+                    original_price = product['price']
+                    discount_amount = 0
+                    discount_percentage = 0
 
-                    # Reduce stock for pre-order items if applicable (usually stock is 0)
-                    cur.execute("""
-                        UPDATE products
-                        SET stock = stock - %s
-                        WHERE id = %s
-                    """, (quantity, preorder_item['product_id']))
+                order_item_rows.append({
+                    'product_id': cart_item['product_id'],
+                    'product_name': product['name'],
+                    'product_description': product.get('description', ''),
+                    # Category name for denormalized data (joined by Product.get_many)
+                    'product_category': product.get('category_name') or 'Unknown',
+                    'quantity': cart_item['quantity'],
+                    'price': cart_item['price'],
+                    'original_price': original_price,
+                    'discount_percentage': discount_percentage,
+                    'discount_amount': discount_amount
+                })
 
-                    # Log inventory change
-                    cur.execute("""
-                        INSERT INTO inventory (product_id, changes)
-                        VALUES (%s, %s)
-                    """, (preorder_item['product_id'], -quantity))
+            preorder_item_rows = []
+            for preorder_item in preorder_items:
+                product_result = products_by_id.get(int(preorder_item['product_id']))
+                preorder_item_rows.append({
+                    'product_id': preorder_item['product_id'],
+                    'product_name': product_result['name'] if product_result else 'Unknown Product',
+                    'product_description': product_result['description'] if product_result else '',
+                    'product_category': (product_result.get('category_name') if product_result else None) or 'Unknown',
+                    'quantity': preorder_item.get('quantity', 1),
+                    'price': preorder_item['price'],
+                    'original_price': preorder_item['price'],
+                    'discount_percentage': 0,
+                    'discount_amount': 0
+                })
 
-                # Keep order status as PENDING until payment is confirmed
-                # Don't clear cart yet - only clear when payment is actually confirmed
-                conn.commit()
+            # Stock is reduced immediately when the order is placed; pre-order lines are
+            # decremented too (usually from 0) but are not limited by current stock.
+            # QR orders only hold their regular lines until the payment is confirmed.
+            regular_quantities = checkout_engine.total_quantities(order_item_rows)
+            hold_stock = payment_method == 'KHQR_BAKONG' and stock_reservations.enabled()
+            if hold_stock:
+                stock_changes = checkout_engine.total_quantities(preorder_item_rows)
+            else:
+                stock_changes = checkout_engine.total_quantities(order_item_rows + preorder_item_rows)
 
-                app.logger.info(f"✅ CHECKOUT SUCCESS - Order ID: {order_id}, Total: {final_total}, Volume Discount: {volume_discount_amount}, Order status: PENDING - awaiting payment confirmation")
-                
-                app.logger.info(f"✅ CHECKOUT SUCCESS - Order ID: {order_id}, Total: {final_total}, Volume Discount: {volume_discount_amount}, Order status updated to COMPLETED - awaiting staff approval")
+            try:
+                with mysql.transaction() as conn:
+                    cur = conn.cursor(dictionary=True)
+                    try:
+                        # Lock every product row involved (id order avoids deadlocks) and
+                        # re-check stock under the lock so concurrent checkouts cannot oversell
+                        locked_products = checkout_engine.lock_products(cur, set(regular_quantities) | set(stock_changes))
+                        held = stock_reservations.held_quantities(cur, regular_quantities)
+                        checkout_engine.check_stock(locked_products, regular_quantities, held)
+
+                        # Calculate volume discount (in-memory rule index)
+                        volume_discount = VolumeDiscount.quote(subtotal)
+                        volume_discount_rule_id = volume_discount['rule_id']
+                        volume_discount_percentage = volume_discount['discount_percentage']
+                        volume_discount_amount = volume_discount['discount_amount']
+                        final_total = volume_discount['final_total']
+
+                        # Orders start as 'PENDING' but will be updated to 'COMPLETED' when payment is confirmed
+                        # Staff approval is still required for fulfillment
+                        initial_status = 'PENDING'
+
+                        # All orders start with 'Pending Approval' status
+                        # This will be updated when payment is confirmed
+                        approval_status = 'Pending Approval'
 
-                return jsonify({
-                    'success': True,
-                    'message': 'Order placed successfully',
-                    'order_id': order_id,
-                    'subtotal': subtotal,
-                    'volume_discount_amount': volume_discount_amount,
-                    'final_total': final_total
-                })
+                        # Generate transaction ID for QR payments
+                        transaction_id = None
+                        if payment_method == 'KHQR_BAKONG':
+                            import uuid
+                            import hashlib
+                            # Generate a unique transaction ID using UUID and MD5 hash
+                            unique_id = str(uuid.uuid4())
+                            transaction_id = hashlib.md5(unique_id.encode()).hexdigest()
+                            app.logger.info(f"🔑 Generated transaction ID for KHQR payment: {transaction_id}")
+
+                        # Create order with appropriate initial status and approval status
+                        cur.execute("""
+                            INSERT INTO orders (customer_id, order_date, total_amount, status, payment_method, approval_status, volume_discount_rule_id, volume_discount_percentage, volume_discount_amount, transaction_id)
+                            VALUES (%s, NOW(), %s, %s, %s, %s, %s, %s, %s, %s)
+                        """, (customer_id, final_total, initial_status, payment_method, approval_status, volume_discount_rule_id, volume_discount_percentage, volume_discount_amount, transaction_id))
+                        order_id = cur.lastrowid
+
+                        # Order items, stock and inventory ledger: a fixed number of statements per checkout
+                        checkout_engine.insert_order_items(cur, order_id, order_item_rows)
+                        checkout_engine.insert_order_items(cur, order_id, preorder_item_rows, item_type='preorder')
+                        checkout_engine.apply_stock_changes(cur, stock_changes)
+                        if hold_stock:
+                            stock_reservations.hold(cur, order_id, regular_quantities)
+                    finally:
+                        cur.close()
+            except checkout_engine.InsufficientStockError as e:
+                return jsonify({'success': False, 'error': str(e)}), 400
+            except checkout_engine.ProductNotFoundError as e:
+                return jsonify({'success': False, 'error': str(e)}), 404
+
+            # Keep order status as PENDING until payment is confirmed
+            # Don't clear cart yet - only clear when payment is actually confirmed
+            invalidate_catalog_cache()
+
+            app.logger.info(f"✅ CHECKOUT SUCCESS - Order ID: {order_id}, Total: {final_total}, Volume Discount: {volume_discount_amount}, Items: {len(order_item_rows)} regular / {len(preorder_item_rows)} pre-order, Order status: PENDING - awaiting payment confirmation")
 
-            finally:
-                cur.close()
-                conn.close()
+            return jsonify({
+                'success': True,
+                'message': 'Order placed successfully',
+                'order_id': order_id,
+                'subtotal': subtotal,
+                'volume_discount_amount': volume_discount_amount,
+                'final_total': final_total
+            })
 
         except Exception as e:
             app.logger.error(f"Error during checkout: {str(e)}")
@@ -1241,88 +1215,87 @@ def create_app():
                 return jsonify({'success': False, 'error': 'File too large. Maximum size is 10MB'}), 400
             
             # Check if order exists and is pending
-            conn = get_db()
-            cur = conn.cursor(dictionary=True)
-            
-            cur.execute("""
-                SELECT id, status, payment_method, transaction_id, total_amount, customer_id
-                FROM orders 
-                WHERE id = %s
-            """, (order_id,))
+            # Order row stays locked until the transaction ends, so a concurrent confirmation
+            # waits and then finds it no longer pending
+            with mysql.transaction() as conn:
+                cur = conn.cursor(dictionary=True)
             
-            order = cur.fetchone()
-            if not order:
-                return jsonify({'success': False, 'error': f'Order #{order_id} not found'}), 404
+                cur.execute("""
+                    SELECT id, status, payment_method, transaction_id, total_amount, customer_id
+                    FROM orders 
+                    WHERE id = %s
+                    FOR UPDATE
+                """, (order_id,))
             
-            if order['status'] != 'PENDING':
-                return jsonify({'success': False, 'error': f'Order #{order_id} is not pending. Current status: {order["status"]}'}), 400
+                order = cur.fetchone()
+                if not order:
+                    return jsonify({'success': False, 'error': f'Order #{order_id} not found'}), 404
             
-            # Save uploaded file
-            import os
-            from werkzeug.utils import secure_filename
+                if order['status'] != 'PENDING':
+                    return jsonify({'success': False, 'error': f'Order #{order_id} is not pending. Current status: {order["status"]}'}), 400
             
-            # Create upload directory if it doesn't exist
-            upload_dir = os.path.join(app.static_folder, 'uploads', 'payment_screenshots')
-            os.makedirs(upload_dir, exist_ok=True)
+                # Save uploaded file
+                import os
+                from werkzeug.utils import secure_filename
             
-            # Generate unique filename
-            filename = secure_filename(file.filename)
-            timestamp = datetime.now().strftime('%Y%m%d_%H%M%S')
-            unique_filename = f"order_{order_id}_{timestamp}_{filename}"
-            file_path = os.path.join(upload_dir, unique_filename)
+                # Create upload directory if it doesn't exist
+                upload_dir = os.path.join(app.static_folder, 'uploads', 'payment_screenshots')
+                os.makedirs(upload_dir, exist_ok=True)
             
-            # Save file
-            file.save(file_path)
+                # Generate unique filename
+                filename = secure_filename(file.filename)
+                timestamp = datetime.now().strftime('%Y%m%d_%H%M%S')
+                unique_filename = f"order_{order_id}_{timestamp}_{filename}"
+                file_path = os.path.join(upload_dir, unique_filename)
             
-            # Store relative path for database
-            relative_path = f"uploads/payment_screenshots/{unique_filename}"
+                # Save file
+                file.save(file_path)
             
-            # Update order with payment verification info
-            cur.execute("""
-                UPDATE orders 
-                SET payment_screenshot_path = %s,
-                    payment_verification_status = 'verified',
-                    screenshot_uploaded_at = NOW(),
-                    transaction_id = COALESCE(NULLIF(%s, ''), transaction_id)
-                WHERE id = %s
-            """, (relative_path, transaction_id, order_id))
+                # Store relative path for database
+                relative_path = f"uploads/payment_screenshots/{unique_filename}"
             
-            # Determine order status based on verification type
-            if transaction_id and order['transaction_id'] and transaction_id == order['transaction_id']:
-                # Transaction ID matches - automatic completion
+                # Update order with payment verification info
                 cur.execute("""
                     UPDATE orders 
-                    SET status = 'COMPLETED',
-                        approval_status = 'Pending Approval'
+                    SET payment_screenshot_path = %s,
+                        payment_verification_status = 'verified',
+                        screenshot_uploaded_at = NOW(),
+                        transaction_id = COALESCE(NULLIF(%s, ''), transaction_id)
                     WHERE id = %s
-                """, (order_id,))
+                """, (relative_path, transaction_id, order_id))
+            
+                # Determine order status based on verification type
+                if transaction_id and order['transaction_id'] and transaction_id == order['transaction_id']:
+                    # Transaction ID matches - automatic completion
+                    cur.execute("""
+                        UPDATE orders 
+                        SET status = 'COMPLETED',
+                            approval_status = 'Pending Approval'
+                        WHERE id = %s
+                    """, (order_id,))
                 
-                # Reduce stock
-                cur.execute("""
-                    UPDATE products p
-                    JOIN order_items oi ON p.id = oi.product_id
-                    SET p.stock = p.stock - oi.quantity
-                    WHERE oi.order_id = %s AND p.stock >= oi.quantity
-                """, (order_id,))
+                    # Held stock becomes a real decrement (stock of orders without holds was reduced at checkout)
+                    stock_reservations.convert(cur, order_id)
                 
-                order_status = 'COMPLETED'
-            elif not transaction_id and order['payment_method'] == 'KHQR_BAKONG':
-                # QR code upload - no transaction ID, but payment proof provided
-                # Mark as verified and ready for admin approval
-                cur.execute("""
-                    UPDATE orders 
-                    SET status = 'PENDING',
-                        approval_status = 'Pending Approval',
-                        payment_verification_status = 'verified'
-                    WHERE id = %s
-                """, (order_id,))
+                    order_status = 'COMPLETED'
+                elif not transaction_id and order['payment_method'] == 'KHQR_BAKONG':
+                    # QR code upload - no transaction ID, but payment proof provided
+                    # Mark as verified and ready for admin approval
+                    cur.execute("""
+                        UPDATE orders 
+                        SET status = 'PENDING',
+                            approval_status = 'Pending Approval',
+                            payment_verification_status = 'verified'
+                        WHERE id = %s
+                    """, (order_id,))
                 
-                order_status = 'PENDING (QR Payment Verified)'
-            else:
-                # Other payment methods or invoice uploads
-                order_status = 'PENDING (Verified)'
+                    order_status = 'PENDING (QR Payment Verified)'
+                else:
+                    # Other payment methods or invoice uploads
+                    order_status = 'PENDING (Verified)'
             
-            conn.commit()
+            sales_rollup.refresh_orders([order_id])
+            invalidate_catalog_cache()
             cur.close()
             conn.close()
             
@@ -1525,55 +1498,52 @@ def create_app():
             
             # Manual verification - no automatic verifier needed
             
-            # Get the specific order
-            conn = get_db()
-            cur = conn.cursor(dictionary=True)
-            
-            try:
-                cur.execute("""
-                    SELECT o.id, o.transaction_id, o.total_amount, o.order_date, o.customer_id, o.status
-                    FROM orders o
-                    WHERE o.id = %s AND o.status = 'PENDING' AND o.payment_method = 'KHQR_BAKONG'
-                """, (order_id,))
-                
-                order = cur.fetchone()
-                
-                if not order:
-                    return jsonify({'success': False, 'error': 'Order not found or not pending'}), 404
-                
-                # Manual verification - staff confirms customer has actually paid
-                # This overrides the automatic system when staff knows payment was made
-                
-                # Update order status to COMPLETED (manual verification)
-                cur.execute("""
-                    UPDATE orders 
-                    SET status = 'COMPLETED', 
-                        approval_status = 'Approved',
-                        approval_date = NOW(),
-                        approved_by = %s
-                    WHERE id = %s
-                """, (session.get('user_id', 1), order_id))
-                
-                # Reduce stock for order items
-                cur.execute("""
-                    UPDATE products p
-                    JOIN order_items oi ON p.id = oi.product_id
-                    SET p.stock = p.stock - oi.quantity
-                    WHERE oi.order_id = %s AND p.stock >= oi.quantity
-                """, (order_id,))
-                
-                conn.commit()
+            # Get the specific order (locked until the transaction ends, so a concurrent
+            # confirmation waits and then finds it no longer pending)
+            with mysql.transaction() as conn:
+                cur = conn.cursor(dictionary=True)
                 
-                return jsonify({
-                    'success': True,
-                    'status': 'completed',
-                    'message': 'Order marked as paid and completed! (Manual verification)',
-                    'order_id': order_id
-                })
+                try:
+                    cur.execute("""
+                        SELECT o.id, o.transaction_id, o.total_amount, o.order_date, o.customer_id, o.status
+                        FROM orders o
+                        WHERE o.id = %s AND o.status = 'PENDING' AND o.payment_method = 'KHQR_BAKONG'
+                        FOR UPDATE
+                    """, (order_id,))
                     
-            finally:
-                cur.close()
-                conn.close()
+                    order = cur.fetchone()
+                    
+                    if not order:
+                        return jsonify({'success': False, 'error': 'Order not found or not pending'}), 404
+                    
+                    # Manual verification - staff confirms customer has actually paid
+                    # This overrides the automatic system when staff knows payment was made
+                    
+                    # Update order status to COMPLETED (manual verification)
+                    cur.execute("""
+                        UPDATE orders 
+                        SET status = 'COMPLETED', 
+                            approval_status = 'Approved',
+                            approval_date = NOW(),
+                            approved_by = %s
+                        WHERE id = %s
+                    """, (session.get('user_id', 1), order_id))
+                    
+                    # Held stock becomes a real decrement (stock of orders without holds was reduced at checkout)
+                    stock_reservations.convert(cur, order_id)
+                        
+                finally:
+                    cur.close()
+
+            sales_rollup.refresh_orders([order_id])
+            invalidate_catalog_cache()
+            
+            return jsonify({
+                'success': True,
+                'status': 'completed',
+                'message': 'Order marked as paid and completed! (Manual verification)',
+                'order_id': order_id
+            })
                 
         except Exception as e:
             app.logger.error(f"Error verifying payment instantly: {str(e)}")
@@ -1773,16 +1743,16 @@ def create_app():
             try:
                 # Use session cart for display since orders are now completed immediately
                 session_cart = session.get('cart', [])
+                products_by_id = Product.get_many(
+                    item['product_id'] for item in session_cart if item.get('type') != 'preorder'
+                )
                 for cart_item in session_cart:
                     # Skip pre-order items here - they'll be handled in the dedicated pre-order loop
                     if cart_item.get('type') == 'preorder':
                         continue
                         
-                    # Get product details for regular items
-                    cur.execute("""
-                        SELECT name, price, photo FROM products WHERE id = %s
-                    """, (cart_item['product_id'],))
-                    product_data = cur.fetchone()
+                    # Product details for regular items
+                    product_data = products_by_id.get(int(cart_item['product_id']))
 
                     if product_data:
                         item = {
@@ -2051,56 +2021,52 @@ def create_app():
             if not order_id:
                 return jsonify({'success': False, 'error': 'No order associated with this payment'}), 400
 
-            conn = get_db()
-            cur = conn.cursor(dictionary=True)
-
-            try:
-                # Verify order exists and is pending
-                cur.execute("SELECT id, status FROM orders WHERE id = %s", (order_id,))
-                order = cur.fetchone()
-                
-                if not order:
-                    return jsonify({'success': False, 'error': 'Order not found'}), 404
-                
-                if order['status'] != 'PENDING':
-                    return jsonify({'success': False, 'error': f'Order already {order["status"]}'}), 400
+            with mysql.transaction() as conn:
+                cur = conn.cursor(dictionary=True)
+                try:
+                    # Verify order exists and is pending (locked, so a concurrent confirmation waits here)
+                    cur.execute("SELECT id, status FROM orders WHERE id = %s FOR UPDATE", (order_id,))
+                    order = cur.fetchone()
+                    
+                    if not order:
+                        return jsonify({'success': False, 'error': 'Order not found'}), 404
+                    
+                    if order['status'] != 'PENDING':
+                        return jsonify({'success': False, 'error': f'Order already {order["status"]}'}), 400
 
-                # Update order status to 'COMPLETED' after payment confirmation
-                # approval_status remains 'Pending Approval' for staff to manually approve
-                cur.execute("UPDATE orders SET status = 'COMPLETED' WHERE id = %s", (order_id,))
+                    # Update order status to 'COMPLETED' after payment confirmation
+                    # approval_status remains 'Pending Approval' for staff to manually approve
+                    cur.execute("UPDATE orders SET status = 'COMPLETED' WHERE id = %s", (order_id,))
 
-                # Stock is already reduced when order was placed at checkout
-                # No need to reduce stock again here
-                app.logger.info(f"Order {order_id} status updated to COMPLETED - stock already reduced at checkout")
+                    # Convert the order's stock reservation into a real decrement
+                    converted = stock_reservations.convert(cur, order_id)
+                    app.logger.info(f"Order {order_id} status updated to COMPLETED - reserved stock converted: {converted}")
 
-                # Update payment session status
-                PaymentSession.update_session_status(session_id, 'completed')
+                    # Update payment session status
+                    PaymentSession.update_session_status(session_id, 'completed')
+                finally:
+                    cur.close()
 
-                conn.commit()
+            sales_rollup.refresh_orders([order_id])
+            if converted:
+                invalidate_catalog_cache()
 
-                # Clear cart since payment is confirmed
-                if 'cart' in session:
-                    session['cart'] = []
-                    session.modified = True
+            # Clear cart since payment is confirmed
+            if 'cart' in session:
                 session['cart'] = []
-                if 'created_order_ids' in session:
-                    session['created_order_ids'] = []
                 session.modified = True
+            session['cart'] = []
+            if 'created_order_ids' in session:
+                session['created_order_ids'] = []
+            session.modified = True
 
-                app.logger.info(f"✅ Payment confirmed - Order {order_id} payment confirmed, status set to COMPLETED, approval_status remains Pending Approval, stock reduced")
-
-                return jsonify({
-                    'success': True,
-                    'message': 'Payment confirmed successfully. Order is now completed and pending staff approval.',
-                    'order_id': order_id
-                })
+            app.logger.info(f"✅ Payment confirmed - Order {order_id} payment confirmed, status set to COMPLETED, approval_status remains Pending Approval, stock reduced")
 
-            except Exception as e:
-                conn.rollback()
-                raise e
-            finally:
-                cur.close()
-                conn.close()
+            return jsonify({
+                'success': True,
+                'message': 'Payment confirmed successfully. Order is now completed and pending staff approval.',
+                'order_id': order_id
+            })
 
         except Exception as e:
             app.logger.error(f"Error confirming payment: {str(e)}")
@@ -2139,6 +2105,7 @@ def create_app():
                 return jsonify({'success': False, 'error': 'Order not found or already updated'}), 400
 
             conn.commit()
+            sales_rollup.refresh_orders([order_id])
             cur.close()
 
             app.logger.info(f"💵 CASH PAYMENT COMPLETED - Order {order_id} status updated to COMPLETED")
@@ -3096,8 +3063,17 @@ def create_app():
             if 'cart' not in session:
                 session['cart'] = []
 
+            # Skip products that have since been deleted or archived
+            available_products = Product.get_many(item['product_id'] for item in order_items)
+
             items_added = 0
+            items_skipped = 0
             for item in order_items:
+                product = available_products.get(item['product_id'])
+                if not product or product.get('archived'):
+                    items_skipped += 1
+                    continue
+
                 # Check if item already exists in cart
                 existing_item = None
                 for cart_item in session['cart']:
@@ -3118,7 +3094,8 @@ def create_app():
             return jsonify({
                 'success': True,
                 'message': 'Items added to cart successfully',
-                'items_added': items_added
+                'items_added': items_added,
+                'items_skipped': items_skipped
             })
 
         except Exception as e:
@@ -3406,6 +3383,9 @@ def create_app():
                     WHERE order_id = %s AND product_id = %s
                 """, (order_id, product_id))
 
+                # Give back stock still held for this item's QR payment
+                stock_reservations.release(cur, order_id, {int(product_id): order_item['quantity']})
+
                 # Check if order is now empty
                 cur.execute("SELECT COUNT(*) as item_count FROM order_items WHERE order_id = %s", (order_id,))
                 remaining_items = cur.fetchone()['item_count']
@@ -4237,70 +4217,13 @@ def create_app():
             return jsonify({'success': False, 'error': 'Please log in'}), 401
 
         try:
-            from datetime import datetime
-
-            # Get today's orders (excluding cancelled)
-            conn = get_db()
-            cur = conn.cursor(dictionary=True)
-            today_str = datetime.now().strftime('%Y-%m-%d')
-
-            cur.execute("""
-                SELECT o.id, o.order_date, c.first_name, c.last_name, o.total_amount,
-                       o.status, o.payment_method, o.approval_status, o.transaction_id
-                FROM orders o
-                JOIN customers c ON o.customer_id = c.id
-                WHERE o.status = 'COMPLETED'
-                AND DATE(o.order_date) = %s
-                ORDER BY o.order_date DESC
-                LIMIT 20
-            """, (today_str,))
-
-            order_rows = cur.fetchall()
-            orders_data = []
-            orders_total = 0
-
-            for row in order_rows:
-                # Get order items to determine details
-                cur.execute("""
-                    SELECT p.name as product_name, oi.quantity
-                    FROM order_items oi
-                    JOIN products p ON oi.product_id = p.id
-                    WHERE oi.order_id = %s
-                """, (row['id'],))
-                order_items = cur.fetchall()
-
-                # Determine details based on number of items
-                if len(order_items) == 1:
-                    details = order_items[0]['product_name']  # Show product name for single item
-                else:
-                    details = 'Multiple items'
-
-                order_data = {
-                    'id': row['id'],
-                    'date': row['order_date'].strftime('%Y-%m-%d %H:%M:%S') if hasattr(row['order_date'], 'strftime') else str(row['order_date']),
-                    'customer_name': f"{row['first_name']} {row['last_name']}",
-                    'amount': float(row['total_amount']) if row['total_amount'] is not None else 0.0,
-                    'status': row['status'],
-                    'payment_method': row['payment_method'] if row['payment_method'] is not None else 'QR Payment',
-                    'approval_status': row['approval_status'] if row['approval_status'] is not None else 'Pending Approval',
-                    'type': 'order',
-                    'details': details
-                }
-                orders_data.append(order_data)
-                if row['status'] == 'COMPLETED':  # Only count completed orders in total
-                    orders_total += order_data['amount']
-
-            cur.close()
-
-            # Sort orders by date descending (most recent first)
-            orders_data.sort(key=lambda x: x['date'], reverse=True)
-
+            orders_data = Order.get_completed_for_widget(day=datetime.now().strftime('%Y-%m-%d'))
             return jsonify({
                 'success': True,
                 'orders': orders_data,
                 'summary': {
                     'orders_count': len(orders_data),
-                    'orders_total': orders_total
+                    'orders_total': sum(order['amount'] for order in orders_data)
                 }
             })
 
@@ -4315,70 +4238,15 @@ def create_app():
             return jsonify({'success': False, 'error': 'Please log in'}), 401
 
         try:
-            from datetime import datetime
-
-            # Get all orders (excluding cancelled)
-            conn = get_db()
-            cur = conn.cursor(dictionary=True)
-
-            cur.execute("""
-                SELECT o.id, o.order_date, c.first_name, c.last_name, o.total_amount,
-                       o.status, o.payment_method, o.approval_status, o.transaction_id
-                FROM orders o
-                JOIN customers c ON o.customer_id = c.id
-                WHERE o.status = 'COMPLETED'
-                ORDER BY o.order_date DESC
-                LIMIT 20
-            """)
-
-            order_rows = cur.fetchall()
-            orders_data = []
-            orders_total = 0
-
-            for row in order_rows:
-                # Get order items to determine details
-                cur.execute("""
-                    SELECT p.name as product_name, oi.quantity
-                    FROM order_items oi
-                    JOIN products p ON oi.product_id = p.id
-                    WHERE oi.order_id = %s
-                """, (row['id'],))
-                order_items = cur.fetchall()
-
-                # Determine details based on number of items
-                if len(order_items) == 1:
-                    details = order_items[0]['product_name']  # Show product name for single item
-                else:
-                    details = 'Multiple items'
-
-                order_data = {
-                    'id': row['id'],
-                    'date': row['order_date'].strftime('%Y-%m-%d %H:%M:%S') if hasattr(row['order_date'], 'strftime') else str(row['order_date']),
-                    'customer_name': f"{row['first_name']} {row['last_name']}",
-                    'amount': float(row['total_amount']) if row['total_amount'] is not None else 0.0,
-                    'status': row['status'],
-                    'payment_method': row['payment_method'] if row['payment_method'] is not None else 'QR Payment',
-                    'approval_status': row['approval_status'] if row['approval_status'] is not None else 'Pending Approval',
-                    'type': 'order',
-                    'details': details
-                }
-                orders_data.append(order_data)
-                if row['status'] == 'COMPLETED':  # Only count completed orders in total
-                    orders_total += order_data['amount']
-
-            cur.close()
-
-            # Sort orders by date descending (most recent first)
-            orders_data.sort(key=lambda x: x['date'], reverse=True)
-
-            return jsonify({
-                'success': True,
-                'orders': orders_data,
-                'summary': {
-                    'orders_count': len(orders_data),
-                    'orders_total': orders_total
-                }
-            })
+            orders_data = Order.get_completed_for_widget()
+            return jsonify({
+                'success': True,
+                'orders': orders_data,
+                'summary': {
+                    'orders_count': len(orders_data),
+                    'orders_total': sum(order['amount'] for order in orders_data)
+                }
+            })
 
         except Exception as e:
             app.logger.error(f"Error getting unified orders: {str(e)}")
@@ -4664,6 +4532,9 @@ def create_app():
         approval = request.args.get('approval', 'all')
         page = request.args.get('page', 1, type=int)
         page_size = request.args.get('page_size', 10, type=int)
+        # Keyset pagination: the client passes back next_cursor from the previous page
+        cursor = request.args.get('cursor') or None
+        count_mode = request.args.get('count', 'exact')
 
         # Sanitize input parameters to treat 'none' or similar as no filter
         if status and status.lower() == 'none':
@@ -4676,7 +4547,10 @@ def create_app():
             approval = 'all'
 
         try:
-            orders, total_orders = Order.get_paginated_orders(status=status, date=date, search=search, approval=approval, page=page, page_size=page_size)
+            orders, total_orders = Order.get_paginated_orders(status=status, date=date, search=search, approval=approval,
+                                                              page=page, page_size=page_size, cursor=cursor,
+                                                              with_total=count_mode != 'none',
+                                                              approximate_total=count_mode == 'approx')
             
             orders_list = []
             for order in orders:
@@ -4690,7 +4564,10 @@ def create_app():
                     'payment_method': order.get('payment_method', 'QR Payment'),
                     'approval_status': order.get('approval_status', 'Pending Approval')
                 })
-            return jsonify({'success': True, 'orders': orders_list, 'total_orders': total_orders})
+            return jsonify({'success': True, 'orders': orders_list, 'total_orders': total_orders,
+                            'next_cursor': next_cursor(orders, page_size)})
+        except InvalidCursorError as e:
+            return jsonify({'success': False, 'error': str(e)}), 400
         except Exception as e:
             app.logger.error(f"Error fetching paginated orders: {e}")
             return jsonify({'success': False, 'error': 'Failed to fetch orders'}), 500
@@ -4720,9 +4597,10 @@ def create_app():
             params = []
 
             if query:
-                # Change to filter by product name instead of category name
-                where_clauses.append("p.name LIKE %s")
-                params.append(f'%{query}%')
+                # Match product name/specs/category through the search index
+                matching_ids = Product.search_ids(query) or [0]
+                where_clauses.append(f"p.id IN ({','.join(['%s'] * len(matching_ids))})")
+                params.extend(matching_ids)
 
             if brand_filter:
                 where_clauses.append("p.name LIKE %s")
@@ -5184,6 +5062,10 @@ LEFT JOIN categories c ON p.category_id = c.id
                 return jsonify({'success': False, 'error': 'No fields to update'}), 400
 
             field_updates['updated_at'] = datetime.now() # Add updated_at
+            if name is not None:
+                slug = Product.unique_slug(name, product_id)
+                if slug:
+                    field_updates['slug'] = slug
             app.logger.info(f"=== PREPARING DATABASE UPDATE ===")
             app.logger.info(f"Final field_updates: {field_updates}")
 
@@ -5201,10 +5083,14 @@ LEFT JOIN categories c ON p.category_id = c.id
             app.logger.info(f"SQL Values: {update_values}")
 
             cur = mysql.connection.cursor()
-            rows_affected = cur.execute(final_query, tuple(update_values))
+            cur.execute(final_query, tuple(update_values))
+            rows_affected = cur.rowcount
             app.logger.info(f"Rows affected by update: {rows_affected}")
 
             mysql.connection.commit()
+            invalidate_catalog_cache()
+            Product.invalidate_slug_cache(product_id=product_id)
+            Product.reindex(product_id)
             app.logger.info("✓ Database commit successful")
 
             cur.close()
@@ -5370,6 +5256,8 @@ LEFT JOIN categories c ON p.category_id = c.id
             # Archive the product
             cur.execute("UPDATE products SET archived = TRUE WHERE id = %s", (product_id,))
             conn.commit()
+            invalidate_catalog_cache()
+            Product.reindex(product_id)
             
             app.logger.info(f"Product {product_id} archived successfully by user {session.get('user_id')}")
             return jsonify({'success': True, 'message': 'Product archived successfully'})
@@ -5404,6 +5292,8 @@ LEFT JOIN categories c ON p.category_id = c.id
             # Restore the product
             cur.execute("UPDATE products SET archived = FALSE WHERE id = %s", (product_id,))
             conn.commit()
+            invalidate_catalog_cache()
+            Product.reindex(product_id)
             
             app.logger.info(f"Product {product_id} restored successfully by user {session.get('user_id')}")
             return jsonify({'success': True, 'message': 'Product restored successfully'})
@@ -5506,6 +5396,9 @@ LEFT JOIN categories c ON p.category_id = c.id
                     WHERE id = %s
                 """, (order_id,))
 
+                # Give back any stock still held for the order's QR payment
+                stock_reservations.release(cur, order_id)
+
                 conn.commit()
 
                 return jsonify({
@@ -5676,6 +5569,7 @@ LEFT JOIN categories c ON p.category_id = c.id
             # Update product price and store the applied discount percentage
             cur.execute("UPDATE products SET price = %s, discount_percentage = %s WHERE id = %s", (new_price, discount_percentage, product_id))
             mysql.connection.commit()
+            invalidate_catalog_cache()
             cur.close()
 
             return jsonify({
@@ -5763,6 +5657,7 @@ LEFT JOIN categories c ON p.category_id = c.id
                     failed_products.append(f"Product ID {product_id}: {str(e)}")
 
             mysql.connection.commit()
+            invalidate_catalog_cache()
             cur.close()
 
             success_count = len(updated_products)
@@ -5806,26 +5701,11 @@ LEFT JOIN categories c ON p.category_id = c.id
             if not query:
                 return jsonify({'success': False, 'error': 'Search query required'}), 400
 
-            conn = mysql.connection
-            cur = conn.cursor()
-
-            # Search customers by name, email, or phone
-            search_pattern = f"%{query}%"
-            cur.execute("""
-                SELECT id, CONCAT(first_name, ' ', last_name) as name, email, phone,
-                       (SELECT COUNT(*) FROM orders WHERE customer_id = customers.id) as total_orders
-                FROM customers
-                WHERE CONCAT(first_name, ' ', last_name) LIKE %s
-                   OR email LIKE %s
-                   OR phone LIKE %s
-                ORDER BY first_name, last_name
-                LIMIT 10
-            """, (search_pattern, search_pattern, search_pattern))
-
-            rows = cur.fetchall()
-            columns = [desc[0] for desc in cur.description]
-            customers = [dict(zip(columns, row)) for row in rows]
-            cur.close()
+            # Exact and prefix matches on the indexed email / name (either order) / phone keys
+            customers = Customer.lookup(query, prefix=True, limit=10, columns=f"""
+                c.id, CONCAT(c.first_name, ' ', c.last_name) as name, c.email, c.phone,
+                {Customer.order_count_sql('c')} as total_orders
+            """)
 
             return jsonify({'success': True, 'customers': customers})
 
@@ -5844,9 +5724,9 @@ LEFT JOIN categories c ON p.category_id = c.id
             cur = conn.cursor()
 
             # Get customer info
-            cur.execute("""
+            cur.execute(f"""
                 SELECT id, CONCAT(first_name, ' ', last_name) as name, email, phone,
-                       (SELECT COUNT(*) FROM orders WHERE customer_id = customers.id) as total_orders
+                       {Customer.order_count_sql()} as total_orders
                 FROM customers WHERE id = %s
             """, (customer_id,))
 
@@ -5956,43 +5836,7 @@ LEFT JOIN categories c ON p.category_id = c.id
 
     def calculate_customer_insights(cur, customer_id, history):
         """Calculate insights for customer discount behavior"""
-        insights = {
-            'most_common_discount': None,
-            'total_purchases': 0,
-            'total_savings': 0,
-            'average_discount': 0,
-            'last_visit': None
-        }
-
-        if not history:
-            return insights
-
-        # Calculate most common discount percentage
-        discount_counts = {}
-        total_savings = 0
-        total_discount = 0
-
-        for item in history:
-            discount = item['discount_percentage']
-            if discount:
-                discount_counts[discount] = discount_counts.get(discount, 0) + 1
-                total_discount += discount
-
-            if item['savings']:
-                total_savings += float(item['savings'])
-
-        if discount_counts:
-            insights['most_common_discount'] = max(discount_counts, key=discount_counts.get)
-            insights['average_discount'] = round(total_discount / len(history), 1)
-
-        insights['total_purchases'] = len(history)
-        insights['total_savings'] = total_savings
-
-        # Get last visit date
-        if history:
-            insights['last_visit'] = history[0]['date']  # Already ordered by date DESC
-
-        return insights
+        return discount_insights(history)
 
     @app.route('/api/staff/discounts/apply-category', methods=['POST'])
     def apply_category_discount():
@@ -6028,6 +5872,7 @@ LEFT JOIN categories c ON p.category_id = c.id
 
             affected_rows = cur.rowcount
             mysql.connection.commit()
+            invalidate_catalog_cache()
             cur.close()
 
             return jsonify({
@@ -6074,6 +5919,7 @@ LEFT JOIN categories c ON p.category_id = c.id
 
             affected_rows = cur.rowcount
             mysql.connection.commit()
+            invalidate_catalog_cache()
             cur.close()
 
             return jsonify({
@@ -6153,6 +5999,7 @@ LEFT JOIN categories c ON p.category_id = c.id
             updated_price = cur.fetchone()[0]
             
             mysql.connection.commit()
+            invalidate_catalog_cache()
             cur.close()
             
             return jsonify({
@@ -6233,6 +6080,7 @@ LEFT JOIN categories c ON p.category_id = c.id
             app.logger.info(f"Restored {affected_rows} products to their pre-discount prices")
             
             mysql.connection.commit()
+            invalidate_catalog_cache()
             cur.close()
 
             app.logger.info(f"User {session['user_id']} successfully removed all discounts from {affected_rows} products")
@@ -6335,6 +6183,7 @@ LEFT JOIN categories c ON p.category_id = c.id
 
             mysql.connection.commit()
             cur.close()
+            VolumeDiscount.invalidate()
 
             return jsonify({
                 'success': True,
@@ -6387,6 +6236,7 @@ LEFT JOIN categories c ON p.category_id = c.id
 
             mysql.connection.commit()
             cur.close()
+            VolumeDiscount.invalidate()
 
             return jsonify({
                 'success': True,
@@ -6441,6 +6291,7 @@ LEFT JOIN categories c ON p.category_id = c.id
 
             mysql.connection.commit()
             cur.close()
+            VolumeDiscount.invalidate()
 
             app.logger.info(f"Volume discount rule {rule_id} ({rule[1]}) deleted successfully by user {session['user_id']}")
 
@@ -6473,42 +6324,20 @@ LEFT JOIN categories c ON p.category_id = c.id
                     }
                 })
 
-            conn = mysql.connection
-            cur = conn.cursor()
-
-            # Find the best applicable volume discount rule
-            cur.execute("""
-                SELECT id, name, discount_percentage, max_discount_amount
-                FROM volume_discount_rules
-                WHERE minimum_amount <= %s AND is_active = TRUE
-                ORDER BY minimum_amount DESC
-                LIMIT 1
-            """, (cart_total,))
-
-            rule = cur.fetchone()
-            cur.close()
-
-            if rule:
-                rule_id, rule_name, discount_percentage, _ = rule
-
-                # Convert Decimal to float for calculations
-                discount_percentage = float(discount_percentage)
-
-                # Calculate discount amount (no maximum limit)
-                discount_amount = cart_total * (discount_percentage / 100)
-
-                final_total = cart_total - discount_amount
+            # Find the best applicable volume discount rule (in-memory rule index, no DB hit)
+            volume_discount = VolumeDiscount.quote(cart_total)
 
+            if volume_discount['applicable']:
                 return jsonify({
                     'success': True,
                     'volume_discount': {
                         'applicable': True,
-                        'rule_id': rule_id,
-                        'rule_name': rule_name,
-                        'discount_percentage': float(discount_percentage),
-                        'discount_amount': round(discount_amount, 2),
-                        'final_total': round(final_total, 2),
-                        'savings': round(discount_amount, 2),
+                        'rule_id': volume_discount['rule_id'],
+                        'rule_name': volume_discount['rule_name'],
+                        'discount_percentage': volume_discount['discount_percentage'],
+                        'discount_amount': round(volume_discount['discount_amount'], 2),
+                        'final_total': round(volume_discount['final_total'], 2),
+                        'savings': round(volume_discount['discount_amount'], 2),
                         'original_total': cart_total
                     }
                 })
@@ -6854,66 +6683,12 @@ LEFT JOIN categories c ON p.category_id = c.id
             return jsonify({'success': False, 'error': 'Not authenticated'}), 403
 
         try:
-            page = int(request.args.get('page', 1))
-            per_page = int(request.args.get('per_page', 10))
+            page = max(1, int(request.args.get('page', 1)))
+            per_page = min(100, max(1, int(request.args.get('per_page', 10))))
             search = request.args.get('search') or ''
-            app.logger.info(f"Customer search request - page: {page}, per_page: {per_page}, search: '{search}' (length: {len(search)}, has_spaces: {' ' in search})")
 
-            conn = mysql.connection
-            cur = conn.cursor()
-            
-
-
-            # Build search query - Simple and flexible like inventory search
-            if search and search.strip():
-                # Clean the search query: remove extra spaces but preserve single spaces
-                clean_search = ' '.join(search.split())
-                app.logger.info(f"Executing search with cleaned query: '{clean_search}' (original: '{search}')")
-                
-                # Use simple LIKE search (case-insensitive by default in MySQL)
-                # This works for both single words and phrases with spaces
-                search_query = """
-                    SELECT id, first_name, last_name, email, phone, address, created_at
-                    FROM customers
-                    WHERE (LOWER(first_name) LIKE LOWER(%s) 
-                       OR LOWER(last_name) LIKE LOWER(%s) 
-                       OR LOWER(email) LIKE LOWER(%s) 
-                       OR LOWER(phone) LIKE LOWER(%s)
-                       OR LOWER(CONCAT(first_name, ' ', last_name)) LIKE LOWER(%s))
-                       AND deleted_at IS NULL
-                    ORDER BY created_at DESC
-                """
-                search_param = f"%{clean_search}%"
-                cur.execute(search_query, (search_param, search_param, search_param, search_param, search_param))
-                app.logger.info(f"Executing search with parameter: '{search_param}'")
-            else:
-                app.logger.info("No search query, fetching all active customers")
-                cur.execute("""
-                    SELECT id, first_name, last_name, email, phone, address, created_at
-                    FROM customers
-                    WHERE deleted_at IS NULL
-                    ORDER BY created_at DESC
-                """)
-
-            all_customers = cur.fetchall()
-            total_customers = len(all_customers)
-            app.logger.info(f"Search returned {total_customers} customers")
-            
-            # Log first few results for debugging
-            if all_customers and total_customers > 0:
-                app.logger.info(f"First customer: {all_customers[0]}")
-                if total_customers > 1:
-                    app.logger.info(f"Second customer: {all_customers[1]}")
-
-            # Calculate pagination
-            offset = (page - 1) * per_page
-            paginated_customers = all_customers[offset:offset + per_page]
-
-            # Convert to dict format
-            columns = [desc[0] for desc in cur.description]
-            customers = [dict(zip(columns, row)) for row in paginated_customers]
-
-            cur.close()
+            # Only the requested page is fetched; the total is a (cached) COUNT of the same search
+            customers, total_customers = Customer.get_page(search, page, per_page)
 
             return jsonify({
                 'success': True,
@@ -7005,6 +6780,76 @@ LEFT JOIN categories c ON p.category_id = c.id
             app.logger.error(f"Error restoring customer: {e}")
             return jsonify({'success': False, 'error': str(e)}), 500
 
+    CUSTOMER_EXPORT_HEADER = ['ID', 'First Name', 'Last Name', 'Email', 'Phone', 'Address', 'Created Date']
+    ORDER_EXPORT_HEADER = ['Customer ID', 'Customer Name', 'Email', 'Phone', 'Address', 'Product Names',
+                           'Order ID', 'Order Date', 'Total Amount', 'Status']
+    CUSTOMER_EXPORT_SQL = """
+        SELECT id, first_name, last_name, email, phone, address, created_at
+        FROM customers
+        WHERE deleted_at IS NULL{selection}
+        ORDER BY id
+    """
+    # One row per customer x order (order_id NULL for customers without orders)
+    ORDER_EXPORT_SQL = """
+        SELECT c.id, c.first_name, c.last_name, c.email, c.phone, c.address,
+               o.id as order_id, o.order_date, o.total_amount, o.status, o.approval_status,
+               GROUP_CONCAT(p.name SEPARATOR ', ') as product_names
+        FROM customers c
+        LEFT JOIN orders o ON c.id = o.customer_id
+        LEFT JOIN order_items oi ON o.id = oi.order_id
+        LEFT JOIN products p ON oi.product_id = p.id
+        WHERE c.deleted_at IS NULL{selection}
+        GROUP BY c.id, o.id
+        ORDER BY c.id, o.order_date DESC
+    """
+    # Row counts of the two exports above for job progress: same filter, no item/product joins or grouping
+    CUSTOMER_EXPORT_COUNT_SQL = """
+        SELECT COUNT(*) FROM customers WHERE deleted_at IS NULL{selection}
+    """
+    ORDER_EXPORT_COUNT_SQL = """
+        SELECT COUNT(*)
+        FROM customers c
+        LEFT JOIN orders o ON c.id = o.customer_id
+        WHERE c.deleted_at IS NULL{selection}
+    """
+
+    def _export_filter(customer_ids, column):
+        """WHERE fragment and params for the 'all' / list-of-ids selection sent by the export buttons"""
+        if customer_ids == 'all':
+            return "", []
+        return f" AND {column} IN ({', '.join(['%s'] * len(customer_ids))})", list(customer_ids)
+
+    def _customer_export_row(customer):
+        created_at = customer['created_at']
+        return [
+            customer['id'],
+            customer['first_name'] or '',
+            customer['last_name'] or '',
+            customer['email'] or '',
+            customer.get('phone') or '',
+            customer.get('address') or '',
+            created_at.strftime("%Y-%m-%d %H:%M:%S") if created_at else ''
+        ]
+
+    def _order_export_row(customer, order):
+        customer_columns = [
+            customer['id'],
+            f"{customer['first_name']} {customer['last_name']}",
+            customer['email'] or '',
+            customer.get('phone') or '',
+            customer.get('address') or ''
+        ]
+        if not order or not order.get('order_id'):  # Customer with no orders
+            return customer_columns + ['No Orders', '', '', '', '']
+        order_date = order['order_date']
+        return customer_columns + [
+            order.get('product_names') or '',
+            order['order_id'],
+            order_date.strftime("%Y-%m-%d %H:%M:%S") if order_date else '',
+            f"${order['total_amount']}",
+            order['status']
+        ]
+
     @app.route('/staff/customers/export', methods=['POST'])
     def export_customers():
         if 'username' not in session:
@@ -7016,90 +6861,15 @@ LEFT JOIN categories c ON p.category_id = c.id
             
             app.logger.info(f"Export request - customer_ids: {customer_ids}")
             
-            if not mysql.connection:
-                app.logger.error("No database connection available")
-                return jsonify({'success': False, 'error': 'Database connection not available'}), 500
-            
-            # Try to create cursor with dictionary support, fallback to regular cursor
-            try:
-                cursor = mysql.connection.cursor(dictionary=True)
-                use_dict_cursor = True
-            except TypeError:
-                cursor = mysql.connection.cursor()
-                use_dict_cursor = False
-            
-            if customer_ids == 'all':
-                # Export all active customers
-                cursor.execute("""
-                    SELECT id, first_name, last_name, email, phone, address, created_at
-                    FROM customers
-                    WHERE deleted_at IS NULL
-                    ORDER BY id
-                """)
-            else:
-                # Export selected customers
-                placeholders = ', '.join(['%s'] * len(customer_ids))
-                cursor.execute(f"""
-                    SELECT id, first_name, last_name, email, phone, address, created_at
-                    FROM customers
-                    WHERE id IN ({placeholders}) AND deleted_at IS NULL
-                    ORDER BY id
-                """, tuple(customer_ids))
-            
-            customers = cursor.fetchall()
-            
-            # Get column names before closing cursor (for regular cursor conversion)
-            if not use_dict_cursor:
-                columns = [desc[0] for desc in cursor.description]
-            
-            cursor.close()
-            
-            app.logger.info(f"Found {len(customers)} customers to export")
-            
-            # Convert to dictionary format if using regular cursor
-            if not use_dict_cursor:
-                customers = [dict(zip(columns, row)) for row in customers]
-            
-            if customers:
-                app.logger.info(f"Sample customer data: {customers[0]}")
-            
-            if not customers:
-                return jsonify({'success': False, 'error': 'No customers found to export'}), 404
-            
-            # Generate CSV content
-            csv_content = []
-            
-            # Add header row
-            csv_content.append('ID,First Name,Last Name,Email,Phone,Address,Created Date')
-            
-            # Add data rows
-            for customer in customers:
-                # Escape commas and quotes in CSV
-                first_name = customer["first_name"].replace('"', '""') if customer["first_name"] else ""
-                last_name = customer["last_name"].replace('"', '""') if customer["last_name"] else ""
-                email = customer["email"].replace('"', '""') if customer["email"] else ""
-                phone = customer.get("phone", "").replace('"', '""') if customer.get("phone") else ""
-                address = customer.get("address", "").replace('"', '""') if customer.get("address") else ""
-                created_date = customer["created_at"].strftime("%Y-%m-%d %H:%M:%S") if customer["created_at"] else ""
-                
-                row = [
-                    str(customer['id']),
-                    f'"{first_name}"',
-                    f'"{last_name}"',
-                    f'"{email}"',
-                    f'"{phone}"',
-                    f'"{address}"',
-                    f'"{created_date}"'
-                ]
-                csv_content.append(','.join(row))
-            
-            # Return CSV as plain text
-            response = make_response('\n'.join(csv_content))
-            response.headers['Content-Type'] = 'text/csv; charset=utf-8'
-            response.headers['Content-Disposition'] = f'attachment; filename=customers_export_{datetime.now().strftime("%Y%m%d_%H%M%S")}.csv'
+            selection, params = _export_filter(customer_ids, 'id')
+            # Streamed from an unbuffered cursor: rows go out in chunks as they are read
+            rows = stream_query(open_connection, CUSTOMER_EXPORT_SQL.format(selection=selection), params)
             
-            return response
+            filename = f'customers_export_{datetime.now().strftime("%Y%m%d_%H%M%S")}.csv'
+            return csv_response(csv_chunks(CUSTOMER_EXPORT_HEADER, rows, _customer_export_row), filename)
             
+        except EmptyExport:
+            return jsonify({'success': False, 'error': 'No customers found to export'}), 404
         except Exception as e:
             app.logger.error(f"Error exporting customers: {e}")
             app.logger.error(f"Error type: {type(e)}")
@@ -7120,94 +6890,15 @@ LEFT JOIN categories c ON p.category_id = c.id
             
             app.logger.info(f"Export orders request - customer_ids: {customer_ids}, format: {export_format}")
             
-            if not mysql.connection:
-                app.logger.error("No database connection available")
-                return jsonify({'success': False, 'error': 'Database connection not available'}), 500
-            
-            # Try to create cursor with dictionary support, fallback to regular cursor
-            try:
-                cursor = mysql.connection.cursor(dictionary=True)
-                use_dict_cursor = True
-            except TypeError:
-                cursor = mysql.connection.cursor()
-                use_dict_cursor = False
-            
-            if customer_ids == 'all':
-                # Export all active customers with their orders and products
-                cursor.execute("""
-                    SELECT c.id, c.first_name, c.last_name, c.email, c.phone, c.address,
-                           o.id as order_id, o.order_date, o.total_amount, o.status, o.approval_status,
-                           GROUP_CONCAT(p.name SEPARATOR ', ') as product_names
-                    FROM customers c
-                    LEFT JOIN orders o ON c.id = o.customer_id
-                    LEFT JOIN order_items oi ON o.id = oi.order_id
-                    LEFT JOIN products p ON oi.product_id = p.id
-                    WHERE c.deleted_at IS NULL
-                    GROUP BY c.id, o.id
-                    ORDER BY c.id, o.order_date DESC
-                """)
-            else:
-                # Export selected customers with their orders and products
-                placeholders = ', '.join(['%s'] * len(customer_ids))
-                cursor.execute(f"""
-                    SELECT c.id, c.first_name, c.last_name, c.email, c.phone, c.address,
-                           o.id as order_id, o.order_date, o.total_amount, o.status, o.approval_status,
-                           GROUP_CONCAT(p.name SEPARATOR ', ') as product_names
-                    FROM customers c
-                    LEFT JOIN orders o ON c.id = o.customer_id
-                    LEFT JOIN order_items oi ON o.id = oi.order_id
-                    LEFT JOIN products p ON oi.product_id = p.id
-                    WHERE c.id IN ({placeholders}) AND c.deleted_at IS NULL
-                    GROUP BY c.id, o.id
-                    ORDER BY c.id, o.order_date DESC
-                """, tuple(customer_ids))
-            
-            rows = cursor.fetchall()
-            
-            # Get column names before closing cursor (for regular cursor conversion)
-            if not use_dict_cursor:
-                columns = [desc[0] for desc in cursor.description]
-            
-            cursor.close()
-            
-            app.logger.info(f"Found {len(rows)} order records to export")
-            
-            # Convert to dictionary format if using regular cursor
-            if not use_dict_cursor:
-                rows = [dict(zip(columns, row)) for row in rows]
-            
-            if not rows:
-                return jsonify({'success': False, 'error': 'No orders found to export'}), 404
-            
-            # Group orders by customer
-            customers_with_orders = {}
-            for row in rows:
-                customer_id = row['id']
-                if customer_id not in customers_with_orders:
-                    customers_with_orders[customer_id] = {
-                        'customer': {
-                            'id': row['id'],
-                            'first_name': row['first_name'],
-                            'last_name': row['last_name'],
-                            'email': row['email'],
-                            'phone': row['phone'],
-                            'address': row['address']
-                        },
-                        'orders': []
-                    }
-                
-                if row['order_id']:  # Only add if there's an order
-                    customers_with_orders[customer_id]['orders'].append({
-                        'order_id': row['order_id'],
-                        'order_date': row['order_date'],
-                        'total_amount': row['total_amount'],
-                        'status': row['status'],
-                        'product_names': row.get('product_names', '')
-                    })
+            selection, params = _export_filter(customer_ids, 'c.id')
+            rows = stream_query(open_connection, ORDER_EXPORT_SQL.format(selection=selection), params)
             
             # Always return CSV data, PDF will be generated client-side
-            return generate_orders_csv(customers_with_orders)
+            filename = f'customer_orders_export_{datetime.now().strftime("%Y%m%d_%H%M%S")}.csv'
+            return csv_response(csv_chunks(ORDER_EXPORT_HEADER, rows, lambda row: _order_export_row(row, row)), filename)
             
+        except EmptyExport:
+            return jsonify({'success': False, 'error': 'No orders found to export'}), 404
         except Exception as e:
             app.logger.error(f"Error exporting customer orders: {e}")
             app.logger.error(f"Error type: {type(e)}")
@@ -7217,59 +6908,18 @@ LEFT JOIN categories c ON p.category_id = c.id
             return jsonify({'success': False, 'error': str(e)}), 500
 
     def generate_orders_csv(customers_with_orders):
-        """Generate CSV content for customer orders"""
-        csv_content = []
-        
-        # Add header row
-        csv_content.append('Customer ID,Customer Name,Email,Phone,Address,Product Names,Order ID,Order Date,Total Amount,Status')
-        
-        # Add data rows
-        for customer_data in customers_with_orders.values():
-            customer = customer_data['customer']
-            orders = customer_data['orders']
-            
-            if not orders:  # Customer with no orders
-                row = [
-                    str(customer['id']),
-                    f'"{customer["first_name"]} {customer["last_name"]}"',
-                    f'"{customer["email"]}"',
-                    f'"{customer.get("phone", "")}"',
-                    f'"{customer.get("address", "")}"',
-                    'No Orders',
-                    '',
-                    '',
-                    '',
-                    ''
-                ]
-                csv_content.append(','.join(row))
-            else:
-                for order in orders:
-                    row = [
-                        str(customer['id']),
-                        f'"{customer["first_name"]} {customer["last_name"]}"',
-                        f'"{customer["email"]}"',
-                        f'"{customer.get("phone", "")}"',
-                        f'"{customer.get("address", "")}"',
-                        f'"{order.get("product_names", "")}"',
-                        str(order['order_id']),
-                        f'"{order["order_date"].strftime("%Y-%m-%d %H:%M:%S")}"',
-                        f'"${order["total_amount"]}"',
-                        f'"{order["status"]}"'
-                    ]
-                    csv_content.append(','.join(row))
-        
-        # Return CSV as plain text
-        response = make_response('\n'.join(csv_content))
-        response.headers['Content-Type'] = 'text/csv; charset=utf-8'
-        response.headers['Content-Disposition'] = f'attachment; filename=customer_orders_export_{datetime.now().strftime("%Y%m%d_%H%M%S")}.csv'
-        
-        return response
-
-    def generate_orders_pdf(customers_with_orders):
-        """Generate PDF content for customer orders"""
-        try:
-            # Create HTML content for PDF
-            html_content = f"""
+        """Generate CSV content for customer orders grouped as {customer_id: {'customer', 'orders'}}"""
+        rows = (
+            _order_export_row(customer_data['customer'], order)
+            for customer_data in customers_with_orders.values()
+            for order in (customer_data['orders'] or [None])
+        )
+        filename = f'customer_orders_export_{datetime.now().strftime("%Y%m%d_%H%M%S")}.csv'
+        return csv_response(csv_chunks(ORDER_EXPORT_HEADER, rows, lambda values: values), filename)
+
+    def _orders_pdf_html(sections):
+        """HTML for the customer orders PDF; sections yields (customer, orders) pairs"""
+        parts = [f"""
             <!DOCTYPE html>
             <html>
             <head>
@@ -7292,27 +6942,24 @@ LEFT JOIN categories c ON p.category_id = c.id
                     <h1>Customer Orders Report</h1>
                     <p>Generated on {datetime.now().strftime("%Y-%m-%d %H:%M:%S")}</p>
                 </div>
-            """
-            
-            for customer_data in customers_with_orders.values():
-                customer = customer_data['customer']
-                orders = customer_data['orders']
-                
-                html_content += f"""
+            """]
+
+        for customer, orders in sections:
+            parts.append(f"""
                 <div class="customer-section">
                     <div class="customer-info">
                         <h3>{customer['first_name']} {customer['last_name']}</h3>
                         <p><strong>ID:</strong> {customer['id']}</p>
                         <p><strong>Email:</strong> {customer['email']}</p>
-                        <p><strong>Phone:</strong> {customer.get('phone', 'N/A')}</p>
-                        <p><strong>Address:</strong> {customer.get('address', 'N/A')}</p>
+                        <p><strong>Phone:</strong> {customer.get('phone') or 'N/A'}</p>
+                        <p><strong>Address:</strong> {customer.get('address') or 'N/A'}</p>
                     </div>
-                """
-                
-                if not orders:
-                    html_content += '<p class="no-orders">No orders found for this customer.</p>'
-                else:
-                    html_content += """
+                """)
+
+            if not orders:
+                parts.append('<p class="no-orders">No orders found for this customer.</p>')
+            else:
+                parts.append("""
                     <table class="orders-table">
                         <thead>
                             <tr>
@@ -7324,40 +6971,50 @@ LEFT JOIN categories c ON p.category_id = c.id
                             </tr>
                         </thead>
                         <tbody>
-                    """
-                    
-                    total_amount = 0
-                    for order in orders:
-                        amount = float(order['total_amount']) if order['total_amount'] else 0
-                        total_amount += amount
-                        html_content += f"""
+                    """)
+
+                total_amount = 0
+                for order in orders:
+                    amount = float(order['total_amount']) if order['total_amount'] else 0
+                    total_amount += amount
+                    parts.append(f"""
                             <tr>
                                 <td>{order['order_id']}</td>
                                 <td>{order['order_date'].strftime("%Y-%m-%d %H:%M:%S")}</td>
                                 <td>${amount:.2f}</td>
                                 <td>{order['status']}</td>
-                                <td>{order['approval_status']}</td>
+                                <td>{order.get('approval_status')}</td>
                             </tr>
-                        """
-                    
-                    html_content += f"""
+                        """)
+
+                parts.append(f"""
                             <tr class="total-row">
                                 <td colspan="2"><strong>Total Orders:</strong> {len(orders)}</td>
                                 <td colspan="3"><strong>Total Amount:</strong> ${total_amount:.2f}</td>
                             </tr>
                         </tbody>
                     </table>
-                    """
-                
-                html_content += "</div>"
-            
-            html_content += """
+                    """)
+
+            parts.append("</div>")
+
+        parts.append("""
             </body>
             </html>
-            """
+            """)
+        return ''.join(parts)
+
+    def generate_orders_pdf(customers_with_orders):
+        """Generate PDF content for customer orders"""
+        try:
+            html_content = _orders_pdf_html(
+                (customer_data['customer'], customer_data['orders']) for customer_data in customers_with_orders.values()
+            )
             
             # Generate PDF using pdfkit
             try:
+                if pdfkit is None:
+                    raise RuntimeError("pdfkit is not installed")
                 pdf = pdfkit.from_string(html_content, False)
                 response = make_response(pdf)
                 response.headers['Content-Type'] = 'application/pdf'
@@ -7373,6 +7030,132 @@ LEFT JOIN categories c ON p.category_id = c.id
             # Fallback to CSV if HTML generation fails
             return generate_orders_csv(customers_with_orders)
 
+    # Background export jobs: the same exports rendered to a file on the job thread pool
+
+    def _counted(rows, progress, total):
+        for done, row in enumerate(rows, 1):
+            progress.update(done, total)
+            yield row
+
+    def _export_count(count_sql, selection, params):
+        """Row count of an export, for job progress"""
+        cur = mysql.connection.cursor()
+        try:
+            cur.execute(count_sql.format(selection=selection), params)
+            return cur.fetchone()[0]
+        finally:
+            cur.close()
+
+    def _order_sections(rows):
+        """(customer, orders) per customer, built as the export rows (ordered by customer) stream past"""
+        for _, group in groupby(rows, key=lambda row: row['id']):
+            group = list(group)
+            yield group[0], [row for row in group if row['order_id']]
+
+    def _write_csv(path, header, rows, to_row):
+        with open(path, 'w', newline='', encoding='utf-8') as f:
+            for chunk in csv_chunks(header, rows, to_row):
+                f.write(chunk)
+
+    def _stream_export(sql, count_sql, column, params, empty_message):
+        selection, sql_params = _export_filter(params.get('customer_ids', 'all'), column)
+        total = _export_count(count_sql, selection, sql_params)
+        try:
+            return stream_query(open_connection, sql.format(selection=selection), sql_params), total
+        except EmptyExport:
+            raise EmptyExport(empty_message)
+
+    def customers_csv_job(params, path, progress):
+        rows, total = _stream_export(CUSTOMER_EXPORT_SQL, CUSTOMER_EXPORT_COUNT_SQL, 'id', params, 'No customers found to export')
+        _write_csv(path, CUSTOMER_EXPORT_HEADER, _counted(rows, progress, total), _customer_export_row)
+        return f'customers_export_{datetime.now().strftime("%Y%m%d_%H%M%S")}.csv', 'text/csv'
+
+    def customer_orders_csv_job(params, path, progress):
+        rows, total = _stream_export(ORDER_EXPORT_SQL, ORDER_EXPORT_COUNT_SQL, 'c.id', params, 'No orders found to export')
+        _write_csv(path, ORDER_EXPORT_HEADER, _counted(rows, progress, total), lambda row: _order_export_row(row, row))
+        return f'customer_orders_export_{datetime.now().strftime("%Y%m%d_%H%M%S")}.csv', 'text/csv'
+
+    def customer_orders_pdf_job(params, path, progress):
+        if pdfkit is None:
+            app.logger.warning("pdfkit is not installed - exporting customer orders as CSV instead")
+            return customer_orders_csv_job(params, path, progress)
+        rows, total = _stream_export(ORDER_EXPORT_SQL, ORDER_EXPORT_COUNT_SQL, 'c.id', params, 'No orders found to export')
+        html_content = _orders_pdf_html(_order_sections(_counted(rows, progress, total)))
+        progress.update(total, total, message='Rendering PDF')
+        pdfkit.from_string(html_content, path)
+        return f'customer_orders_export_{datetime.now().strftime("%Y%m%d_%H%M%S")}.pdf', 'application/pdf'
+
+    export_jobs.init_app(app)
+    export_jobs.register('customers_csv', customers_csv_job)
+    export_jobs.register('customer_orders_csv', customer_orders_csv_job)
+    export_jobs.register('customer_orders_pdf', customer_orders_pdf_job)
+
+    def _job_urls(job):
+        urls = {'status_url': url_for('export_job_status', job_id=job['id'])}
+        if job['status'] == 'completed':
+            urls['download_url'] = url_for('download_export_job', job_id=job['id'])
+        return urls
+
+    def _owned_job(job_id):
+        job = export_jobs.get(job_id)
+        if not job or job['owner_id'] != session.get('user_id'):
+            return None
+        return job
+
+    @app.route('/staff/exports/jobs', methods=['POST'])
+    def submit_export_job():
+        """Queue a customer/order export; poll status_url, then fetch download_url"""
+        if 'username' not in session:
+            return jsonify({'success': False, 'error': 'Not authenticated'}), 401
+
+        data = request.get_json(silent=True) or {}
+        customer_ids = data.get('customer_ids', 'all')
+        if customer_ids != 'all':
+            try:
+                customer_ids = sorted({int(customer_id) for customer_id in customer_ids})
+            except (TypeError, ValueError):
+                return jsonify({'success': False, 'error': 'customer_ids must be "all" or a list of ids'}), 400
+            if not customer_ids:
+                return jsonify({'success': False, 'error': 'No customers selected'}), 400
+
+        try:
+            job = export_jobs.submit(data.get('type', 'customer_orders_csv'), {'customer_ids': customer_ids},
+                                     owner_id=session.get('user_id'))
+        except UnknownJobKind as e:
+            return jsonify({'success': False, 'error': str(e)}), 400
+        except Exception as e:
+            app.logger.error(f"Error submitting export job: {e}")
+            return jsonify({'success': False, 'error': str(e)}), 500
+
+        return jsonify({'success': True, 'job': job_status(job), **_job_urls(job)}), 202
+
+    @app.route('/staff/exports/jobs/<job_id>')
+    def export_job_status(job_id):
+        if 'username' not in session:
+            return jsonify({'success': False, 'error': 'Not authenticated'}), 401
+        try:
+            job = _owned_job(job_id)
+        except Exception as e:
+            app.logger.error(f"Error reading export job {job_id}: {e}")
+            return jsonify({'success': False, 'error': str(e)}), 500
+        if not job:
+            return jsonify({'success': False, 'error': 'Job not found'}), 404
+        return jsonify({'success': True, 'job': job_status(job), **_job_urls(job)})
+
+    @app.route('/staff/exports/jobs/<job_id>/download')
+    def download_export_job(job_id):
+        if 'username' not in session:
+            return jsonify({'success': False, 'error': 'Not authenticated'}), 401
+        job = _owned_job(job_id)
+        if not job:
+            return jsonify({'success': False, 'error': 'Job not found'}), 404
+        if job['status'] != 'completed':
+            return jsonify({'success': False, 'error': f"Job is {job['status']}", 'job': job_status(job)}), 409
+        path = export_jobs.result_path(job)
+        if not path:
+            return jsonify({'success': False, 'error': 'Export file has expired - please run the export again'}), 410
+        return send_file(path, mimetype=job['content_type'], as_attachment=True, download_name=job['file_name'])
+
     @app.route('/staff/customers/deleted', methods=['GET'])
     def get_deleted_customers():
         try:
@@ -7623,7 +7406,7 @@ LEFT JOIN categories c ON p.category_id = c.id
                 JOIN products p ON oi.product_id = p.id
                 JOIN categories c ON p.category_id = c.id
                 JOIN orders o ON oi.order_id = o.id
-                WHERE LOWER(o.status) IN ('completed', 'processing')
+                WHERE o.status IN ('COMPLETED', 'PROCESSING')
                 AND (p.archived IS NULL OR p.archived = FALSE)
                 GROUP BY c.id, c.name
                 ORDER BY total_revenue DESC
@@ -8059,19 +7842,10 @@ LEFT JOIN categories c ON p.category_id = c.id
         if not query:
             return jsonify({'success': True, 'suggestions': []})
         try:
-            cur = mysql.connection.cursor()
-            like_query = f"%{query}%"
-            cur.execute("""
-                SELECT id, name FROM products
-                WHERE name LIKE %s
-                AND (archived IS NULL OR archived = FALSE)
-                ORDER BY name ASC
-                LIMIT 10
-            """, (like_query,))
-            results = cur.fetchall()
-            cur.close()
-            suggestions = [{'id': row[0], 'name': row[1]} for row in results]
-            return jsonify({'success': True, 'suggestions': suggestions})
+            response = jsonify({'success': True, 'suggestions': Product.suggest(query)})
+            # Let the browser reuse answers for prefixes it already asked about while the user types
+            response.headers['Cache-Control'] = 'public, max-age=30'
+            return response
         except Exception as e:
             app.logger.error(f"Error fetching search suggestions: {e}")
             return jsonify({'success': False, 'suggestions': [], 'error': str(e)}), 500
@@ -8091,42 +7865,11 @@ LEFT JOIN categories c ON p.category_id = c.id
             
             # For years other than 2025, we'll need to check if data exists
             # For now, we'll use 2025 data as fallback for other years
-            if current_year != 2025:
-                # Check if we have data for the requested year
-                conn = get_db()
-                cur = conn.cursor()
-                cur.execute("""
-                    SELECT COUNT(*) FROM orders 
-                    WHERE YEAR(order_date) = %s AND LOWER(status) = 'completed'
-                """, (current_year,))
-                count = cur.fetchone()[0]
-                cur.close()
-                
-                if count == 0:
-                    # No data for this year, use 2025 data as fallback
-                    current_year = 2025
-            
-            start_date = f"{current_year}-01-01"
-            end_date = f"{current_year}-12-31"
+            if current_year != 2025 and not Report.has_sales_in_year(current_year):
+                # No data for this year, use 2025 data as fallback
+                current_year = 2025
 
-            cur = mysql.connection.cursor()
-            cur.execute("""
-                SELECT
-                    DATE_FORMAT(o.order_date, '%%Y-%%m') as month,
-                    COUNT(DISTINCT o.id) as orders_count,
-                    SUM(oi.quantity * oi.price) as monthly_revenue
-                FROM orders o
-                JOIN order_items oi ON o.id = oi.order_id
-                JOIN products p ON oi.product_id = p.id
-                WHERE o.order_date BETWEEN %s AND %s
-                AND LOWER(o.status) = 'completed'
-                AND (p.archived IS NULL OR p.archived = FALSE)
-                GROUP BY DATE_FORMAT(o.order_date, '%%Y-%%m')
-                ORDER BY month ASC
-            """, (start_date, end_date))
-
-            results = cur.fetchall()
-            cur.close()
+            results = Report.get_monthly_revenue(current_year)
 
             # Create a complete list of months from Jan to December
             months = [
@@ -8146,9 +7889,9 @@ LEFT JOIN categories c ON p.category_id = c.id
 
             # Fill in actual revenue and order count data
             for row in results:
-                month_key = row[0]
-                orders_count = int(row[1]) if row[1] is not None else 0
-                revenue = float(row[2]) if row[2] is not None else 0.0
+                month_key = row['month']
+                orders_count = row['orders_count']
+                revenue = row['monthly_revenue']
                 for month_data in months:
                     if month_data['month'] == month_key:
                         month_data['orders_count'] = orders_count
@@ -8174,31 +7917,14 @@ LEFT JOIN categories c ON p.category_id = c.id
             last_day_num = calendar.monthrange(today.year, today.month)[1]
             last_day = today.replace(day=last_day_num)
 
-            cur = mysql.connection.cursor()
-            cur.execute("""
-                SELECT
-                    DATE(o.order_date) as order_date,
-                    COUNT(DISTINCT o.id) as orders_count,
-                    SUM(oi.quantity * oi.price) as daily_revenue
-                FROM orders o
-                JOIN order_items oi ON o.id = oi.order_id
-                JOIN products p ON oi.product_id = p.id
-                WHERE DATE(o.order_date) BETWEEN %s AND %s
-                AND LOWER(o.status) = 'completed'
-                AND (p.archived IS NULL OR p.archived = FALSE)
-                GROUP BY DATE(o.order_date)
-                ORDER BY order_date ASC
-            """, (first_day, last_day))
-
-            results = cur.fetchall()
-            cur.close()
+            results = Report.get_daily_revenue(first_day, last_day)
 
             # Format the results
             revenue_data = []
             for row in results:
-                order_date = row[0]
-                orders_count = row[1]
-                daily_revenue = float(row[2]) if row[2] is not None else 0.0
+                order_date = row['sale_date']
+                orders_count = row['orders_count']
+                daily_revenue = float(row['revenue']) if row['revenue'] is not None else 0.0
 
                 revenue_data.append({
                     'date': order_date.strftime('%Y-%m-%d'),
@@ -8478,34 +8204,18 @@ LEFT JOIN categories c ON p.category_id = c.id
     def get_daily_sales_data(date):
         """Get daily sales data including estimated profit"""
         try:
-            cur = mysql.connection.cursor()
-            
             # Get total sales and orders count for the day
-            query = """
-                SELECT 
-                    COUNT(*) as orders_count,
-                    COALESCE(SUM(total_amount), 0) as total_sales
-                FROM orders 
-                WHERE DATE(order_date) = %s AND LOWER(status) = 'completed'
-            """
-            cur.execute(query, (date,))
-            result = cur.fetchone()
-            cur.close()
-            
-            if result:
-                orders_count = result[0] or 0
-                total_sales = float(result[1] or 0)
-                
-                # Calculate estimated profit (assume 15% profit margin)
-                daily_profit = total_sales * 0.15
-                
-                return {
-                    'orders_count': orders_count,
-                    'total_sales': total_sales,
-                    'daily_profit': daily_profit
-                }
-            
-            return {'orders_count': 0, 'total_sales': 0, 'daily_profit': 0}
+            summary = Report.get_day_summary(date)
+            total_sales = summary['total_sales']
+
+            # Calculate estimated profit (assume 15% profit margin)
+            daily_profit = total_sales * 0.15
+
+            return {
+                'orders_count': summary['orders_count'],
+                'total_sales': total_sales,
+                'daily_profit': daily_profit
+            }
             
         except Exception as e:
             app.logger.error(f"Error getting daily sales data: {str(e)}")
@@ -8538,7 +8248,7 @@ LEFT JOIN categories c ON p.category_id = c.id
             query = """
                 SELECT total_amount
                 FROM orders 
-                WHERE id = %s AND LOWER(status) = 'completed'
+                WHERE id = %s AND status = 'COMPLETED'
             """
             cur.execute(query, (order_id,))
             result = cur.fetchone()
@@ -8605,29 +8315,15 @@ LEFT JOIN categories c ON p.category_id = c.id
             if not date:
                 date = datetime.now().strftime('%Y-%m-%d')
             
-            cursor = mysql.connection.cursor()
-            
-            # Get today's revenue for COMPLETED orders or APPROVED orders
-            query = """
-                SELECT 
-                    COALESCE(SUM(o.total_amount), 0) as total_revenue,
-                    COALESCE(SUM(oi.quantity * (oi.price - p.original_price)), 0) as total_profit
-                FROM orders o
-                JOIN order_items oi ON o.id = oi.order_id
-                JOIN products p ON oi.product_id = p.id
-                WHERE DATE(o.order_date) = %s 
-                AND (LOWER(o.status) = 'completed' OR o.approval_status = 'APPROVED')
-            """
-            
-            app.logger.info(f"Executing today revenue query: {query} with date: {date}")
-            cursor.execute(query, (date,))
-            
-            row = cursor.fetchone()
-            total_revenue = float(row[0]) if row[0] else 0.0
-            total_profit = float(row[1]) if row[1] else 0.0
+            # Get today's revenue for COMPLETED orders (from the rollup) or APPROVED orders.
+            # Approval does not change an order's status, so approved orders that are not
+            # completed yet are added separately, matching the daily sales detail list.
+            summary = Report.get_day_summary(date)
+            approved = Report.get_day_approved_open(date)
+            total_revenue = summary['total_sales'] + approved['total_sales']
+            total_profit = summary['total_profit'] + approved['total_profit']
             
             app.logger.info(f"Today's revenue: ${total_revenue}, Profit: ${total_profit}")
-            cursor.close()
             
             return jsonify({
                 'success': True,
@@ -8917,9 +8613,10 @@ LEFT JOIN categories c ON p.category_id = c.id
             params = []
 
             if search_query:
-                where_conditions.append("(p.name LIKE %s OR p.description LIKE %s)")
-                search_param = f"%{search_query}%"
-                params.extend([search_param, search_param])
+                # Match name/specs/category/description through the search index
+                matching_ids = Product.search_ids(search_query) or [0]
+                where_conditions.append(f"p.id IN ({','.join(['%s'] * len(matching_ids))})")
+                params.extend(matching_ids)
 
             # Map category names to database category IDs
             if category and category != 'all':
@@ -9023,6 +8720,7 @@ LEFT JOIN categories c ON p.category_id = c.id
             return jsonify({'success': False, 'error': str(e)}), 500
 
     @app.route('/api/walk-in/process-sale', methods=['POST'])
+    @idempotent(idempotency_store, scope=lambda: f"walk-in-sale:{session.get('user_id')}")
     def api_process_walk_in_sale():
         """Process a walk-in sale"""
         if 'user_id' not in session or session.get('role') not in ['staff', 'admin', 'super_admin']:
@@ -9038,197 +8736,157 @@ LEFT JOIN categories c ON p.category_id = c.id
             if not items:
                 return jsonify({'success': False, 'error': 'No items in cart'}), 400
 
-            conn = mysql.connection
-            cur = conn.cursor()
+            with mysql.transaction():
+                conn = mysql.connection
+                cur = conn.cursor()
 
-            # Calculate total
-            total_amount = sum(item['price'] * item['quantity'] for item in items)
-
-            # Validate cash payment
-            if payment_method == 'cash' and (not cash_received or cash_received < total_amount):
-                return jsonify({'success': False, 'error': 'Insufficient cash received'}), 400
-
-            # Check stock availability
-            for item in items:
-                cur.execute("SELECT stock FROM products WHERE id = %s", (item['id'],))
-                result = cur.fetchone()
-                if not result or result[0] < item['quantity']:
-                    return jsonify({'success': False, 'error': f'Insufficient stock for {item["name"]}'}), 400
-
-            # Create or get customer - ALWAYS create a customer record for walk-in sales
-            customer_id = None
-
-            if (customer_info.get('first_name') or customer_info.get('last_name') or
-                customer_info.get('email') or customer_info.get('phone')):
-
-                # Customer provided information - check if customer exists by email or phone
-                existing_customer = None
-                if customer_info.get('email'):
-                    cur.execute("SELECT id FROM customers WHERE email = %s", (customer_info['email'],))
-                    existing_customer = cur.fetchone()
-
-                if not existing_customer and customer_info.get('phone'):
-                    cur.execute("SELECT id FROM customers WHERE phone = %s", (customer_info['phone'],))
-                    existing_customer = cur.fetchone()
-
-                if existing_customer:
-                    customer_id = existing_customer[0]
-                    # Update customer information if provided
-                    if customer_info.get('first_name') or customer_info.get('last_name') or customer_info.get('address'):
-                        update_fields = []
-                        update_values = []
-
-                        if customer_info.get('first_name'):
-                            update_fields.append("first_name = %s")
-                            update_values.append(customer_info['first_name'])
-                        if customer_info.get('last_name'):
-                            update_fields.append("last_name = %s")
-                            update_values.append(customer_info['last_name'])
-                        if customer_info.get('address'):
-                            update_fields.append("address = %s")
-                            update_values.append(customer_info['address'])
-
-                        if update_fields:
-                            update_values.append(customer_id)
-                            cur.execute(f"""
-                                UPDATE customers SET {', '.join(update_fields)} WHERE id = %s
-                            """, update_values)
+                # Calculate total
+                total_amount = sum(item['price'] * item['quantity'] for item in items)
+
+                # Validate cash payment
+                if payment_method == 'cash' and (not cash_received or cash_received < total_amount):
+                    return jsonify({'success': False, 'error': 'Insufficient cash received'}), 400
+
+                # Check stock availability (one query for the whole sale)
+                products_by_id = Product.get_many(item['id'] for item in items)
+                for item in items:
+                    product = products_by_id.get(int(item['id']))
+                    if not product or product['available_stock'] < item['quantity']:
+                        return jsonify({'success': False, 'error': f'Insufficient stock for {item["name"]}'}), 400
+
+                # Create or get customer - ALWAYS create a customer record for walk-in sales
+                customer_id = None
+
+                if (customer_info.get('first_name') or customer_info.get('last_name') or
+                    customer_info.get('email') or customer_info.get('phone')):
+
+                    # Customer provided information - check if customer exists by email or phone
+                    existing_customer = None
+                    if customer_info.get('email'):
+                        cur.execute("SELECT id FROM customers WHERE email = %s", (customer_info['email'],))
+                        existing_customer = cur.fetchone()
+
+                    if not existing_customer and customer_info.get('phone'):
+                        cur.execute("SELECT id FROM customers WHERE phone = %s", (customer_info['phone'],))
+                        existing_customer = cur.fetchone()
+
+                    if existing_customer:
+                        customer_id = existing_customer[0]
+                        # Update customer information if provided
+                        if customer_info.get('first_name') or customer_info.get('last_name') or customer_info.get('address'):
+                            update_fields = []
+                            update_values = []
+
+                            if customer_info.get('first_name'):
+                                update_fields.append("first_name = %s")
+                                update_values.append(customer_info['first_name'])
+                            if customer_info.get('last_name'):
+                                update_fields.append("last_name = %s")
+                                update_values.append(customer_info['last_name'])
+                            if customer_info.get('address'):
+                                update_fields.append("address = %s")
+                                update_values.append(customer_info['address'])
+
+                            if update_fields:
+                                update_values.append(customer_id)
+                                cur.execute(f"""
+                                    UPDATE customers SET {', '.join(update_fields)} WHERE id = %s
+                                """, update_values)
+                    else:
+                        # Create new customer with provided information
+                        from werkzeug.security import generate_password_hash
+                        default_password = generate_password_hash('walkin123')
+                        cur.execute("""
+                            INSERT INTO customers (first_name, last_name, email, phone, address, password, created_at)
+                            VALUES (%s, %s, %s, %s, %s, %s, NOW())
+                        """, (
+                            customer_info.get('first_name', '') or 'Walk-in',
+                            customer_info.get('last_name', '') or 'Customer',
+                            customer_info.get('email'),
+                            customer_info.get('phone'),
+                            customer_info.get('address'),
+                            default_password
+                        ))
+                        customer_id = cur.lastrowid
                 else:
-                    # Create new customer with provided information
-                    from werkzeug.security import generate_password_hash
-                    default_password = generate_password_hash('walkin123')
+                    # No customer information provided - create anonymous walk-in customer
+                    # Check if a generic walk-in customer already exists
                     cur.execute("""
-                        INSERT INTO customers (first_name, last_name, email, phone, address, password, created_at)
-                        VALUES (%s, %s, %s, %s, %s, %s, NOW())
-                    """, (
-                        customer_info.get('first_name', '') or 'Walk-in',
-                        customer_info.get('last_name', '') or 'Customer',
-                        customer_info.get('email'),
-                        customer_info.get('phone'),
-                        customer_info.get('address'),
-                        default_password
-                    ))
-                    customer_id = cur.lastrowid
-            else:
-                # No customer information provided - create anonymous walk-in customer
-                # Check if a generic walk-in customer already exists
+                        SELECT id FROM customers
+                        WHERE first_name = 'Walk-in' AND last_name = 'Customer'
+                        AND email IS NULL AND phone IS NULL
+                        LIMIT 1
+                    """)
+                    existing_walkin = cur.fetchone()
+
+                    if existing_walkin:
+                        customer_id = existing_walkin[0]
+                    else:
+                        # Create a new anonymous walk-in customer record
+                        from werkzeug.security import generate_password_hash
+                        default_password = generate_password_hash('walkin123')
+                        cur.execute("""
+                            INSERT INTO customers (first_name, last_name, email, phone, address, password, created_at)
+                            VALUES ('Walk-in', 'Customer', NULL, NULL, NULL, %s, NOW())
+                        """, (default_password,))
+                        customer_id = cur.lastrowid
+
+                # Create order with completed status but pending approval for walk-in sales
+                # Walk-in sales are immediate transactions, so status is 'Completed'
+                # but approval_status remains 'Pending Approval' for staff review
                 cur.execute("""
-                    SELECT id FROM customers
-                    WHERE first_name = 'Walk-in' AND last_name = 'Customer'
-                    AND email IS NULL AND phone IS NULL
-                    LIMIT 1
-                """)
-                existing_walkin = cur.fetchone()
+                    INSERT INTO orders (customer_id, order_date, status, total_amount, payment_method, approval_status)
+                    VALUES (%s, NOW(), 'COMPLETED', %s, %s, 'Pending Approval')
+                """, (customer_id, total_amount, payment_method.upper()))
+                order_id = cur.lastrowid
 
-                if existing_walkin:
-                    customer_id = existing_walkin[0]
-                else:
-                    # Create a new anonymous walk-in customer record
-                    from werkzeug.security import generate_password_hash
-                    default_password = generate_password_hash('walkin123')
-                    cur.execute("""
-                        INSERT INTO customers (first_name, last_name, email, phone, address, password, created_at)
-                        VALUES ('Walk-in', 'Customer', NULL, NULL, NULL, %s, NOW())
-                    """, (default_password,))
-                    customer_id = cur.lastrowid
-
-            # Create order with completed status but pending approval for walk-in sales
-            # Walk-in sales are immediate transactions, so status is 'Completed'
-            # but approval_status remains 'Pending Approval' for staff review
-            cur.execute("""
-                INSERT INTO orders (customer_id, order_date, status, total_amount, payment_method, approval_status)
-                VALUES (%s, NOW(), 'COMPLETED', %s, %s, 'Pending Approval')
-            """, (customer_id, total_amount, payment_method.upper()))
-            order_id = cur.lastrowid
-
-            # Add order items and update stock
-            for item in items:
-                # Get product's original price, discount information, and denormalized data
-                cur.execute("""
-                    SELECT p.original_price, p.price, p.name, p.description, c.name as category_name
-                    FROM products p
-                    LEFT JOIN categories c ON p.category_id = c.id
-                    WHERE p.id = %s
-                """, (item['id'],))
-                product_data = cur.fetchone()
-
-                if product_data:
-                    original_price, current_product_price, product_name, product_description, category_name = product_data
-                    # Use original_price if available, otherwise use current price as original
-                    original_price = original_price if original_price is not None else current_product_price
-
-                    # Calculate discount information
-                    item_price = float(item['price'])
-                    discount_amount = max(0, float(original_price) - item_price)
-                    discount_percentage = (discount_amount / float(original_price)) * 100 if float(original_price) > 0 else 0
-                else:
-                    # Fallback if product not found
-                    original_price = item['price']
-                    discount_amount = 0
-                    discount_percentage = 0
-                    product_name = item.get('name', 'Unknown Product')
-                    product_description = item.get('description', '')
-                    category_name = 'Uncategorized'
+                # Add order items and update stock
+                for item in items:
+                    # Original price, discount information, and denormalized data
+                    product_data = products_by_id.get(int(item['id']))
 
-                # Insert order item with discount information and denormalized data
-                cur.execute("""
-                    INSERT INTO order_items (order_id, product_id, quantity, price, original_price, discount_percentage, discount_amount, product_name, product_description, product_category)
-                    VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s, %s)
-                """, (order_id, item['id'], item['quantity'], item['price'], original_price, discount_percentage, discount_amount, product_name, product_description, category_name))
+                    if product_data:
+                        original_price = product_data['original_price']
+                        current_product_price = product_data['price']
+                        product_name = product_data['name']
+                        product_description = product_data['description']
+                        category_name = product_data['category_name']
+                        # Use original_price if available, otherwise use current price as original
+                        original_price = original_price if original_price is not None else current_product_price
+
+                        # Calculate discount information
+                        item_price = float(item['price'])
+                        discount_amount = max(0, float(original_price) - item_price)
+                        discount_percentage = (discount_amount / float(original_price)) * 100 if float(original_price) > 0 else 0
+                    else:
+                        # Fallback if product not found
+                        original_price = item['price']
+                        discount_amount = 0
+                        discount_percentage = 0
+                        product_name = item.get('name', 'Unknown Product')
+                        product_description = item.get('description', '')
+                        category_name = 'Uncategorized'
 
-                # Update product stock
-                app.logger.info(f"Updating stock for product {item['id']}: reducing by {item['quantity']}")
-                
-                # First, get the current stock before update
-                cur.execute("SELECT stock FROM products WHERE id = %s", (item['id'],))
-                current_stock = cur.fetchone()
-                if current_stock:
-                    app.logger.info(f"Product {item['id']} current stock before update: {current_stock[0]}")
-                else:
-                    app.logger.warning(f"Could not get current stock for product {item['id']}")
-                
-                # Execute the stock update
-                cur.execute("""
-                    UPDATE products SET stock = stock - %s WHERE id = %s
-                """, (item['quantity'], item['id']))
-                
-                # Check if the update affected any rows
-                if cur.rowcount > 0:
-                    app.logger.info(f"Stock update successful for product {item['id']}: {cur.rowcount} row(s) affected")
-                else:
-                    app.logger.warning(f"Stock update failed for product {item['id']}: no rows affected")
+                    # Insert order item with discount information and denormalized data
+                    cur.execute("""
+                        INSERT INTO order_items (order_id, product_id, quantity, price, original_price, discount_percentage, discount_amount, product_name, product_description, product_category)
+                        VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s, %s)
+                    """, (order_id, item['id'], item['quantity'], item['price'], original_price, discount_percentage, discount_amount, product_name, product_description, category_name))
+
+                    # Update product stock
+                    cur.execute("""
+                        UPDATE products SET stock = stock - %s WHERE id = %s
+                    """, (item['quantity'], item['id']))
                 
-                # Verify the stock update
-                cur.execute("SELECT stock FROM products WHERE id = %s", (item['id'],))
-                updated_stock = cur.fetchone()
-                if updated_stock:
-                    app.logger.info(f"Product {item['id']} stock updated to: {updated_stock[0]}")
-                else:
-                    app.logger.warning(f"Could not verify stock update for product {item['id']}")
-
-            # Log the final stock values after all updates
-            app.logger.info("Final stock values after sale processing:")
-            for item in items:
-                cur.execute("SELECT stock FROM products WHERE id = %s", (item['id'],))
-                final_stock = cur.fetchone()
-                if final_stock:
-                    app.logger.info(f"Product {item['id']} final stock: {final_stock[0]}")
-                else:
-                    app.logger.warning(f"Could not get final stock for product {item['id']}")
-            
-            mysql.connection.commit()
+                    if cur.rowcount > 0:
+                        app.logger.info(f"Product {item['id']} stock: {product_data['stock']} -> {product_data['stock'] - item['quantity']}")
+                    else:
+                        app.logger.warning(f"Stock update failed for product {item['id']}: no rows affected")
+
+            sales_rollup.refresh_orders([order_id])
+            invalidate_catalog_cache()
             app.logger.info("Transaction committed successfully")
             
-            # Verify that stock updates were actually persisted
-            app.logger.info("Verifying stock updates were persisted:")
-            for item in items:
-                cur.execute("SELECT stock FROM products WHERE id = %s", (item['id'],))
-                persisted_stock = cur.fetchone()
-                if persisted_stock:
-                    app.logger.info(f"Product {item['id']} stock after commit: {persisted_stock[0]}")
-                else:
-                    app.logger.warning(f"Could not verify persisted stock for product {item['id']}")
-            
             cur.close()
 
             return jsonify({
@@ -9258,112 +8916,111 @@ LEFT JOIN categories c ON p.category_id = c.id
             if not items:
                 return jsonify({'success': False, 'error': 'No items in quote'}), 400
 
-            conn = mysql.connection
-            cur = conn.cursor()
+            with mysql.transaction():
+                conn = mysql.connection
+                cur = conn.cursor()
 
-            # Calculate total
-            total_amount = sum(item['price'] * item['quantity'] for item in items)
+                # Calculate total
+                total_amount = sum(item['price'] * item['quantity'] for item in items)
 
-            # Create or get customer - ALWAYS create a customer record for quotes
-            customer_id = None
+                # Create or get customer - ALWAYS create a customer record for quotes
+                customer_id = None
 
-            if (customer_info.get('first_name') or customer_info.get('last_name') or
-                customer_info.get('email') or customer_info.get('phone')):
+                if (customer_info.get('first_name') or customer_info.get('last_name') or
+                    customer_info.get('email') or customer_info.get('phone')):
 
-                # Customer provided information - check if customer exists by email or phone
-                existing_customer = None
-                if customer_info.get('email'):
-                    cur.execute("SELECT id FROM customers WHERE email = %s", (customer_info['email'],))
-                    existing_customer = cur.fetchone()
+                    # Customer provided information - check if customer exists by email or phone
+                    existing_customer = None
+                    if customer_info.get('email'):
+                        cur.execute("SELECT id FROM customers WHERE email = %s", (customer_info['email'],))
+                        existing_customer = cur.fetchone()
 
-                if not existing_customer and customer_info.get('phone'):
-                    cur.execute("SELECT id FROM customers WHERE phone = %s", (customer_info['phone'],))
-                    existing_customer = cur.fetchone()
+                    if not existing_customer and customer_info.get('phone'):
+                        cur.execute("SELECT id FROM customers WHERE phone = %s", (customer_info['phone'],))
+                        existing_customer = cur.fetchone()
 
-                if existing_customer:
-                    customer_id = existing_customer[0]
+                    if existing_customer:
+                        customer_id = existing_customer[0]
+                    else:
+                        # Create new customer with provided information
+                        from werkzeug.security import generate_password_hash
+                        default_password = generate_password_hash('walkin123')
+                        cur.execute("""
+                            INSERT INTO customers (first_name, last_name, email, phone, address, password, created_at)
+                            VALUES (%s, %s, %s, %s, %s, %s, NOW())
+                        """, (
+                            customer_info.get('first_name', '') or 'Walk-in',
+                            customer_info.get('last_name', '') or 'Customer',
+                            customer_info.get('email'),
+                            customer_info.get('phone'),
+                            customer_info.get('address'),
+                            default_password
+                        ))
+                        customer_id = cur.lastrowid
                 else:
-                    # Create new customer with provided information
-                    from werkzeug.security import generate_password_hash
-                    default_password = generate_password_hash('walkin123')
+                    # No customer information provided - create anonymous walk-in customer
+                    # Check if a generic walk-in customer already exists
                     cur.execute("""
-                        INSERT INTO customers (first_name, last_name, email, phone, address, password, created_at)
-                        VALUES (%s, %s, %s, %s, %s, %s, NOW())
-                    """, (
-                        customer_info.get('first_name', '') or 'Walk-in',
-                        customer_info.get('last_name', '') or 'Customer',
-                        customer_info.get('email'),
-                        customer_info.get('phone'),
-                        customer_info.get('address'),
-                        default_password
-                    ))
-                    customer_id = cur.lastrowid
-            else:
-                # No customer information provided - create anonymous walk-in customer
-                # Check if a generic walk-in customer already exists
+                        SELECT id FROM customers
+                        WHERE first_name = 'Walk-in' AND last_name = 'Customer'
+                        AND email IS NULL AND phone IS NULL
+                        LIMIT 1
+                    """)
+                    existing_walkin = cur.fetchone()
+
+                    if existing_walkin:
+                        customer_id = existing_walkin[0]
+                    else:
+                        # Create a new anonymous walk-in customer record
+                        from werkzeug.security import generate_password_hash
+                        default_password = generate_password_hash('walkin123')
+                        cur.execute("""
+                            INSERT INTO customers (first_name, last_name, email, phone, address, password, created_at)
+                            VALUES ('Walk-in', 'Customer', NULL, NULL, NULL, %s, NOW())
+                        """, (default_password,))
+                        customer_id = cur.lastrowid
+
+                # Create quote (order with 'Quote' status) - quotes require manual approval
                 cur.execute("""
-                    SELECT id FROM customers
-                    WHERE first_name = 'Walk-in' AND last_name = 'Customer'
-                    AND email IS NULL AND phone IS NULL
-                    LIMIT 1
-                """)
-                existing_walkin = cur.fetchone()
+                    INSERT INTO orders (customer_id, order_date, status, total_amount, payment_method, approval_status)
+                    VALUES (%s, NOW(), 'Quote', %s, 'Pending', 'Pending Approval')
+                """, (customer_id, total_amount))
+                quote_id = cur.lastrowid
 
-                if existing_walkin:
-                    customer_id = existing_walkin[0]
-                else:
-                    # Create a new anonymous walk-in customer record
-                    from werkzeug.security import generate_password_hash
-                    default_password = generate_password_hash('walkin123')
-                    cur.execute("""
-                        INSERT INTO customers (first_name, last_name, email, phone, address, password, created_at)
-                        VALUES ('Walk-in', 'Customer', NULL, NULL, NULL, %s, NOW())
-                    """, (default_password,))
-                    customer_id = cur.lastrowid
+                # Add quote items with discount information
+                products_by_id = Product.get_many(item['id'] for item in items)
+                for item in items:
+                    # Original price, discount information, and denormalized data
+                    product_data = products_by_id.get(int(item['id']))
 
-            # Create quote (order with 'Quote' status) - quotes require manual approval
-            cur.execute("""
-                INSERT INTO orders (customer_id, order_date, status, total_amount, payment_method, approval_status)
-                VALUES (%s, NOW(), 'Quote', %s, 'Pending', 'Pending Approval')
-            """, (customer_id, total_amount))
-            quote_id = cur.lastrowid
-
-            # Add quote items with discount information
-            for item in items:
-                # Get product's original price, discount information, and denormalized data
-                cur.execute("""
-                    SELECT p.original_price, p.price, p.name, p.description, c.name as category_name
-                    FROM products p
-                    LEFT JOIN categories c ON p.category_id = c.id
-                    WHERE p.id = %s
-                """, (item['id'],))
-                product_data = cur.fetchone()
-
-                if product_data:
-                    original_price, current_product_price, product_name, product_description, category_name = product_data
-                    # Use original_price if available, otherwise use current price as original
-                    original_price = original_price if original_price is not None else current_product_price
-
-                    # Calculate discount information
-                    item_price = float(item['price'])
-                    discount_amount = max(0, float(original_price) - item_price)
-                    discount_percentage = (discount_amount / float(original_price)) * 100 if float(original_price) > 0 else 0
-                else:
-                    # Fallback if product not found
-                    original_price = item['price']
-                    discount_amount = 0
-                    discount_percentage = 0
-                    product_name = item.get('name', 'Unknown Product')
-                    product_description = item.get('description', '')
-                    category_name = 'Uncategorized'
+                    if product_data:
+                        original_price = product_data['original_price']
+                        current_product_price = product_data['price']
+                        product_name = product_data['name']
+                        product_description = product_data['description']
+                        category_name = product_data['category_name']
+                        # Use original_price if available, otherwise use current price as original
+                        original_price = original_price if original_price is not None else current_product_price
+
+                        # Calculate discount information
+                        item_price = float(item['price'])
+                        discount_amount = max(0, float(original_price) - item_price)
+                        discount_percentage = (discount_amount / float(original_price)) * 100 if float(original_price) > 0 else 0
+                    else:
+                        # Fallback if product not found
+                        original_price = item['price']
+                        discount_amount = 0
+                        discount_percentage = 0
+                        product_name = item.get('name', 'Unknown Product')
+                        product_description = item.get('description', '')
+                        category_name = 'Uncategorized'
 
-                # Insert quote item with discount information and denormalized data
-                cur.execute("""
-                    INSERT INTO order_items (order_id, product_id, quantity, price, original_price, discount_percentage, discount_amount, product_name, product_description, product_category)
-                    VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s, %s)
-                """, (quote_id, item['id'], item['quantity'], item['price'], original_price, discount_percentage, discount_amount, product_name, product_description, category_name))
+                    # Insert quote item with discount information and denormalized data
+                    cur.execute("""
+                        INSERT INTO order_items (order_id, product_id, quantity, price, original_price, discount_percentage, discount_amount, product_name, product_description, product_category)
+                        VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s, %s)
+                    """, (quote_id, item['id'], item['quantity'], item['price'], original_price, discount_percentage, discount_amount, product_name, product_description, category_name))
 
-            mysql.connection.commit()
             cur.close()
 
             return jsonify({
@@ -9572,52 +9229,53 @@ LEFT JOIN categories c ON p.category_id = c.id
             return jsonify({'success': False, 'error': 'Not authenticated'}), 403
 
         try:
-            cur = mysql.connection.cursor()
+            with mysql.transaction():
+                cur = mysql.connection.cursor()
 
-            # Check if order exists and is in pending approval status
-            cur.execute("""
-                SELECT id, customer_id, approval_status
-                FROM orders
-                WHERE id = %s
-            """, (order_id,))
-            order = cur.fetchone()
+                # Check if order exists and is in pending approval status
+                cur.execute("""
+                    SELECT id, customer_id, approval_status
+                    FROM orders
+                    WHERE id = %s
+                    FOR UPDATE
+                """, (order_id,))
+                order = cur.fetchone()
 
-            if not order:
-                return jsonify({'success': False, 'error': 'Order not found'}), 404
+                if not order:
+                    return jsonify({'success': False, 'error': 'Order not found'}), 404
 
-            if order[2] != 'Pending Approval':
-                return jsonify({'success': False, 'error': 'Order is not pending approval'}), 400
+                if order[2] != 'Pending Approval':
+                    return jsonify({'success': False, 'error': 'Order is not pending approval'}), 400
 
-            # Stock is already reduced when order was placed at checkout
-            # Just verify stock availability for approval
-            cur.execute("""
-                SELECT oi.product_id, oi.quantity, p.stock, p.name
-                FROM order_items oi
-                JOIN products p ON oi.product_id = p.id
-                WHERE oi.order_id = %s AND oi.type != 'preorder'
-            """, (order_id,))
+                # Stock is already reduced when order was placed at checkout
+                # Just verify stock availability for approval
+                cur.execute("""
+                    SELECT oi.product_id, oi.quantity, p.stock, p.name
+                    FROM order_items oi
+                    JOIN products p ON oi.product_id = p.id
+                    WHERE oi.order_id = %s AND oi.type != 'preorder'
+                """, (order_id,))
             
-            order_items = cur.fetchall()
+                order_items = cur.fetchall()
             
-            # Verify stock availability for all items
-            for item in order_items:
-                product_id, quantity, current_stock, product_name = item
+                # Verify stock availability for all items
+                for item in order_items:
+                    product_id, quantity, current_stock, product_name = item
                 
-                if current_stock < 0:
-                    app.logger.warning(f"Product {product_id} ({product_name}) has negative stock: {current_stock}")
+                    if current_stock < 0:
+                        app.logger.warning(f"Product {product_id} ({product_name}) has negative stock: {current_stock}")
                 
-                app.logger.info(f"Product {product_id} ({product_name}) - Ordered: {quantity}, Current Stock: {current_stock}")
+                    app.logger.info(f"Product {product_id} ({product_name}) - Ordered: {quantity}, Current Stock: {current_stock}")
 
-            # Update order approval status
-            cur.execute("""
-                UPDATE orders
-                SET approval_status = 'Approved',
-                    approval_date = NOW(),
-                    approved_by = %s
-                WHERE id = %s
-            """, (session['user_id'], order_id))
+                # Update order approval status
+                cur.execute("""
+                    UPDATE orders
+                    SET approval_status = 'Approved',
+                        approval_date = NOW(),
+                        approved_by = %s
+                    WHERE id = %s
+                """, (session['user_id'], order_id))
 
-            mysql.connection.commit()
             cur.close()
 
             app.logger.info(f"Order {order_id} approved by user {session['user_id']}")
@@ -9659,71 +9317,79 @@ LEFT JOIN categories c ON p.category_id = c.id
             reason = data.get('reason', 'No reason provided')
             notes = data.get('notes', '')
 
-            cur = mysql.connection.cursor()
-
-            # Get order details including payment method
-            cur.execute("""
-                SELECT id, customer_id, approval_status, status, total_amount, payment_method
-                FROM orders
-                WHERE id = %s
-            """, (order_id,))
-            order = cur.fetchone()
-
-            if not order:
-                return jsonify({'success': False, 'error': 'Order not found'}), 404
-
-            order_id_val, customer_id, approval_status, order_status, total_amount, payment_method = order
-
-            # Check if order can be rejected
-            if approval_status not in ['Pending Approval', 'Approved']:
-                return jsonify({'success': False, 'error': 'Order cannot be rejected in current status'}), 400
+            with mysql.transaction():
+                cur = mysql.connection.cursor()
 
-            # Update order to rejected and cancelled status
-            cur.execute("""
-                UPDATE orders
-                SET approval_status = 'Rejected',
-                    status = 'CANCELLED',
-                    approval_date = NOW(),
-                    approved_by = %s,
-                    approval_notes = %s
-                WHERE id = %s
-            """, (session['user_id'], f"Rejected: {reason}", order_id))
+                # Get order details including payment method
+                cur.execute("""
+                    SELECT id, customer_id, approval_status, status, total_amount, payment_method
+                    FROM orders
+                    WHERE id = %s
+                    FOR UPDATE
+                """, (order_id,))
+                order = cur.fetchone()
 
-            # Restore inventory for all items in the order
-            cur.execute("""
-                SELECT oi.product_id, oi.quantity, p.name as product_name
-                FROM order_items oi
-                JOIN products p ON oi.product_id = p.id
-                WHERE oi.order_id = %s
-            """, (order_id,))
+                if not order:
+                    return jsonify({'success': False, 'error': 'Order not found'}), 404
 
-            order_items = cur.fetchall()
-            restored_items = []
+                order_id_val, customer_id, approval_status, order_status, total_amount, payment_method = order
 
-            for item in order_items:
-                product_id, quantity, product_name = item
+                # Check if order can be rejected
+                if approval_status not in ['Pending Approval', 'Approved']:
+                    return jsonify({'success': False, 'error': 'Order cannot be rejected in current status'}), 400
 
-                # Restore stock
+                # Update order to rejected and cancelled status
                 cur.execute("""
-                    UPDATE products
-                    SET stock = stock + %s
+                    UPDATE orders
+                    SET approval_status = 'Rejected',
+                        status = 'CANCELLED',
+                        approval_date = NOW(),
+                        approved_by = %s,
+                        approval_notes = %s
                     WHERE id = %s
-                """, (quantity, product_id))
+                """, (session['user_id'], f"Rejected: {reason}", order_id))
 
-                # Log inventory change
+                # Restore inventory for all items in the order
                 cur.execute("""
-                    INSERT INTO inventory (product_id, changes, change_date)
-                    VALUES (%s, %s, NOW())
-                """, (product_id, quantity))
+                    SELECT oi.product_id, oi.quantity, p.name as product_name
+                    FROM order_items oi
+                    JOIN products p ON oi.product_id = p.id
+                    WHERE oi.order_id = %s
+                """, (order_id,))
 
-                restored_items.append({
-                    'product_name': product_name,
-                    'quantity': quantity
-                })
+                order_items = cur.fetchall()
+                restored_items = []
+
+                # Units still held by a stock reservation were never taken from stock
+                released = stock_reservations.release(cur, order_id)
+
+                for item in order_items:
+                    product_id, quantity, product_name = item
+
+                    restore = restore_quantity(released, product_id, quantity)
+                    if restore:
+                        # Restore stock
+                        cur.execute("""
+                            UPDATE products
+                            SET stock = stock + %s
+                            WHERE id = %s
+                        """, (restore, product_id))
+
+                        # Log inventory change
+                        cur.execute("""
+                            INSERT INTO inventory (product_id, changes, change_date)
+                            VALUES (%s, %s, NOW())
+                        """, (product_id, restore))
+
+                    restored_items.append({
+                        'product_name': product_name,
+                        'quantity': quantity
+                    })
 
-                app.logger.info(f"Restored {quantity} units of {product_name} to inventory due to order rejection")
+                    app.logger.info(f"Restored {quantity} units of {product_name} to inventory due to order rejection")
 
-            mysql.connection.commit()
+            sales_rollup.refresh_orders([order_id])
+            invalidate_catalog_cache()
             cur.close()
 
             app.logger.info(f"Order {order_id} rejected and cancelled by user {session['user_id']} with reason: {reason}")
@@ -9766,33 +9432,35 @@ LEFT JOIN categories c ON p.category_id = c.id
             return jsonify({'success': False, 'error': 'Not authenticated'}), 403
 
         try:
-            cur = mysql.connection.cursor()
+            with mysql.transaction():
+                cur = mysql.connection.cursor()
 
-            # Check if order exists and is approved but still pending
-            cur.execute("""
-                SELECT id, customer_id, approval_status, status
-                FROM orders
-                WHERE id = %s
-            """, (order_id,))
-            order = cur.fetchone()
+                # Check if order exists and is approved but still pending
+                cur.execute("""
+                    SELECT id, customer_id, approval_status, status
+                    FROM orders
+                    WHERE id = %s
+                    FOR UPDATE
+                """, (order_id,))
+                order = cur.fetchone()
 
-            if not order:
-                return jsonify({'success': False, 'error': 'Order not found'}), 404
+                if not order:
+                    return jsonify({'success': False, 'error': 'Order not found'}), 404
 
-            if order[2] != 'Approved':
-                return jsonify({'success': False, 'error': 'Order must be approved before it can be completed'}), 400
+                if order[2] != 'Approved':
+                    return jsonify({'success': False, 'error': 'Order must be approved before it can be completed'}), 400
 
-            if order[3] != 'Pending':
-                return jsonify({'success': False, 'error': 'Order is already completed or in another status'}), 400
+                if order[3] != 'Pending':
+                    return jsonify({'success': False, 'error': 'Order is already completed or in another status'}), 400
 
-            # Update order status to completed
-            cur.execute("""
-                UPDATE orders
-                SET status = 'COMPLETED'
-                WHERE id = %s
-            """, (order_id,))
+                # Update order status to completed
+                cur.execute("""
+                    UPDATE orders
+                    SET status = 'COMPLETED'
+                    WHERE id = %s
+                """, (order_id,))
 
-            mysql.connection.commit()
+            sales_rollup.refresh_orders([order_id])
             cur.close()
 
             app.logger.info(f"Order {order_id} marked as completed by user {session['user_id']}")
@@ -9828,36 +9496,40 @@ LEFT JOIN categories c ON p.category_id = c.id
             return jsonify({'success': False, 'error': 'Admin access required'}), 403
 
         try:
-            cur = mysql.connection.cursor()
+            with mysql.transaction():
+                cur = mysql.connection.cursor()
 
-            # Get order details before deletion
-            cur.execute("""
-                SELECT id, customer_id, status, approval_status, total_amount
-                FROM orders
-                WHERE id = %s
-            """, (order_id,))
-            order = cur.fetchone()
+                # Get order details before deletion
+                cur.execute("""
+                    SELECT id, customer_id, status, approval_status, total_amount, DATE(order_date)
+                    FROM orders
+                    WHERE id = %s
+                    FOR UPDATE
+                """, (order_id,))
+                order = cur.fetchone()
 
-            if not order:
-                return jsonify({'success': False, 'error': 'Order not found'}), 404
+                if not order:
+                    return jsonify({'success': False, 'error': 'Order not found'}), 404
 
-            order_id_val, customer_id, status, approval_status, total_amount = order
+                # The order's day is rebuilt in the sales rollup once it is gone
+                order_id_val, customer_id, status, approval_status, total_amount, order_day = order
 
-            # Delete order items first (foreign key constraint)
-            cur.execute("DELETE FROM order_items WHERE order_id = %s", (order_id,))
-            deleted_items = cur.rowcount
+                # Delete order items first (foreign key constraint)
+                cur.execute("DELETE FROM order_items WHERE order_id = %s", (order_id,))
+                deleted_items = cur.rowcount
 
-            # Delete any notifications related to this order
-            cur.execute("DELETE FROM notifications WHERE related_id = %s AND notification_type LIKE '%order%'", (order_id,))
-            deleted_notifications = cur.rowcount
+                # Delete any notifications related to this order
+                cur.execute("DELETE FROM notifications WHERE related_id = %s AND notification_type LIKE '%order%'", (order_id,))
+                deleted_notifications = cur.rowcount
 
-            # Delete the order itself
-            cur.execute("DELETE FROM orders WHERE id = %s", (order_id,))
+                # Delete the order itself
+                cur.execute("DELETE FROM orders WHERE id = %s", (order_id,))
 
-            if cur.rowcount == 0:
-                return jsonify({'success': False, 'error': 'Failed to delete order'}), 500
+                if cur.rowcount == 0:
+                    # Raising rolls back the item and notification deletes above
+                    raise RuntimeError('Failed to delete order')
 
-            mysql.connection.commit()
+            sales_rollup.refresh_days([order_day])
             cur.close()
 
             app.logger.info(f"Order {order_id} completely deleted by admin {session['user_id']} - Items: {deleted_items}, Notifications: {deleted_notifications}")
@@ -68,41 +68,19 @@ def login():
             
         try:
             user = User.get_by_username(username)
-            current_app.logger.info(f"Login attempt for user: {username}, user data: {user}")
+            current_app.logger.info(f"Login attempt for user: {username}, found: {bool(user)}")
             
             if not user:
                 from models import Customer
-                customer = None
-                # Check if the username is an email
-                if '@' in username:
-                    customer = Customer.get_by_name_or_email(None, None, username)
-                    current_app.logger.info(f"Login attempt for customer (by email): {username}, customer data: {customer}")
-                
-                if not customer:
-                    # If not found by email, try to find customer by splitting username into first and last name
-                    name_parts = username.split()
-                    if len(name_parts) >= 2:
-                        first_name = name_parts[0]
-                        last_name = ' '.join(name_parts[1:])
-                        customer = Customer.get_by_name_or_email(first_name, last_name, None)
-                        current_app.logger.info(f"Login attempt for customer (by name): {username}, customer data: {customer}")
-                        if not customer:
-                            # Try swapping first and last name
-                            customer = Customer.get_by_name_or_email(last_name, first_name, None)
-                            current_app.logger.info(f"Swapped name login attempt for customer: {username}, customer data: {customer}")
-                    else:
-                        # If only one part, try as first name with no last name
-                        first_name = username
-                        customer = Customer.get_by_name_or_email(first_name, '', None)
-                        current_app.logger.info(f"Login attempt for customer (single name): {username}, customer data: {customer}")
+                # Email, or full name in either order, resolved through the customer lookup keys
+                customer = Customer.resolve_login(username)
+                current_app.logger.info(f"Login attempt for customer: {username}, found: {bool(customer)}")
 
                 if not customer:
                     flash('Invalid username or password', 'error')
                     return redirect(url_for('auth.login'))
                 
                 # Verify password for customer
-                current_app.logger.info(f"Customer stored password: {customer['password']}")
-                current_app.logger.info(f"Provided password: {password}")
                 password_match = check_password_hash(customer['password'], password)
                 
                 # If check_password_hash fails and the stored password is not a scrypt hash (length < 60),
@@ -627,25 +605,7 @@ def customer_forgot_password():
 
             # Try to find customer by username (could be name or email)
             from models import Customer
-            customer = None
-            
-            # Check if username is an email
-            if '@' in username:
-                customer = Customer.get_by_name_or_email(None, None, username)
-            
-            if not customer:
-                # Try to find by name
-                name_parts = username.split()
-                if len(name_parts) >= 2:
-                    first_name = name_parts[0]
-                    last_name = ' '.join(name_parts[1:])
-                    customer = Customer.get_by_name_or_email(first_name, last_name, None)
-                    if not customer:
-                        # Try swapping first and last name
-                        customer = Customer.get_by_name_or_email(last_name, first_name, None)
-                else:
-                    # Single name
-                    customer = Customer.get_by_name_or_email(username, '', None)
+            customer = Customer.resolve_login(username)
 
             if not customer:
                 flash('Customer not found. Please check your username/email.', 'error')
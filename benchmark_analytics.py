@@ -0,0 +1,84 @@
+#!/usr/bin/env python3
+"""
+Micro-benchmark: row-by-row report loops vs utils.sales_analytics
+Runs the per-row aggregation the staff report routes used to do (float() per field,
+dict bookkeeping) against the column-wise functions on synthetic purchase history,
+checks both give the same answer and reports the time per run. No database needed.
+
+Usage: python benchmark_analytics.py [rows] [iterations]
+"""
+
+import random
+import sys
+import time
+from decimal import Decimal
+
+from utils import sales_analytics
+from utils.sales_analytics import discount_insights
+
+ROWS = int(sys.argv[1]) if len(sys.argv) > 1 else 5000
+ITERATIONS = int(sys.argv[2]) if len(sys.argv) > 2 else 10
+
+
+def make_history(count):
+    rng = random.Random(7)
+    return [{'discount_percentage': rng.choice([None, 5, 10, 10, 15, 20]),
+             'savings': Decimal(rng.randint(0, 5000)) / 100,
+             'date': f"2025-01-{1 + i % 28:02d}"} for i in range(count)]
+
+
+# Loop versions, as the routes were written before
+
+def loop_insights(history):
+    discount_counts = {}
+    total_savings = 0
+    total_discount = 0
+    for item in history:
+        discount = item['discount_percentage']
+        if discount:
+            discount_counts[discount] = discount_counts.get(discount, 0) + 1
+            total_discount += discount
+        if item['savings']:
+            total_savings += float(item['savings'])
+    return {
+        'most_common_discount': max(discount_counts, key=discount_counts.get) if discount_counts else None,
+        'total_savings': total_savings,
+        'average_discount': round(total_discount / len(history), 1) if discount_counts else 0,
+    }
+
+
+# Column-wise versions
+
+def timed(func, data):
+    result = func(data)  # warm-up
+    start = time.perf_counter()
+    for _ in range(ITERATIONS):
+        func(data)
+    return result, (time.perf_counter() - start) * 1000 / ITERATIONS
+
+
+def close(a, b):
+    return abs(float(a) - float(b)) <= 1e-6 * max(1.0, abs(float(a)))
+
+
+def main():
+    history = make_history(ROWS)
+    print(f"Rows: {ROWS}, iterations: {ITERATIONS}, NumPy: {'yes' if sales_analytics.np is not None else 'no (pure-Python fallback)'}")
+
+    cases = [
+        ("customer discount insights", loop_insights, discount_insights, history,
+         lambda a, b: a['most_common_discount'] == b['most_common_discount']
+         and close(a['total_savings'], b['total_savings']) and a['average_discount'] == b['average_discount']),
+    ]
+
+    print(f"\n{'aggregation':<30}{'loop ms':>10}{'column ms':>12}{'speedup':>10}  match")
+    print("-" * 70)
+    for label, loop_func, column_func, data, same in cases:
+        loop_result, loop_ms = timed(loop_func, data)
+        column_result, column_ms = timed(column_func, data)
+        speedup = loop_ms / column_ms if column_ms else float('inf')
+        print(f"{label:<30}{loop_ms:>10.2f}{column_ms:>12.2f}{speedup:>9.1f}x  {'✅' if same(loop_result, column_result) else '❌'}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,93 @@
+#!/usr/bin/env python3
+"""
+Micro-benchmark: pure-Python vs C-extension mysql.connector row decoding
+Runs the product and order queries from models.py under both driver modes and
+reports wall time and process CPU time (CPU time is where decoding cost shows up).
+The catalog and order-count caches are cleared before every call (outside the timed
+section) so each iteration really runs the query instead of timing a cache hit.
+
+Usage: python benchmark_db_driver.py [iterations]
+"""
+
+import sys
+import time
+from datetime import datetime
+
+from flask import Flask
+
+from config import Config
+from models import Product, Order, Report, request_db, invalidate_catalog_cache, order_count_cache
+from utils.db_pool import c_extension_available, dispose_pool
+
+ITERATIONS = int(sys.argv[1]) if len(sys.argv) > 1 else 20
+
+year = datetime.now().year
+QUERIES = [
+    ("Product.get_all", lambda: Product.get_all(include_archived=True)),
+    ("Product.get_featured(100)", lambda: Product.get_featured(limit=100, include_archived=True)),
+    ("Product.search('')", lambda: Product.search('')),
+    ("Order.get_paginated_orders(100)", lambda: Order.get_paginated_orders(page=1, page_size=100)),
+    ("Report.get_monthly_sales", lambda: Report.get_monthly_sales(f"{year}-01-01", f"{year}-12-31")),
+]
+
+
+def clear_caches():
+    """Drop cached listings/counts so the next call goes to the database"""
+    invalidate_catalog_cache()
+    order_count_cache.invalidate()
+
+
+def run_mode(app, use_c_extension):
+    """Time every query with a fresh pool configured for the given driver mode"""
+    Config.DB_USE_C_EXTENSION = use_c_extension
+    dispose_pool()
+    results = {}
+    with app.app_context():
+        for label, query in QUERIES:
+            clear_caches()
+            rows = query()  # warm-up, also opens the connection
+            wall_total = cpu_total = 0.0
+            for _ in range(ITERATIONS):
+                clear_caches()
+                wall_start = time.perf_counter()
+                cpu_start = time.process_time()
+                query()
+                wall_total += time.perf_counter() - wall_start
+                cpu_total += time.process_time() - cpu_start
+            results[label] = {
+                'rows': len(rows) if rows is not None else 0,
+                'wall_ms': wall_total * 1000 / ITERATIONS,
+                'cpu_ms': cpu_total * 1000 / ITERATIONS,
+            }
+    return results
+
+
+def main():
+    app = Flask(__name__)
+    request_db.init_app(app)
+
+    print(f"Iterations per query: {ITERATIONS}")
+    pure = run_mode(app, False)
+
+    if not c_extension_available():
+        print("⚠️ mysql.connector C extension is not installed - only the pure-Python results are shown")
+        cext = None
+    else:
+        cext = run_mode(app, True)
+
+    print(f"\n{'query':<34}{'rows':>7}{'pure cpu ms':>13}{'cext cpu ms':>13}{'pure wall ms':>14}{'cext wall ms':>14}{'cpu speedup':>13}")
+    print("-" * 108)
+    for label, _ in QUERIES:
+        p = pure[label]
+        if cext:
+            c = cext[label]
+            speedup = p['cpu_ms'] / c['cpu_ms'] if c['cpu_ms'] else float('inf')
+            print(f"{label:<34}{p['rows']:>7}{p['cpu_ms']:>13.2f}{c['cpu_ms']:>13.2f}{p['wall_ms']:>14.2f}{c['wall_ms']:>14.2f}{speedup:>12.1f}x")
+        else:
+            print(f"{label:<34}{p['rows']:>7}{p['cpu_ms']:>13.2f}{'-':>13}{p['wall_ms']:>14.2f}{'-':>14}{'-':>13}")
+
+    dispose_pool()
+
+
+if __name__ == '__main__':
+    main()
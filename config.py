@@ -33,6 +33,50 @@ class Config:
         MYSQL_PORT = int(os.getenv('MYSQL_PORT') or os.getenv('MYSQLPORT') or 3306)
         SQLALCHEMY_DATABASE_URI = f"mysql+mysqlconnector://{MYSQL_USER}:{MYSQL_PASSWORD}@{MYSQL_HOST}:{MYSQL_PORT}/{MYSQL_DB}"
 
+    # Connection pool used by models.get_db()
+    DB_POOL_SIZE = int(os.getenv('DB_POOL_SIZE') or 5)
+    DB_POOL_MAX_OVERFLOW = int(os.getenv('DB_POOL_MAX_OVERFLOW') or 10)
+    DB_POOL_RECYCLE = int(os.getenv('DB_POOL_RECYCLE') or 1800)  # seconds an idle connection may be reused
+    DB_POOL_TIMEOUT = float(os.getenv('DB_POOL_TIMEOUT') or 30)
+    DB_POOL_PRE_PING = (os.getenv('DB_POOL_PRE_PING') or 'true').lower() in ('1', 'true', 'yes')
+    # Use mysql.connector's C extension for protocol parsing/row decoding (falls back to pure Python if not installed)
+    DB_USE_C_EXTENSION = (os.getenv('DB_USE_C_EXTENSION') or 'false').lower() in ('1', 'true', 'yes')
+
+    # Seconds before the in-process product search index is rebuilt (picks up changes made by other workers)
+    SEARCH_INDEX_TTL = int(os.getenv('SEARCH_INDEX_TTL') or 300)
+
+    # Catalog listing cache (set CACHE_REDIS_URL to share it between gunicorn workers)
+    CATALOG_CACHE_TTL = int(os.getenv('CATALOG_CACHE_TTL') or 300)
+    CACHE_REDIS_URL = os.getenv('CACHE_REDIS_URL')
+
+    # Seconds a pending QR order holds its stock before the reservation expires
+    STOCK_HOLD_TTL = int(os.getenv('STOCK_HOLD_TTL') or 900)
+    STOCK_HOLD_SWEEP_INTERVAL = int(os.getenv('STOCK_HOLD_SWEEP_INTERVAL') or 60)
+
+    # Seconds a checkout/walk-in sale response is replayed for a repeated Idempotency-Key
+    IDEMPOTENCY_KEY_TTL = int(os.getenv('IDEMPOTENCY_KEY_TTL') or 86400)
+
+    # Seconds the staff order list reuses a filtered total count instead of running COUNT(*) per page
+    ORDER_COUNT_CACHE_TTL = int(os.getenv('ORDER_COUNT_CACHE_TTL') or 30)
+    # Seconds the staff dashboard order widgets share one result between polling sessions
+    ORDER_WIDGET_CACHE_TTL = int(os.getenv('ORDER_WIDGET_CACHE_TTL') or 15)
+    # Seconds the staff customer list reuses a search's total count
+    CUSTOMER_COUNT_CACHE_TTL = int(os.getenv('CUSTOMER_COUNT_CACHE_TTL') or 30)
+
+    # Seconds a closed month's sales detail report is reused (dropped early when one of its orders changes)
+    CLOSED_MONTH_REPORT_TTL = int(os.getenv('CLOSED_MONTH_REPORT_TTL') or 86400)
+
+    # Background export jobs: worker threads per process, where finished files are kept and for how long
+    EXPORT_JOB_WORKERS = int(os.getenv('EXPORT_JOB_WORKERS') or 2)
+    EXPORT_JOB_DIR = os.getenv('EXPORT_JOB_DIR') or os.path.join(os.path.dirname(os.path.abspath(__file__)), 'instance', 'exports')
+    EXPORT_JOB_RESULT_TTL = int(os.getenv('EXPORT_JOB_RESULT_TTL') or 600)
+    # Seconds without progress after which a queued/running job is reported as failed
+    EXPORT_JOB_STALE_AFTER = int(os.getenv('EXPORT_JOB_STALE_AFTER') or 900)
+
+    # Automatic QR payment verifier: concurrent Bakong API calls, and the longest wait before an unpaid order is re-checked
+    PAYMENT_VERIFIER_WORKERS = int(os.getenv('PAYMENT_VERIFIER_WORKERS') or 4)
+    PAYMENT_VERIFIER_MAX_BACKOFF = int(os.getenv('PAYMENT_VERIFIER_MAX_BACKOFF') or 60)
+
     # File upload configuration
     UPLOAD_FOLDER = 'static/uploads/products'
     ALLOWED_EXTENSIONS = {'png', 'jpg', 'jpeg', 'gif'}
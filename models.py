@@ -1,14 +1,29 @@
 from flask_sqlalchemy import SQLAlchemy
 from werkzeug.security import generate_password_hash
-from flask import current_app
+from flask import current_app, has_app_context
 import mysql.connector
 from datetime import datetime
 import re
+import functools
 
 db = SQLAlchemy()
 
 # Database configuration from config.py
 from config import Config
+from utils.db_pool import get_pool, resolve_use_pure
+from utils.db_session import RequestDatabase
+from utils.product_search import ProductSearchIndex
+from utils.autocomplete import AutocompleteIndex
+from utils.cache import NamespaceCache, get_backend
+from utils.schema import SchemaCapabilities
+from utils.category_tree import CategoryTree
+from utils.stock_reservations import StockReservations, restore_quantity
+from utils.volume_discounts import VolumeDiscountIndex, quote_volume_discount
+from utils.idempotency import IdempotencyStore
+from utils.keyset import seek_clause, day_range
+from utils.sales_rollup import SalesRollup
+from utils.jobs import JobRunner
+from utils.customer_search import search_clause, lookup_conditions, LOOKUP_KEY_COLUMNS, LOOKUP_KEY_EXPRESSIONS
 
 def create_cursor(conn):
     """Create a cursor with dictionary support if available, fallback to regular cursor"""
@@ -17,26 +32,96 @@ def create_cursor(conn):
     except TypeError:
         return conn.cursor()
 
+def _connect_kwargs():
+    return dict(
+        user=Config.MYSQL_USER,
+        password=Config.MYSQL_PASSWORD,
+        host=Config.MYSQL_HOST,
+        port=Config.MYSQL_PORT,
+        database=Config.MYSQL_DB,
+        use_pure=resolve_use_pure(Config.DB_USE_C_EXTENSION),
+        autocommit=True,
+        connect_timeout=60,
+        auth_plugin='mysql_native_password'
+    )
+
+def _checkout_connection():
+    pool = get_pool(
+        _connect_kwargs(),
+        pool_size=Config.DB_POOL_SIZE,
+        max_overflow=Config.DB_POOL_MAX_OVERFLOW,
+        recycle=Config.DB_POOL_RECYCLE,
+        pre_ping=Config.DB_POOL_PRE_PING,
+        timeout=Config.DB_POOL_TIMEOUT
+    )
+    return pool.get_connection()
+
+# Request-scoped connection shared by get_db() and app.py's mysql.connection
+request_db = RequestDatabase(connect=_checkout_connection)
+
 def get_db():
+    """
+    Inside an app context, return the request's shared connection (released in teardown_appcontext).
+    Outside one, check out a pooled connection. conn.close() is safe to call either way.
+    """
     try:
-        conn = mysql.connector.connect(
-            user=Config.MYSQL_USER,
-            password=Config.MYSQL_PASSWORD,
-            host=Config.MYSQL_HOST,
-            port=Config.MYSQL_PORT,
-            database=Config.MYSQL_DB,
-            use_pure=True,
-            autocommit=True,
-            connect_timeout=60,
-            auth_plugin='mysql_native_password'
-        )
-        current_app.logger.info("Database connection established successfully.")
-        return conn
-            
+        if has_app_context():
+            return request_db.connection
+        return _checkout_connection()
+
     except Exception as e:
-        current_app.logger.error(f"Failed to connect to database: {e}")
+        if has_app_context():
+            current_app.logger.error(f"Failed to connect to database: {e}")
         raise
 
+def open_connection():
+    """
+    Check out a pooled connection of its own, even inside an app context (e.g. for an
+    unbuffered streaming read that must not tie up the request connection). close() returns it.
+    """
+    return _checkout_connection()
+
+# Optional columns (soft delete, slug, approval/payment fields) introspected once per process
+schema = SchemaCapabilities(connect=get_db)
+
+# TTL stock holds for pending QR orders (enabled once run_stock_reservation_migration.py has run)
+stock_reservations = StockReservations(
+    is_enabled=lambda: schema.has_table('stock_reservations'),
+    hold_ttl=Config.STOCK_HOLD_TTL
+)
+
+# Stored responses for repeated checkout / walk-in sale requests (shared table once
+# run_idempotency_migration.py has run, in-process only before that)
+idempotency_store = IdempotencyStore(
+    connect=get_db,
+    is_enabled=lambda: schema.has_table('idempotency_keys'),
+    ttl=Config.IDEMPOTENCY_KEY_TTL
+)
+
+# Sales detail reports of closed months; the current month is always computed live
+report_cache = NamespaceCache('sales_reports', get_backend(Config.CACHE_REDIS_URL), default_ttl=Config.CLOSED_MONTH_REPORT_TTL)
+
+def _drop_cached_months(days):
+    for month in {day.strftime('%Y-%m') for day in days}:
+        report_cache.delete(f"monthly_sales_detail:{month}")
+
+# Daily sales rollup read by the staff reports (live aggregation until run_sales_rollup_migration.py has run)
+sales_rollup = SalesRollup(
+    connect=get_db,
+    is_enabled=lambda: schema.has_table('sales_daily') and schema.has_table('sales_daily_totals'),
+    on_change=_drop_cached_months
+)
+
+# Staff exports run on a background thread pool (job state in the jobs table once run_jobs_migration.py has run)
+export_jobs = JobRunner(
+    connect=get_db,
+    is_enabled=lambda: schema.has_table('jobs'),
+    result_dir=Config.EXPORT_JOB_DIR,
+    max_workers=Config.EXPORT_JOB_WORKERS,
+    result_ttl=Config.EXPORT_JOB_RESULT_TTL,
+    stale_after=Config.EXPORT_JOB_STALE_AFTER
+)
+
 def generate_slug(text):
     """Generate a URL-friendly slug from text"""
     if not text:
@@ -53,8 +138,75 @@ def generate_slug(text):
 
     return slug
 
+# Read-through cache for product listings, invalidated on product, discount and stock changes
+catalog_cache = NamespaceCache('catalog', get_backend(Config.CACHE_REDIS_URL), default_ttl=Config.CATALOG_CACHE_TTL)
+
+def catalog_cached(func):
+    """Serve a product listing from catalog_cache. Rows are copied so callers can modify them."""
+    @functools.wraps(func)
+    def wrapper(*args, **kwargs):
+        key = f"{func.__name__}:{args!r}:{sorted(kwargs.items())!r}"
+        rows = catalog_cache.get_or_load(key, lambda: func(*args, **kwargs))
+        return [dict(row) for row in rows]
+    return wrapper
+
+# Category tree shared by navigation, category pages and staff category management
+category_cache = NamespaceCache('categories', get_backend(Config.CACHE_REDIS_URL), default_ttl=Config.CATALOG_CACHE_TTL)
+
+# Sorted active volume discount rules, rebuilt after staff edit a rule
+volume_discount_cache = NamespaceCache('volume_discounts', get_backend(Config.CACHE_REDIS_URL), default_ttl=Config.CATALOG_CACHE_TTL)
+
+# Total counts for the staff order list, keyed by filter; short TTL so new orders show up quickly
+order_count_cache = NamespaceCache('order_counts', get_backend(Config.CACHE_REDIS_URL), default_ttl=Config.ORDER_COUNT_CACHE_TTL)
+# Staff customer list totals per search (dropped when a customer is added, deleted or restored)
+customer_count_cache = NamespaceCache('customer_counts', get_backend(Config.CACHE_REDIS_URL), default_ttl=Config.CUSTOMER_COUNT_CACHE_TTL)
+
+# Completed-order widgets on the staff dashboard, keyed by day and shared by every polling session
+order_widget_cache = NamespaceCache('order_widgets', get_backend(Config.CACHE_REDIS_URL), default_ttl=Config.ORDER_WIDGET_CACHE_TTL)
+
+def invalidate_catalog_cache():
+    """Drop every cached product listing (call after product, price, discount or stock changes)"""
+    catalog_cache.invalidate()
+
+# In-process slug -> product id map for hot product pages. Entries are re-validated
+# against the row on every hit, so a stale entry costs at most one extra query.
+_SLUG_CACHE_MAX = 1024
+_slug_cache = {}
+
+def _has_slug_column():
+    """Whether products.slug exists (run_slug_migration.py)"""
+    return schema.has_column('products', 'slug')
+
+# In-process full-text index used by Product.search and the search endpoints
+product_search_index = ProductSearchIndex()
+# Prefix index behind /api/search_suggestions, built from the same rows
+product_autocomplete = AutocompleteIndex(limit=10)
+
+_SEARCH_INDEX_QUERY = """
+    SELECT p.id, p.name, p.description, p.cpu, p.ram, p.storage, p.graphics, p.archived,
+           cat.name as category_name
+    FROM products p
+    LEFT JOIN categories cat ON p.category_id = cat.id
+"""
+
+def unique_product_slug(cur, name, product_id=None):
+    """Slug for a product name that is not used by any other product (duplicates get -2, -3, ...)"""
+    base = generate_slug(name) or 'product'
+    cur.execute(
+        "SELECT slug FROM products WHERE (slug = %s OR slug LIKE %s) AND id != %s",
+        (base, base + '-%', product_id or 0)
+    )
+    taken = {row['slug'] if isinstance(row, dict) else row[0] for row in cur.fetchall()}
+    if base not in taken:
+        return base
+    suffix = 2
+    while f"{base}-{suffix}" in taken:
+        suffix += 1
+    return f"{base}-{suffix}"
+
 class Product:
     @staticmethod
+    @catalog_cached
     def get_all(include_archived=False, include_deleted=False):
         conn = get_db()
         cur = conn.cursor(dictionary=True)
@@ -69,20 +221,12 @@ class Product:
                 LEFT JOIN warranty w ON p.warranty_id = w.warranty_id
             """
             conditions = []
-            if not include_archived:
+            if not include_archived and schema.has_column('products', 'archived'):
                 conditions.append("p.archived = FALSE")
-            if not include_deleted:
-                # Only add deleted condition if the column exists
-                # This handles cases where soft delete migration hasn't been run
-                try:
-                    # Check if deleted column exists
-                    cur.execute("SHOW COLUMNS FROM products LIKE 'deleted'")
-                    if cur.fetchone():
-                        conditions.append("(p.deleted = FALSE OR p.deleted IS NULL)")
-                except:
-                    # If there's any error checking, just skip the deleted filter
-                    pass
-            
+            if not include_deleted and schema.has_column('products', 'deleted'):
+                # Only filter on deleted once the soft delete migration has been run
+                conditions.append("(p.deleted = FALSE OR p.deleted IS NULL)")
+
             if conditions:
                 query += " WHERE " + " AND ".join(conditions)
             
@@ -115,19 +259,60 @@ class Product:
             """, (product_id,))
             product = cur.fetchone()
             current_app.logger.info(f"Product fetched: {product}")
+            if product:
+                stock_reservations.attach_available_stock(cur, [product])
             return product
         finally:
             cur.close()
             conn.close()
 
+    @staticmethod
+    def get_many(product_ids):
+        """
+        Fetch several products with one IN (...) query.
+        Returns {product_id: product} with the same columns as get_by_id (including
+        available_stock); missing ids are left out.
+        """
+        ids = list(dict.fromkeys(int(product_id) for product_id in product_ids if product_id is not None))
+        if not ids:
+            return {}
+        conn = get_db()
+        cur = conn.cursor(dictionary=True)
+        try:
+            placeholders = ','.join(['%s'] * len(ids))
+            cur.execute(f"""
+                SELECT p.*, p.stock as stock_quantity, cpu, ram, storage, graphics, display, os, keyboard, battery, weight, p.warranty_id, p.original_price,
+                       p.allow_preorder, p.expected_restock_date, p.preorder_limit,
+                       c.name as color, cat.name as category_name, w.warranty_name,
+                       p.photo, p.left_rear_view, p.back_view
+                FROM products p
+                LEFT JOIN colors c ON p.color_id = c.id
+                LEFT JOIN categories cat ON p.category_id = cat.id
+                LEFT JOIN warranty w ON p.warranty_id = w.warranty_id
+                WHERE p.id IN ({placeholders})
+            """, ids)
+            products = cur.fetchall()
+            stock_reservations.attach_available_stock(cur, products)
+            return {product['id']: product for product in products}
+        finally:
+            cur.close()
+            conn.close()
+
     @staticmethod
     def get_by_slug(slug):
-        """Get product by URL slug generated from product name"""
+        """Get product by URL slug using the indexed products.slug column"""
+        product_id = _slug_cache.get(slug)
+        if product_id is not None:
+            product = Product.get_by_id(product_id)
+            if product and product.get('slug') == slug and not product.get('archived'):
+                return product
+            Product.invalidate_slug_cache(slug=slug)
+
         conn = get_db()
         cur = conn.cursor(dictionary=True)
         try:
             current_app.logger.info(f"Fetching product with slug: {slug}")
-            cur.execute("""
+            base_query = """
                 SELECT p.*, p.stock as stock_quantity, cpu, ram, storage, graphics, display, os, keyboard, battery, weight, p.warranty_id, p.original_price,
                        p.allow_preorder, p.expected_restock_date, p.preorder_limit,
                        c.name as color, cat.name as category_name, w.warranty_name,
@@ -137,21 +322,53 @@ class Product:
                 LEFT JOIN categories cat ON p.category_id = cat.id
                 LEFT JOIN warranty w ON p.warranty_id = w.warranty_id
                 WHERE (p.archived IS NULL OR p.archived = FALSE)
-            """)
-            products = cur.fetchall()
+            """
+            if _has_slug_column():
+                cur.execute(base_query + " AND p.slug = %s LIMIT 1", (slug,))
+                product = cur.fetchone()
+            else:
+                # Slug migration not run yet: fall back to matching generated slugs
+                cur.execute(base_query)
+                product = next((row for row in cur.fetchall() if generate_slug(row['name']) == slug), None)
 
-            # Find product by matching slug generated from name
-            for product in products:
-                if generate_slug(product['name']) == slug:
-                    current_app.logger.info(f"Product found by slug: {product}")
-                    return product
+            if not product:
+                current_app.logger.info(f"No product found with slug: {slug}")
+                return None
 
-            current_app.logger.info(f"No product found with slug: {slug}")
-            return None
+            if len(_slug_cache) >= _SLUG_CACHE_MAX:
+                _slug_cache.clear()
+            _slug_cache[slug] = product['id']
+            return product
         finally:
             cur.close()
             conn.close()
 
+    @staticmethod
+    def unique_slug(name, product_id=None):
+        """Unique slug for a product name, or None when the slug migration has not been run"""
+        conn = get_db()
+        cur = conn.cursor()
+        try:
+            if not _has_slug_column():
+                return None
+            return unique_product_slug(cur, name, product_id)
+        finally:
+            cur.close()
+            conn.close()
+
+    @staticmethod
+    def invalidate_slug_cache(product_id=None, slug=None):
+        """Drop cached slug lookups for a product (or a single slug, or everything when called without arguments)"""
+        if product_id is None and slug is None:
+            _slug_cache.clear()
+            return
+        if slug is not None:
+            _slug_cache.pop(slug, None)
+        if product_id is not None:
+            for cached_slug, cached_id in list(_slug_cache.items()):
+                if cached_id == product_id:
+                    _slug_cache.pop(cached_slug, None)
+
     @staticmethod
     def get_low_stock_products(threshold=5):
         conn = get_db()
@@ -170,6 +387,7 @@ class Product:
             conn.close()
 
     @staticmethod
+    @catalog_cached
     def get_by_category(category_id):
         conn = get_db()
         cur = conn.cursor(dictionary=True)
@@ -192,6 +410,7 @@ class Product:
             conn.close()
 
     @staticmethod
+    @catalog_cached
     def get_by_categories(category_ids):
         if not category_ids:
             return []
@@ -218,6 +437,7 @@ class Product:
  
 
     @staticmethod
+    @catalog_cached
     def get_featured(limit=8, include_archived=False):
         conn = get_db()
         cur = conn.cursor(dictionary=True)
@@ -251,6 +471,7 @@ class Product:
                 (product_id, quantity)
             )
             conn.commit()
+            invalidate_catalog_cache()
         finally:
             cur.close()
             conn.close()
@@ -284,6 +505,7 @@ class Product:
                 (product_id, -quantity)
             )
             conn.commit()
+            invalidate_catalog_cache()
 
         except Exception as e:
             conn.rollback()
@@ -297,15 +519,19 @@ class Product:
         conn = get_db()
         cur = conn.cursor()
         try:
+            columns = ['name', 'description', 'price', 'stock', 'category_id', 'photo', 'warranty_id', 'cpu', 'ram', 'storage', 'graphics', 'display', 'os', 'keyboard', 'battery', 'weight', 'color_id', 'left_rear_view', 'back_view', 'original_price']
+            values = [name, description, price, stock, category_id, photo, warranty_id, cpu, ram, storage, graphics, display, os, keyboard, battery, weight, color_id, left_rear_view, back_view, original_price]
+            if _has_slug_column():
+                columns.append('slug')
+                values.append(unique_product_slug(cur, name))
             cur.execute(
-                """
-                INSERT INTO products (name, description, price, stock, category_id, photo, warranty_id, cpu, ram, storage, graphics, display, os, keyboard, battery, weight, color_id, left_rear_view, back_view, original_price)
-                VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s)
-                """,
-                (name, description, price, stock, category_id, photo, warranty_id, cpu, ram, storage, graphics, display, os, keyboard, battery, weight, color_id, left_rear_view, back_view, original_price)
+                f"INSERT INTO products ({', '.join(columns)}) VALUES ({', '.join(['%s'] * len(columns))})",
+                values
             )
             conn.commit()
             product_id = cur.lastrowid
+            invalidate_catalog_cache()
+            Product.reindex(product_id)
             return product_id
         except Exception as e:
             conn.rollback()
@@ -402,6 +628,9 @@ class Product:
 
             conn.commit()
 
+            Product.invalidate_slug_cache(product_id=product_id)
+            invalidate_catalog_cache()
+            Product.reindex(product_id)
             current_app.logger.info(f"Product {product_id} archived successfully along with {deleted_inventory} inventory records")
             return True
 
@@ -513,6 +742,9 @@ class Product:
                 raise ValueError("Product not found or already deleted")
             
             conn.commit()
+            Product.invalidate_slug_cache(product_id=product_id)
+            invalidate_catalog_cache()
+            Product.reindex(product_id)
             current_app.logger.info(f"Product {product_id} ({product_name}) deleted successfully using denormalization approach")
             return True
             
@@ -534,8 +766,7 @@ class Product:
         cur = conn.cursor()
         try:
             # Check if soft delete columns exist first
-            cur.execute("SHOW COLUMNS FROM products LIKE 'deleted'")
-            if not cur.fetchone():
+            if not schema.has_column('products', 'deleted'):
                 raise ValueError("Soft delete functionality not available. Please run the soft delete migration script first.")
             
             # Check if product exists and is not already deleted
@@ -559,6 +790,9 @@ class Product:
                 raise ValueError("Failed to mark product as deleted")
             
             conn.commit()
+            Product.invalidate_slug_cache(product_id=product_id)
+            invalidate_catalog_cache()
+            Product.reindex(product_id)
             current_app.logger.info(f"Product {product_id} ({product_name}) soft deleted successfully")
             return True
             
@@ -579,8 +813,7 @@ class Product:
         cur = conn.cursor()
         try:
             # Check if soft delete columns exist first
-            cur.execute("SHOW COLUMNS FROM products LIKE 'deleted'")
-            if not cur.fetchone():
+            if not schema.has_column('products', 'deleted'):
                 raise ValueError("Soft delete functionality not available. Please run the soft delete migration script first.")
             
             # Check if product exists and is soft deleted
@@ -604,6 +837,7 @@ class Product:
                 raise ValueError("Failed to restore product")
             
             conn.commit()
+            invalidate_catalog_cache()
             current_app.logger.info(f"Product {product_id} ({product_name}) restored successfully")
             return True
             
@@ -665,6 +899,9 @@ class Product:
             if not updates:
                 raise ValueError("No fields to update")
 
+            if name is not None and _has_slug_column():
+                updates['slug'] = unique_product_slug(cur, name, product_id)
+
             set_clause = ", ".join([f"`{k}` = %s" for k in updates])
             values = list(updates.values()) + [product_id]
             cur.execute(
@@ -672,6 +909,10 @@ class Product:
                 values
             )
             conn.commit()
+            if name is not None:
+                Product.invalidate_slug_cache(product_id=product_id)
+            invalidate_catalog_cache()
+            Product.reindex(product_id)
             return cur.rowcount > 0
         except Exception as e:
             conn.rollback()
@@ -680,23 +921,76 @@ class Product:
             cur.close()
             conn.close()
 
+    @staticmethod
+    def search_ids(query, limit=None, include_archived=False):
+        """Ranked product ids for a search query, answered from the in-process search index"""
+        if product_search_index.is_stale(Config.SEARCH_INDEX_TTL):
+            Product.rebuild_search_index()
+        return product_search_index.search(query, limit=limit, include_archived=include_archived)
+
+    @staticmethod
+    def suggest(prefix):
+        """Autocomplete suggestions ({'id', 'name'}) for a typed prefix, served from memory"""
+        if product_search_index.is_stale(Config.SEARCH_INDEX_TTL):
+            Product.rebuild_search_index()
+        return product_autocomplete.suggest(prefix)
+
+    @staticmethod
+    def rebuild_search_index():
+        conn = get_db()
+        cur = conn.cursor(dictionary=True)
+        try:
+            cur.execute(_SEARCH_INDEX_QUERY)
+            products = cur.fetchall()
+            product_search_index.build(products)
+            product_autocomplete.build(products)
+        finally:
+            cur.close()
+            conn.close()
+
+    @staticmethod
+    def reindex(product_id):
+        """Refresh one product in the search index after it was created, updated, archived or deleted"""
+        if product_search_index.built_at is None:
+            return
+        conn = get_db()
+        cur = conn.cursor(dictionary=True)
+        try:
+            cur.execute(_SEARCH_INDEX_QUERY + " WHERE p.id = %s", (product_id,))
+            product = cur.fetchone()
+            if product:
+                product_search_index.upsert(product)
+                product_autocomplete.upsert(product)
+            else:
+                product_search_index.remove(product_id)
+                product_autocomplete.remove(product_id)
+        except Exception as e:
+            current_app.logger.warning(f"Could not reindex product {product_id}, rebuilding on next search: {e}")
+            product_search_index.built_at = None
+        finally:
+            cur.close()
+            conn.close()
+
     @staticmethod
     def search(query):
+        product_ids = Product.search_ids(query)
+        if not product_ids:
+            return []
         conn = get_db()
         cur = conn.cursor(dictionary=True)
         try:
-            like_query = f"%{query}%"
-            cur.execute("""
+            format_strings = ','.join(['%s'] * len(product_ids))
+            cur.execute(f"""
                 SELECT p.*, p.stock as stock_quantity, cpu, ram, storage, display, os, keyboard, battery, weight, p.warranty_id, color_id,
                        c.name as color, cat.name as category_name, w.warranty_name
                 FROM products p
                 LEFT JOIN colors c ON p.color_id = c.id
                 LEFT JOIN categories cat ON p.category_id = cat.id
                 LEFT JOIN warranty w ON p.warranty_id = w.warranty_id
-                WHERE p.name LIKE %s AND (p.archived IS NULL OR p.archived = FALSE)
-                ORDER BY p.id DESC
-            """, (like_query,))
-            results = cur.fetchall()
+                WHERE p.id IN ({format_strings}) AND (p.archived IS NULL OR p.archived = FALSE)
+            """, tuple(product_ids))
+            rank = {product_id: i for i, product_id in enumerate(product_ids)}
+            results = sorted(cur.fetchall(), key=lambda row: rank[row['id']])
             return results
         finally:
             cur.close()
@@ -735,6 +1029,7 @@ class Product:
             conn.close()
 
     @staticmethod
+    @catalog_cached
     def get_by_brand(brand):
         conn = get_db()
         cur = conn.cursor(dictionary=True)
@@ -784,74 +1079,165 @@ class Order:
     - Cancelled: Order cancelled, stock restored
     """
     @staticmethod
-    def get_paginated_orders(status=None, date=None, search=None, approval=None, page=1, page_size=10):
-        conn = get_db()
-        cur = conn.cursor(dictionary=True)
-        
-        base_query = """
-            SELECT o.id, c.first_name, c.last_name, o.status, o.order_date,
-                   o.total_amount as total, o.payment_method, o.approval_status
-            FROM orders o
-            JOIN customers c ON o.customer_id = c.id
-            WHERE 1=1
+    def _order_filters(status=None, date=None, search=None, approval=None):
         """
-        count_query = """
-            SELECT COUNT(*)
-            FROM orders o
-            JOIN customers c ON o.customer_id = c.id
-            WHERE 1=1
+        WHERE fragment shared by the order list and its count. Status and date are
+        written so MySQL can use the orders indexes: the column collation is already
+        case-insensitive, and a day is a half-open order_date range instead of DATE().
         """
+        where = ""
         params = []
-        
-        # Handle status filtering
+
         if status and status.lower() != 'all':
-            if status.lower() == 'pending':
-                # Show only pending orders
-                base_query += " AND LOWER(o.status) = 'pending'"
-                count_query += " AND LOWER(o.status) = 'pending'"
-            else:
-                # Show specific status (completed, cancelled, etc.)
-                base_query += " AND LOWER(o.status) = LOWER(%s)"
-                count_query += " AND LOWER(o.status) = LOWER(%s)"
-                params.append(status)
-        # No else clause - when status is 'all', show all orders including pending
-            
+            where += " AND o.status = %s"
+            params.append(status)
+
         if date:
-            base_query += " AND DATE(o.order_date) = %s"
-            count_query += " AND DATE(o.order_date) = %s"
-            params.append(date)
-        
+            day_start, day_end = day_range(date)
+            where += " AND o.order_date >= %s AND o.order_date < %s"
+            params.extend([day_start, day_end])
+
         if approval and approval.lower() != 'all':
-            base_query += " AND o.approval_status = %s"
-            count_query += " AND o.approval_status = %s"
+            where += " AND o.approval_status = %s"
             params.append(approval)
-        
+
         if search:
             if not (1 <= len(search) <= 20):
                 raise ValueError("Search query length must be between 1 and 20 characters")
-            search_clause = " AND (LOWER(CONCAT(c.first_name, ' ', c.last_name)) LIKE LOWER(%s) OR LOWER(c.first_name) LIKE LOWER(%s) OR LOWER(c.last_name) LIKE LOWER(%s))"
-            base_query += search_clause
-            count_query += search_clause
+            where += " AND (LOWER(CONCAT(c.first_name, ' ', c.last_name)) LIKE LOWER(%s) OR LOWER(c.first_name) LIKE LOWER(%s) OR LOWER(c.last_name) LIKE LOWER(%s))"
             like_search = f"%{search.lower()}%"
             params.extend([like_search, like_search, like_search])
-            
-        # Get total count
-        cur.execute(count_query, params)
-        total_orders = cur.fetchone()['COUNT(*)']
-        
-        # Add pagination to base query
-        base_query += " ORDER BY o.order_date DESC LIMIT %s OFFSET %s"
-        offset = (page - 1) * page_size
-        params.extend([page_size, offset])
-        
-        print("Executing SQL:", base_query)
-        print("With params:", params)
-        
-        cur.execute(base_query, params)
-        orders = cur.fetchall()
-        cur.close()
+
+        return where, params
+
+    @staticmethod
+    def count_orders(status=None, date=None, search=None, approval=None, approximate=False):
+        """
+        Total for the staff order list, cached for ORDER_COUNT_CACHE_TTL seconds per filter.
+        With approximate=True an unfiltered count comes from the table statistics instead.
+        """
+        where, params = Order._order_filters(status, date, search, approval)
+
+        def load():
+            conn = get_db()
+            cur = conn.cursor()
+            try:
+                if approximate and not where:
+                    cur.execute("""
+                        SELECT TABLE_ROWS
+                        FROM information_schema.TABLES
+                        WHERE TABLE_SCHEMA = DATABASE() AND TABLE_NAME = 'orders'
+                    """)
+                    row = cur.fetchone()
+                    if row and row[0] is not None:
+                        return int(row[0])
+                # Same join as the list query, so orders it never shows are not counted either
+                cur.execute(f"""
+                    SELECT COUNT(*)
+                    FROM orders o
+                    JOIN customers c ON o.customer_id = c.id
+                    WHERE 1=1{where}
+                """, params)
+                return cur.fetchone()[0]
+            finally:
+                cur.close()
+                conn.close()
+
+        key = f"count:{approximate}:{where}:{params!r}"
+        return order_count_cache.get_or_load(key, load)
+
+    @staticmethod
+    def get_paginated_orders(status=None, date=None, search=None, approval=None, page=1, page_size=10,
+                             cursor=None, with_total=True, approximate_total=False):
+        """
+        Newest-first page of the staff order list and the filtered total.
+        Pass the `cursor` of the previous page's last row (utils.keyset.next_cursor) for keyset
+        pagination; without it the page is read with OFFSET as before. with_total=False skips
+        the count and returns None for it.
+        """
+        where, params = Order._order_filters(status, date, search, approval)
+        total_orders = Order.count_orders(status, date, search, approval, approximate_total) if with_total else None
+
+        query = f"""
+            SELECT o.id, c.first_name, c.last_name, o.status, o.order_date,
+                   o.total_amount as total, o.payment_method, o.approval_status
+            FROM orders o
+            JOIN customers c ON o.customer_id = c.id
+            WHERE 1=1{where}
+        """
+        if cursor:
+            seek_sql, seek_params = seek_clause(cursor)
+            query += seek_sql
+            params = params + seek_params
+            query += " ORDER BY o.order_date DESC, o.id DESC LIMIT %s"
+            params.append(page_size)
+        else:
+            query += " ORDER BY o.order_date DESC, o.id DESC LIMIT %s OFFSET %s"
+            params.extend([page_size, (max(page, 1) - 1) * page_size])
+
+        conn = get_db()
+        cur = conn.cursor(dictionary=True)
+        try:
+            cur.execute(query, params)
+            orders = cur.fetchall()
+        finally:
+            cur.close()
+            conn.close()
         return orders, total_orders
 
+    @staticmethod
+    def get_completed_for_widget(day=None, limit=20):
+        """
+        Latest completed orders for the staff order widgets, optionally for one day.
+        Item count and first product name come from the same grouped query, so each
+        row carries its "details" without a per-order items lookup. Results are cached
+        for ORDER_WIDGET_CACHE_TTL seconds per day.
+        """
+        def load():
+            where = ""
+            params = []
+            if day:
+                day_start, day_end = day_range(day)
+                where = " AND o.order_date >= %s AND o.order_date < %s"
+                params.extend([day_start, day_end])
+            params.append(limit)
+
+            conn = get_db()
+            cur = conn.cursor(dictionary=True)
+            try:
+                cur.execute(f"""
+                    SELECT o.id, o.order_date, c.first_name, c.last_name, o.total_amount,
+                           o.status, o.payment_method, o.approval_status, o.transaction_id,
+                           COUNT(oi.id) AS item_count, MIN(oi.product_name) AS first_product_name
+                    FROM orders o
+                    JOIN customers c ON o.customer_id = c.id
+                    LEFT JOIN order_items oi ON oi.order_id = o.id
+                    WHERE o.status = 'COMPLETED'{where}
+                    GROUP BY o.id
+                    ORDER BY o.order_date DESC, o.id DESC
+                    LIMIT %s
+                """, params)
+                rows = cur.fetchall()
+            finally:
+                cur.close()
+                conn.close()
+
+            return [{
+                'id': row['id'],
+                'date': row['order_date'].strftime('%Y-%m-%d %H:%M:%S') if hasattr(row['order_date'], 'strftime') else str(row['order_date']),
+                'customer_name': f"{row['first_name']} {row['last_name']}",
+                'amount': float(row['total_amount']) if row['total_amount'] is not None else 0.0,
+                'status': row['status'],
+                'payment_method': row['payment_method'] if row['payment_method'] is not None else 'QR Payment',
+                'approval_status': row['approval_status'] if row['approval_status'] is not None else 'Pending Approval',
+                'type': 'order',
+                # Show the product name for single-item orders
+                'details': row['first_product_name'] if row['item_count'] == 1 else 'Multiple items'
+            } for row in rows]
+
+        key = f"completed:{day or 'all'}:{limit}"
+        return [dict(order) for order in order_widget_cache.get_or_load(key, load)]
+
     @staticmethod
     def get_by_status(status):
         conn = get_db()
@@ -923,20 +1309,25 @@ class Order:
             order_items = cur.fetchall()
             cancelled_items = []
 
+            # Units still held by a stock reservation were never taken from stock
+            released = stock_reservations.release(cur, order_id)
+
             # Restore inventory for each item
             for item in order_items:
-                # Restore stock
-                cur.execute("""
-                    UPDATE products
-                    SET stock = stock + %s
-                    WHERE id = %s
-                """, (item['quantity'], item['product_id']))
+                restore = restore_quantity(released, item['product_id'], item['quantity'])
+                if restore:
+                    # Restore stock
+                    cur.execute("""
+                        UPDATE products
+                        SET stock = stock + %s
+                        WHERE id = %s
+                    """, (restore, item['product_id']))
 
-                # Log inventory change
-                cur.execute("""
-                    INSERT INTO inventory (product_id, changes, change_date)
-                    VALUES (%s, %s, NOW())
-                """, (item['product_id'], item['quantity']))
+                    # Log inventory change
+                    cur.execute("""
+                        INSERT INTO inventory (product_id, changes, change_date)
+                        VALUES (%s, %s, NOW())
+                    """, (item['product_id'], restore))
 
                 cancelled_items.append({
                     'product_name': item['product_name'],
@@ -953,6 +1344,7 @@ class Order:
             """, (order_id,))
 
             conn.commit()
+            invalidate_catalog_cache()
             current_app.logger.info(f"Order {order_id} cancelled successfully by {staff_username}")
 
             return {
@@ -1004,20 +1396,28 @@ class Order:
             cancelled_items = []
             refund_amount = 0
 
+            # Units still held by a stock reservation were never taken from stock
+            cancel_quantities = {}
+            for item in items_to_cancel:
+                cancel_quantities[item['product_id']] = cancel_quantities.get(item['product_id'], 0) + item['quantity']
+            released = stock_reservations.release(cur, order_id, cancel_quantities)
+
             # Process each item cancellation
             for item in items_to_cancel:
-                # Restore stock
-                cur.execute("""
-                    UPDATE products
-                    SET stock = stock + %s
-                    WHERE id = %s
-                """, (item['quantity'], item['product_id']))
+                restore = restore_quantity(released, item['product_id'], item['quantity'])
+                if restore:
+                    # Restore stock
+                    cur.execute("""
+                        UPDATE products
+                        SET stock = stock + %s
+                        WHERE id = %s
+                    """, (restore, item['product_id']))
 
-                # Log inventory change
-                cur.execute("""
-                    INSERT INTO inventory (product_id, changes, change_date)
-                    VALUES (%s, %s, NOW())
-                """, (item['product_id'], item['quantity']))
+                    # Log inventory change
+                    cur.execute("""
+                        INSERT INTO inventory (product_id, changes, change_date)
+                        VALUES (%s, %s, NOW())
+                    """, (item['product_id'], restore))
 
                 # Remove the cancelled items from order_items
                 cur.execute("""
@@ -1060,6 +1460,7 @@ class Order:
                 """, (new_total, order_id))
 
             conn.commit()
+            invalidate_catalog_cache()
             current_app.logger.info(f"Partial cancellation completed for order {order_id} by {staff_username}")
 
             return {
@@ -1262,25 +1663,15 @@ class Order:
             volume_discount_amount = 0.0
 
             if total_amount > 0:
-                # Find applicable volume discount rule
-                cur.execute("""
-                    SELECT id, discount_percentage
-                    FROM volume_discount_rules
-                    WHERE minimum_amount <= %s AND is_active = TRUE
-                    ORDER BY minimum_amount DESC
-                    LIMIT 1
-                """, (total_amount,))
-
-                volume_rule = cur.fetchone()
-                if volume_rule:
-                    volume_discount_rule_id, discount_percentage = volume_rule
-                    volume_discount_percentage = float(discount_percentage)
-
-                    # Calculate volume discount amount (no maximum limit)
-                    volume_discount_amount = total_amount * (volume_discount_percentage / 100)
+                # Find applicable volume discount rule (in-memory rule index, no maximum limit)
+                volume_discount = VolumeDiscount.quote(total_amount)
+                if volume_discount['applicable']:
+                    volume_discount_rule_id = volume_discount['rule_id']
+                    volume_discount_percentage = volume_discount['discount_percentage']
+                    volume_discount_amount = volume_discount['discount_amount']
 
                     # Apply volume discount to total
-                    total_amount -= volume_discount_amount
+                    total_amount = volume_discount['final_total']
 
             cur.execute("""
                 UPDATE orders
@@ -1290,6 +1681,9 @@ class Order:
             """, (total_amount, volume_discount_rule_id, volume_discount_percentage, volume_discount_amount, order_id))
 
             conn.commit()
+            invalidate_catalog_cache()
+            if status.upper() == 'COMPLETED':
+                sales_rollup.refresh_orders([order_id])
             return order_id
         except Exception as e:
             conn.rollback()
@@ -1367,60 +1761,65 @@ class Order:
     @staticmethod
     def update_status(order_id, status):
         """Update order status and handle stock restoration for cancelled orders."""
-        conn = get_db()
-        cur = conn.cursor()
-        try:
-            # Get current order status
-            cur.execute("SELECT status FROM orders WHERE id = %s", (order_id,))
-            result = cur.fetchone()
-            if not result:
-                raise ValueError(f"Order with ID {order_id} not found")
-
-            current_status = result[0]
-
-            print(f"Updating order {order_id} status from {current_status} to {status}")
-
-            # If changing to Cancelled status, restore stock only if order was previously Completed
-            # (meaning stock was actually reduced)
-            if status.lower() == 'cancelled' and current_status.lower() == 'completed':
-                print(f"Restoring stock for cancelled completed order {order_id}")
-                # Get order items to restore stock
-                cur.execute("""
-                    SELECT product_id, quantity
-                    FROM order_items
-                    WHERE order_id = %s
-                """, (order_id,))
-                order_items = cur.fetchall()
-
-                # Restore stock for each item
-                for product_id, quantity in order_items:
-                    cur.execute(
-                        "UPDATE products SET stock = stock + %s WHERE id = %s",
-                        (quantity, product_id)
-                    )
-                    print(f"Restored {quantity} units for product {product_id}")
-
-                    # Log the stock restoration in inventory table
-                    cur.execute(
-                        "INSERT INTO inventory (product_id, changes) VALUES (%s, %s)",
-                        (product_id, quantity)
-                    )
-            elif status.lower() == 'cancelled' and current_status.lower() == 'pending':
-                print(f"Cancelling pending order {order_id} - no stock restoration needed (stock was never reduced)")
-
-            # Update order status (ensure proper capitalization)
-            cur.execute(
-                "UPDATE orders SET status = %s WHERE id = %s",
-                (status.capitalize(), order_id)
-            )
-            conn.commit()
-        except Exception as e:
-            print(f"Exception in update_status: {e}")
-            conn.rollback()
-            raise
-        finally:
-            cur.close()
-            conn.close()
+        # Status checks and stock changes commit together; the order row is locked so
+        # two concurrent status changes cannot both act on the same previous status
+        with request_db.transaction() as conn:
+            cur = conn.cursor()
+            try:
+                # Get current order status
+                cur.execute("SELECT status FROM orders WHERE id = %s FOR UPDATE", (order_id,))
+                result = cur.fetchone()
+                if not result:
+                    raise ValueError(f"Order with ID {order_id} not found")
+
+                current_status = result[0]
+
+                print(f"Updating order {order_id} status from {current_status} to {status}")
+
+                # If changing to Cancelled status, restore stock only if order was previously Completed
+                # (meaning stock was actually reduced)
+                if status.lower() == 'cancelled' and current_status.lower() == 'completed':
+                    print(f"Restoring stock for cancelled completed order {order_id}")
+                    # Get order items to restore stock
+                    cur.execute("""
+                        SELECT product_id, quantity
+                        FROM order_items
+                        WHERE order_id = %s
+                    """, (order_id,))
+                    order_items = cur.fetchall()
+
+                    # Restore stock for each item
+                    for product_id, quantity in order_items:
+                        cur.execute(
+                            "UPDATE products SET stock = stock + %s WHERE id = %s",
+                            (quantity, product_id)
+                        )
+                        print(f"Restored {quantity} units for product {product_id}")
+
+                        # Log the stock restoration in inventory table
+                        cur.execute(
+                            "INSERT INTO inventory (product_id, changes) VALUES (%s, %s)",
+                            (product_id, quantity)
+                        )
+                elif status.lower() == 'cancelled' and current_status.lower() == 'pending':
+                    print(f"Cancelling pending order {order_id} - no stock restoration needed (stock was never reduced)")
+                    stock_reservations.release(cur, order_id)
+                elif status.lower() == 'completed' and current_status.lower() == 'pending':
+                    # Payment confirmed by staff: held units become a real stock decrement
+                    stock_reservations.convert(cur, order_id)
+
+                # Update order status (ensure proper capitalization)
+                cur.execute(
+                    "UPDATE orders SET status = %s WHERE id = %s",
+                    (status.capitalize(), order_id)
+                )
+            except Exception as e:
+                print(f"Exception in update_status: {e}")
+                raise
+            finally:
+                cur.close()
+        invalidate_catalog_cache()
+        sales_rollup.refresh_orders([order_id])
 
     @staticmethod
     def get_total_orders_count():
@@ -1447,15 +1846,15 @@ class Report:
             adjusted_start = start_dt.strftime('%Y-%m-%d 00:00:00')
             adjusted_end = end_dt.strftime('%Y-%m-%d 00:00:00')
 
-            cur.execute("""
-                SELECT DATE(o.order_date) as date,
-                       SUM(oi.quantity * oi.price) as daily_sales
-                FROM orders o
-                JOIN order_items oi ON o.id = oi.order_id
-                WHERE LOWER(o.status) = 'completed'
-                AND o.order_date >= %s AND o.order_date < %s
-                GROUP BY DATE(o.order_date)
-            """, (adjusted_start, adjusted_end))
+            source, source_params = sales_rollup.source(start_dt, end_dt - timedelta(days=1))
+            cur.execute(f"""
+                SELECT sd.sale_date as date,
+                       SUM(sd.revenue) as daily_sales
+                FROM {source}
+                WHERE sd.sale_date BETWEEN %s AND %s
+                GROUP BY sd.sale_date
+                ORDER BY sd.sale_date
+            """, source_params + [start_dt.date(), (end_dt - timedelta(days=1)).date()])
             sales = cur.fetchall()
             current_app.logger.info(f"Report.get_sales: Fetched {len(sales)} sales records for dates {adjusted_start} to {adjusted_end}.")
             return sales
@@ -1472,70 +1871,59 @@ class Report:
         Fetch detailed sales data for the given month (format: 'YYYY-MM').
         Returns a list of sales details such as order id, date, customer, total amount, etc.
         Includes both completed orders and confirmed pre-orders.
+        Closed months are served from report_cache; the current month is always recomputed.
         """
         try:
-            conn = get_db()
-            cur = conn.cursor(dictionary=True)
-            
-            start_date = f"{month}-01"
-            # Calculate end date as last day of the month
-            from datetime import datetime
-            import calendar
             year, mon = map(int, month.split('-'))
-            last_day = calendar.monthrange(year, mon)[1]
-            end_date = f"{month}-{last_day:02d}"
+            month = f"{year:04d}-{mon:02d}"
+        except ValueError:
+            current_app.logger.error(f"Error in get_monthly_sales_detail: invalid month {month!r}")
+            return []
+
+        if month >= datetime.now().strftime('%Y-%m'):
+            return Report._load_monthly_sales_detail(year, mon)
+        try:
+            details = report_cache.get_or_load(f"monthly_sales_detail:{month}",
+                                               lambda: Report._load_monthly_sales_detail(year, mon, raise_errors=True))
+        except Exception:
+            return []
+        return [dict(detail) for detail in details]
 
+    @staticmethod
+    def _load_monthly_sales_detail(year, mon, raise_errors=False):
+        """One grouped query for the month's orders and their items, plus the pre-order query"""
+        month_start = f"{year:04d}-{mon:02d}-01 00:00:00"
+        month_end = f"{year + mon // 12:04d}-{mon % 12 + 1:02d}-01 00:00:00"
+        conn = get_db()
+        cur = conn.cursor(dictionary=True)
+        try:
             sales_details = []
 
-            # Get completed orders
+            # Completed orders with their item totals, profit and product names
             cur.execute("""
-                SELECT o.id as order_id, o.order_date, c.first_name, c.last_name, o.total_amount
+                SELECT o.id as order_id, o.order_date, c.first_name, c.last_name, o.total_amount,
+                       SUM(oi.quantity * oi.price) as grand_total,
+                       SUM((oi.price - p.original_price) * oi.quantity) as total_profit,
+                       GROUP_CONCAT(p.name SEPARATOR ', ') as products
                 FROM orders o
                 JOIN customers c ON o.customer_id = c.id
-                WHERE o.order_date BETWEEN %s AND %s
-                AND LOWER(o.status) = 'completed'
+                LEFT JOIN order_items oi ON oi.order_id = o.id
+                LEFT JOIN products p ON oi.product_id = p.id
+                WHERE o.order_date >= %s AND o.order_date < %s
+                AND o.status = 'COMPLETED'
+                GROUP BY o.id
                 ORDER BY o.order_date ASC
-            """, (start_date, end_date))
-            result = cur.fetchall()
-
-            for row in result:
-                # Calculate grand total and profit for each order
-                cur.execute("""
-                    SELECT SUM(quantity * price) as grand_total
-                    FROM order_items
-                    WHERE order_id = %s
-                """, (row['order_id'],))
-                grand_total_result = cur.fetchone()
-                grand_total = float(grand_total_result['grand_total']) if grand_total_result and grand_total_result['grand_total'] else 0.0
-
-                # Calculate total profit for this order
-                cur.execute("""
-                    SELECT SUM((oi.price - p.original_price) * oi.quantity) as total_profit
-                    FROM order_items oi
-                    JOIN products p ON oi.product_id = p.id
-                    WHERE oi.order_id = %s
-                """, (row['order_id'],))
-                profit_result = cur.fetchone()
-                total_profit = float(profit_result['total_profit']) if profit_result and profit_result['total_profit'] else 0.0
-
-                # Get product names for this order
-                cur.execute("""
-                    SELECT GROUP_CONCAT(p.name SEPARATOR ', ') as products
-                    FROM order_items oi
-                    JOIN products p ON oi.product_id = p.id
-                    WHERE oi.order_id = %s
-                """, (row['order_id'],))
-                products_result = cur.fetchone()
-                products = products_result['products'] if products_result and products_result['products'] else 'No products'
+            """, (month_start, month_end))
 
+            for row in cur.fetchall():
                 sales_details.append({
                     'order_id': row['order_id'],
                     'order_date': row['order_date'].strftime('%Y-%m-%d'),
                     'customer_name': f"{row['first_name']} {row['last_name']}",
                     'total_amount': float(row['total_amount']),
-                    'grand_total': grand_total,
-                    'total_profit': total_profit,
-                    'products': products,
+                    'grand_total': float(row['grand_total'] or 0),
+                    'total_profit': float(row['total_profit'] or 0),
+                    'products': row['products'] or 'No products',
                     'type': 'order'
                 })
 
@@ -1546,14 +1934,13 @@ class Report:
                 FROM pre_orders po
                 JOIN customers c ON po.customer_id = c.id
                 JOIN products p ON po.product_id = p.id
-                WHERE po.updated_date BETWEEN %s AND %s
+                WHERE po.updated_date >= %s AND po.updated_date < %s
                 AND po.status IN ('confirmed', 'partially_paid', 'ready_for_pickup')
                 AND po.deposit_amount > 0
                 ORDER BY po.updated_date ASC
-            """, (start_date, end_date))
-            preorder_result = cur.fetchall()
+            """, (month_start, month_end))
 
-            for row in preorder_result:
+            for row in cur.fetchall():
                 deposit_amount = float(row['deposit_amount'] or 0)
                 # Estimate profit as 10% of deposit (conservative estimate)
                 estimated_profit = deposit_amount * 0.1
@@ -1573,14 +1960,13 @@ class Report:
             sales_details.sort(key=lambda x: x['order_date'])
             return sales_details
         except Exception as e:
-            # Log error if needed
             current_app.logger.error(f"Error in get_monthly_sales_detail: {e}")
+            if raise_errors:
+                raise  # keep failures out of report_cache
             return []
         finally:
-            if 'cur' in locals():
-                cur.close()
-            if 'conn' in locals():
-                conn.close()
+            cur.close()
+            conn.close()
 
     @staticmethod
     def get_top_products(limit=10):
@@ -1645,20 +2031,19 @@ class Report:
         cur = conn.cursor(dictionary=True)
         try:
             # Get sales from completed orders
-            cur.execute("""
+            source, source_params = sales_rollup.source(start_date, end_date)
+            cur.execute(f"""
                 SELECT
-                    DATE_FORMAT(o.order_date, '%Y-%m') as month,
-                    SUM(oi.quantity * oi.price) as total_sales,
-                    SUM(oi.quantity * (oi.price - p.original_price)) as total_profit
-                FROM orders o
-                JOIN order_items oi ON o.id = oi.order_id
-                JOIN products p ON oi.product_id = p.id
-                WHERE o.order_date BETWEEN %s AND %s
-                AND LOWER(o.status) = 'completed'
+                    DATE_FORMAT(sd.sale_date, '%Y-%m') as month,
+                    SUM(sd.revenue) as total_sales,
+                    SUM(sd.profit) as total_profit
+                FROM {source}
+                JOIN products p ON sd.product_id = p.id
+                WHERE sd.sale_date BETWEEN %s AND %s
                 AND (p.archived IS NULL OR p.archived = FALSE)
                 GROUP BY month
                 ORDER BY month ASC
-            """, (start_date, end_date))
+            """, source_params + [start_date, end_date])
 
             order_sales = cur.fetchall()
 
@@ -1735,16 +2120,16 @@ class Report:
         cur = conn.cursor()
         try:
             # Get revenue from completed orders
-            cur.execute("""
-                SELECT SUM(oi.quantity * oi.price)
-                FROM orders o
-                JOIN order_items oi ON o.id = oi.order_id
-                JOIN products p ON oi.product_id = p.id
-                WHERE LOWER(o.status) = 'completed'
-                AND YEAR(o.order_date) = YEAR(CURDATE())
-                AND MONTH(o.order_date) = MONTH(CURDATE())
+            today = datetime.now().date()
+            first_day = today.replace(day=1)
+            source, source_params = sales_rollup.source(first_day, today)
+            cur.execute(f"""
+                SELECT SUM(sd.revenue)
+                FROM {source}
+                JOIN products p ON sd.product_id = p.id
+                WHERE sd.sale_date BETWEEN %s AND %s
                 AND (p.archived IS NULL OR p.archived = FALSE)
-            """)
+            """, source_params + [first_day, today])
             order_result = cur.fetchone()
             order_revenue = float(order_result[0]) if order_result[0] is not None else 0.0
 
@@ -1771,6 +2156,120 @@ class Report:
             cur.close()
             conn.close()
 
+    @staticmethod
+    def get_daily_revenue(start_date, end_date):
+        """
+        Completed-order revenue (excluding archived products) and order count for each
+        day in [start_date, end_date] that had sales, oldest first.
+        """
+        conn = get_db()
+        cur = conn.cursor(dictionary=True)
+        try:
+            source, source_params = sales_rollup.source(start_date, end_date)
+            totals, totals_params = sales_rollup.totals_source(start_date, end_date)
+            cur.execute(f"""
+                SELECT r.sale_date, COALESCE(st.order_count, 0) as orders_count, r.revenue
+                FROM (
+                    SELECT sd.sale_date, SUM(sd.revenue) as revenue
+                    FROM {source}
+                    JOIN products p ON sd.product_id = p.id
+                    WHERE sd.sale_date BETWEEN %s AND %s
+                    AND (p.archived IS NULL OR p.archived = FALSE)
+                    GROUP BY sd.sale_date
+                ) r
+                LEFT JOIN {totals} ON st.sale_date = r.sale_date
+                ORDER BY r.sale_date ASC
+            """, source_params + [start_date, end_date] + totals_params)
+            return cur.fetchall()
+        finally:
+            cur.close()
+            conn.close()
+
+    @staticmethod
+    def get_monthly_revenue(year):
+        """Completed-order revenue (excluding archived products) and order count per month of `year`"""
+        start_date, end_date = f"{year}-01-01", f"{year}-12-31"
+        monthly = {}
+        for day in Report.get_daily_revenue(start_date, end_date):
+            month = day['sale_date'].strftime('%Y-%m')
+            entry = monthly.setdefault(month, {'month': month, 'orders_count': 0, 'monthly_revenue': 0.0})
+            entry['orders_count'] += int(day['orders_count'] or 0)
+            entry['monthly_revenue'] += float(day['revenue'] or 0)
+        return [monthly[month] for month in sorted(monthly)]
+
+    @staticmethod
+    def has_sales_in_year(year):
+        conn = get_db()
+        cur = conn.cursor()
+        try:
+            totals, totals_params = sales_rollup.totals_source(f"{year}-01-01", f"{year}-12-31")
+            cur.execute(f"""
+                SELECT COALESCE(SUM(st.order_count), 0)
+                FROM {totals}
+                WHERE st.sale_date BETWEEN %s AND %s
+            """, totals_params + [f"{year}-01-01", f"{year}-12-31"])
+            return int(cur.fetchone()[0]) > 0
+        finally:
+            cur.close()
+            conn.close()
+
+    @staticmethod
+    def get_day_summary(day):
+        """Completed orders, their total (after discounts) and item profit for one day"""
+        conn = get_db()
+        cur = conn.cursor()
+        try:
+            totals, totals_params = sales_rollup.totals_source(day, day)
+            source, source_params = sales_rollup.source(day, day)
+            cur.execute(f"""
+                SELECT
+                    (SELECT COALESCE(SUM(st.order_count), 0) FROM {totals} WHERE st.sale_date = %s),
+                    (SELECT COALESCE(SUM(st.order_total), 0) FROM {totals} WHERE st.sale_date = %s),
+                    (SELECT COALESCE(SUM(sd.profit), 0) FROM {source} WHERE sd.sale_date = %s)
+            """, totals_params + [day] + totals_params + [day] + source_params + [day])
+            orders_count, order_total, profit = cur.fetchone()
+            return {
+                'orders_count': int(orders_count or 0),
+                'total_sales': float(order_total or 0),
+                'total_profit': float(profit or 0)
+            }
+        finally:
+            cur.close()
+            conn.close()
+
+    @staticmethod
+    def get_day_approved_open(day):
+        """
+        Total and item profit of one day's orders that staff approved but whose status is not
+        COMPLETED yet. The rollup only holds COMPLETED orders; the daily staff views count these too.
+        """
+        day_start, day_end = day_range(day)
+        conn = get_db()
+        cur = conn.cursor()
+        try:
+            cur.execute("""
+                SELECT
+                    COALESCE(SUM(o.total_amount), 0),
+                    COALESCE(SUM((
+                        SELECT SUM(oi.quantity * (oi.price - p.original_price))
+                        FROM order_items oi
+                        JOIN products p ON oi.product_id = p.id
+                        WHERE oi.order_id = o.id
+                    )), 0)
+                FROM orders o
+                WHERE o.order_date >= %s AND o.order_date < %s
+                AND o.approval_status = 'APPROVED'
+                AND o.status <> 'COMPLETED'
+            """, (day_start, day_end))
+            order_total, profit = cur.fetchone()
+            return {
+                'total_sales': float(order_total or 0),
+                'total_profit': float(profit or 0)
+            }
+        finally:
+            cur.close()
+            conn.close()
+
     @staticmethod
     def get_average_order_value_this_month():
         conn = get_db()
@@ -1870,6 +2369,7 @@ class Customer(Base):
             customer_id = cur.lastrowid
             conn.commit()
             current_app.logger.info(f"Customer insert committed with ID: {customer_id}")
+            customer_count_cache.invalidate()
             cur.execute("SELECT created_at FROM customers WHERE id = %s", (customer_id,))
             result = cur.fetchone()
             if result:
@@ -1935,6 +2435,123 @@ class Customer(Base):
             cur.close()
             conn.close()
 
+    @staticmethod
+    def _lookup_keys():
+        """Indexed key columns once run_customer_lookup_migration.py has run, else equivalent expressions"""
+        if schema.has_column('customers', 'email_key'):
+            return LOOKUP_KEY_COLUMNS
+        return LOOKUP_KEY_EXPRESSIONS
+
+    @staticmethod
+    def order_count_sql(alias='customers'):
+        """SELECT expression for a customer's order count: the maintained counter when it exists"""
+        if schema.has_column('customers', 'order_count'):
+            return f"{alias}.order_count"
+        return f"(SELECT COUNT(*) FROM orders WHERE customer_id = {alias}.id)"
+
+    @staticmethod
+    def lookup(term, prefix=False, limit=10, columns="c.id, c.first_name, c.last_name, c.email, c.phone"):
+        """
+        Customers matching `term` as an email, a phone number or a name in either order,
+        best match first (exact before prefix, "first last" before "last first").
+        prefix=False is for resolving a login; prefix=True for as-you-type search.
+        Every branch is a separate lookup on one indexed key, capped at `limit` rows.
+        """
+        conditions = lookup_conditions(term, Customer._lookup_keys(), prefix=prefix)
+        if not conditions:
+            return []
+        branches = []
+        params = []
+        for rank, condition, condition_params in conditions:
+            branches.append(f"(SELECT id, {rank} AS match_rank FROM customers WHERE {condition} LIMIT %s)")
+            params.extend(condition_params + [limit])
+        conn = get_db()
+        cur = conn.cursor(dictionary=True)
+        try:
+            cur.execute(f"""
+                SELECT {columns}
+                FROM ({' UNION ALL '.join(branches)}) matches
+                JOIN customers c ON c.id = matches.id
+                GROUP BY c.id
+                ORDER BY MIN(matches.match_rank), c.first_name, c.last_name, c.id
+                LIMIT %s
+            """, params + [limit])
+            return cur.fetchall()
+        finally:
+            cur.close()
+            conn.close()
+
+    @staticmethod
+    def resolve_login(identifier):
+        """
+        The customer a login / password-reset identifier refers to: an email, or a full name
+        typed in either order. Returns id, names, email and password hash, or None.
+        """
+        matches = Customer.lookup(identifier, prefix=False, limit=1,
+                                  columns="c.id, c.first_name, c.last_name, c.email, c.password")
+        return matches[0] if matches else None
+
+    @staticmethod
+    def _search_filter(search, use_fulltext=True):
+        return search_clause(search, use_fulltext=use_fulltext and schema.has_index('customers', 'ft_customers_search'))
+
+    @staticmethod
+    def _resolve_search(search):
+        """
+        (where, params, total) for `search`. The FULLTEXT filter only matches word prefixes,
+        so when it finds nobody the substring-only filter is used instead and infix searches
+        ("ohn", the middle of an email) still find their customers.
+        """
+        where, params = Customer._search_filter(search)
+        total = Customer._count_matching(where, params)
+        if not total:
+            plain_where, plain_params = Customer._search_filter(search, use_fulltext=False)
+            if plain_where != where:
+                where, params = plain_where, plain_params
+                total = Customer._count_matching(where, params)
+        return where, params, total
+
+    @staticmethod
+    def count_active(search=None):
+        """Active customers matching `search`, cached for CUSTOMER_COUNT_CACHE_TTL seconds"""
+        return Customer._resolve_search(search)[2]
+
+    @staticmethod
+    def _count_matching(where, params):
+        def load():
+            conn = get_db()
+            cur = conn.cursor()
+            try:
+                cur.execute(f"SELECT COUNT(*) FROM customers WHERE deleted_at IS NULL{where}", params)
+                return cur.fetchone()[0]
+            finally:
+                cur.close()
+                conn.close()
+
+        return customer_count_cache.get_or_load(f"count:{where}:{params!r}", load)
+
+    @staticmethod
+    def get_page(search=None, page=1, per_page=10):
+        """
+        Newest-first page of active customers matching `search` and the total match count.
+        Only the requested page is read (LIMIT/OFFSET on the created_at index).
+        """
+        where, params, total = Customer._resolve_search(search)
+        conn = get_db()
+        cur = conn.cursor(dictionary=True)
+        try:
+            cur.execute(f"""
+                SELECT id, first_name, last_name, email, phone, address, created_at
+                FROM customers
+                WHERE deleted_at IS NULL{where}
+                ORDER BY created_at DESC, id DESC
+                LIMIT %s OFFSET %s
+            """, params + [per_page, (page - 1) * per_page])
+            return cur.fetchall(), total
+        finally:
+            cur.close()
+            conn.close()
+
     @staticmethod
     def soft_delete(customer_id):
         """Soft delete a customer by setting deleted_at timestamp"""
@@ -1947,6 +2564,7 @@ class Customer(Base):
                 (now, customer_id)
             )
             conn.commit()
+            customer_count_cache.invalidate()
             return cur.rowcount > 0
         except mysql.connector.Error as err:
             current_app.logger.error(f"Customer soft delete failed: {str(err)}")
@@ -1967,6 +2585,7 @@ class Customer(Base):
                 (customer_id,)
             )
             conn.commit()
+            customer_count_cache.invalidate()
             return cur.rowcount > 0
         except mysql.connector.Error as err:
             current_app.logger.error(f"Customer restore failed: {str(err)}")
@@ -2133,6 +2752,7 @@ class Customer(Base):
             updated_customers = cur.rowcount
 
             conn.commit()
+            customer_count_cache.invalidate()
 
             if updated_customers == 0:
                 raise ValueError("Customer not found or already deleted")
@@ -2175,26 +2795,35 @@ class Customer(Base):
             GROUP BY o.id
             ORDER BY o.order_date DESC
         """
-        cur.execute(query, params)
-        orders = cur.fetchall()
+        try:
+            cur.execute(query, params)
+            orders = cur.fetchall()
+            if not orders:
+                return orders
 
-        for order in orders:
-            if isinstance(order['order_date'], (datetime,)):
-                order['order_date'] = order['order_date'].strftime('%Y-%m-%d')
-            cur.execute("""
-                SELECT oi.product_id, p.name as product_name, oi.quantity, oi.price
+            # Items for every order in one query, grouped per order below
+            order_ids = [order['id'] for order in orders]
+            cur.execute(f"""
+                SELECT oi.order_id, oi.product_id, p.name as product_name, oi.quantity, oi.price
                 FROM order_items oi
                 JOIN products p ON oi.product_id = p.id
-                WHERE oi.order_id = %s
-            """, (order['id'],))
-            items = cur.fetchall()
-            current_app.logger.info(f"DEBUG: Raw SQL result for order {order['id']} items: {items}")
-            current_app.logger.info(f"DEBUG: Type of items for order {order['id']}: {type(items)}")
-            order['items'] = items
-
-        cur.close()
-        conn.close()
-        return orders
+                WHERE oi.order_id IN ({','.join(['%s'] * len(order_ids))})
+                ORDER BY oi.order_id, oi.id
+            """, order_ids)
+            items_by_order = {order_id: [] for order_id in order_ids}
+            for item in cur.fetchall():
+                items_by_order[item.pop('order_id')].append(item)
+
+            for order in orders:
+                if isinstance(order['order_date'], (datetime,)):
+                    order['order_date'] = order['order_date'].strftime('%Y-%m-%d')
+                order['items'] = items_by_order[order['id']]
+                if current_app.debug:
+                    current_app.logger.debug(f"Customer {customer_id} order {order['id']} items: {order['items']}")
+            return orders
+        finally:
+            cur.close()
+            conn.close()
 
     @staticmethod
     def get_new_customers_this_month():
@@ -2471,54 +3100,54 @@ class Category:
             conn.close()
 
     @staticmethod
-    def get_all():
-        conn = get_db()
-        cur = conn.cursor(dictionary=True)
-        try:
-            cur.execute("SELECT id, name, description FROM categories ORDER BY name")
-            categories = cur.fetchall()
-            return categories
-        finally:
-            cur.close()
-            conn.close()
+    def tree():
+        """Cached CategoryTree, rebuilt after Category.create/update/delete"""
+        return category_cache.get_or_load('tree', Category._load_tree)
 
     @staticmethod
-    def get_all_hierarchical():
-        """Get all categories in hierarchical structure"""
+    def _load_tree():
         conn = get_db()
         cur = conn.cursor(dictionary=True)
         try:
             cur.execute("""
                 SELECT id, name, description, parent_id, sort_order, is_active
-                FROM categories 
-                WHERE is_active = TRUE OR is_active IS NULL
-                ORDER BY sort_order, name
+                FROM categories
             """)
-            categories = cur.fetchall()
-            
-            # Build hierarchy
-            category_dict = {}
-            root_categories = []
-            
-            # Create category objects
-            for cat_data in categories:
-                category_dict[cat_data['id']] = cat_data
-                cat_data['children'] = []
-            
-            # Build parent-child relationships
-            for category in categories:
-                if category['parent_id'] is None:
-                    root_categories.append(category)
-                else:
-                    parent = category_dict.get(category['parent_id'])
-                    if parent:
-                        parent['children'].append(category)
-            
-            return root_categories
+            return CategoryTree(cur.fetchall())
         finally:
             cur.close()
             conn.close()
 
+    @staticmethod
+    def invalidate_cache():
+        category_cache.invalidate()
+        # Product listings and the search index carry category names
+        invalidate_catalog_cache()
+        product_search_index.built_at = None
+
+    @staticmethod
+    def get_all():
+        return Category.tree().all_by_name()
+
+    @staticmethod
+    def get_by_id(category_id):
+        return Category.tree().get(category_id)
+
+    @staticmethod
+    def get_descendants(category_id):
+        """All active subcategories of a category (nested levels included, each with a 'level')"""
+        return Category.tree().descendants(category_id)
+
+    @staticmethod
+    def get_descendant_ids(category_id):
+        """The category id followed by the ids of all its active subcategories"""
+        return Category.tree().descendant_ids(category_id)
+
+    @staticmethod
+    def get_all_hierarchical():
+        """Get all categories in hierarchical structure"""
+        return Category.tree().hierarchical()
+
     @staticmethod
     def create(name, description=None, parent_id=None):
         conn = get_db()
@@ -2529,6 +3158,7 @@ class Category:
                 (name, description, parent_id)
             )
             conn.commit()
+            Category.invalidate_cache()
             return cur.lastrowid
         except Exception as e:
             conn.rollback()
@@ -2553,6 +3183,7 @@ class Category:
             if cur.rowcount == 0:
                 raise ValueError("Category not found")
             conn.commit()
+            Category.invalidate_cache()
         except Exception as e:
             conn.rollback()
             raise ValueError(f"Category deletion failed: {str(e)}")
@@ -2586,6 +3217,7 @@ class Category:
             if cur.rowcount == 0:
                 raise ValueError("Category not found")
             conn.commit()
+            Category.invalidate_cache()
         except Exception as e:
             conn.rollback()
             raise ValueError(f"Category update failed: {str(e)}")
@@ -3966,6 +4598,37 @@ class PreOrder:
                 conn.close()
 
 
+class VolumeDiscount:
+    @staticmethod
+    def rules_index():
+        """Cached VolumeDiscountIndex of the active rules"""
+        return volume_discount_cache.get_or_load('rules', VolumeDiscount._load_index)
+
+    @staticmethod
+    def _load_index():
+        conn = get_db()
+        cur = conn.cursor(dictionary=True)
+        try:
+            cur.execute("""
+                SELECT id, name, minimum_amount, discount_percentage
+                FROM volume_discount_rules
+                WHERE is_active = TRUE
+            """)
+            return VolumeDiscountIndex(cur.fetchall())
+        finally:
+            cur.close()
+            conn.close()
+
+    @staticmethod
+    def invalidate():
+        volume_discount_cache.invalidate()
+
+    @staticmethod
+    def quote(subtotal):
+        """Best volume discount for a subtotal; see utils.volume_discounts.quote_volume_discount"""
+        return quote_volume_discount(subtotal, VolumeDiscount.rules_index())
+
+
 class PartialCancellation:
     @staticmethod
     def cancel_order_item(order_id, item_id, cancel_quantity, reason, staff_id, notes='', notify_customer=True):
@@ -3976,7 +4639,7 @@ class PartialCancellation:
         try:
             # Get order item details
             cur.execute("""
-                SELECT oi.*, p.name as product_name, p.stock, o.customer_id
+                SELECT oi.*, p.name as product_name, p.stock, o.customer_id, o.order_date
                 FROM order_items oi
                 JOIN products p ON oi.product_id = p.id
                 JOIN orders o ON oi.order_id = o.id
@@ -3996,17 +4659,21 @@ class PartialCancellation:
             refund_amount = float(item['price']) * cancel_quantity
 
             # Restore inventory - add cancelled quantity back to stock
-            cur.execute("""
-                UPDATE products
-                SET stock = stock + %s
-                WHERE id = %s
-            """, (cancel_quantity, item['product_id']))
+            # (units still held by a stock reservation were never taken from stock)
+            released = stock_reservations.release(cur, order_id, {item['product_id']: cancel_quantity})
+            restore = restore_quantity(released, item['product_id'], cancel_quantity)
+            if restore:
+                cur.execute("""
+                    UPDATE products
+                    SET stock = stock + %s
+                    WHERE id = %s
+                """, (restore, item['product_id']))
 
-            # Log inventory change
-            cur.execute("""
-                INSERT INTO inventory (product_id, changes, change_date)
-                VALUES (%s, %s, NOW())
-            """, (item['product_id'], cancel_quantity))
+                # Log inventory change
+                cur.execute("""
+                    INSERT INTO inventory (product_id, changes, change_date)
+                    VALUES (%s, %s, NOW())
+                """, (item['product_id'], restore))
 
             # Update order item quantity or remove if fully cancelled
             if cancel_quantity == item['quantity']:
@@ -4062,6 +4729,9 @@ class PartialCancellation:
                 current_app.logger.info(f"Order {order_id} completely removed - all items were cancelled")
 
             conn.commit()
+            invalidate_catalog_cache()
+            # The order may be gone now, so refresh its day rather than looking it up again
+            sales_rollup.refresh_days([item['order_date']])
 
             current_app.logger.info(f"Cancelled {cancel_quantity} units of {item['product_name']} from order {order_id}. Refund: ${refund_amount:.2f}")
 
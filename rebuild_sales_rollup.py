@@ -0,0 +1,47 @@
+#!/usr/bin/env python3
+"""
+Rebuild the sales_daily rollup from the orders tables
+Use after a bulk import or manual data fix, or if a refresh failed (the app logs a warning).
+
+Usage: python rebuild_sales_rollup.py [--from YYYY-MM-DD] [--to YYYY-MM-DD]
+Without a range the whole order history is rebuilt.
+"""
+
+import argparse
+import time
+
+import mysql.connector
+
+from config import Config
+from utils.sales_rollup import SalesRollup
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Rebuild the sales_daily rollup tables")
+    parser.add_argument('--from', dest='start', help="first day to rebuild (YYYY-MM-DD)")
+    parser.add_argument('--to', dest='end', help="last day to rebuild (YYYY-MM-DD)")
+    args = parser.parse_args()
+
+    conn = mysql.connector.connect(
+        host=Config.MYSQL_HOST,
+        user=Config.MYSQL_USER,
+        password=Config.MYSQL_PASSWORD,
+        database=Config.MYSQL_DB,
+        port=Config.MYSQL_PORT
+    )
+    try:
+        print("🔗 Connected to database")
+        rollup = SalesRollup(connect=lambda: conn, is_enabled=lambda: True)
+        started = time.perf_counter()
+        start, end = rollup.rebuild(conn, args.start, args.end,
+                                    progress=lambda s, e: print(f"   ✅ {s} - {e}"))
+        if start is None:
+            print("⚠️ No orders found - nothing to rebuild")
+        else:
+            print(f"🎉 Rebuilt {start} to {end} in {time.perf_counter() - started:.1f}s")
+    finally:
+        conn.close()
+
+
+if __name__ == '__main__':
+    main()
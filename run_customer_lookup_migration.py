@@ -0,0 +1,177 @@
+#!/usr/bin/env python3
+"""
+Migration script to add the customer lookup keys and order counter
+Login and the staff customer quick search resolve customers through indexed email/name/phone keys,
+and order counts come from customers.order_count (kept up to date by triggers on orders)
+"""
+
+import mysql.connector
+from config import Config
+
+KEY_COLUMNS = {
+    'email_key': "ADD COLUMN email_key VARCHAR(255) AS (LOWER(TRIM(email))) STORED",
+    'name_key': "ADD COLUMN name_key VARCHAR(511) AS (LOWER(TRIM(CONCAT(TRIM(COALESCE(first_name, '')), ' ', TRIM(COALESCE(last_name, '')))))) STORED",
+    'name_rev_key': "ADD COLUMN name_rev_key VARCHAR(511) AS (LOWER(TRIM(CONCAT(TRIM(COALESCE(last_name, '')), ' ', TRIM(COALESCE(first_name, '')))))) STORED",
+    'phone_key': "ADD COLUMN phone_key VARCHAR(32) AS (NULLIF(REGEXP_REPLACE(COALESCE(phone, ''), '[^0-9]', ''), '')) STORED",
+    'order_count': "ADD COLUMN order_count INT NOT NULL DEFAULT 0",
+}
+
+INDEXES = {
+    'idx_customers_name_key': "CREATE INDEX idx_customers_name_key ON customers(name_key)",
+    'idx_customers_name_rev_key': "CREATE INDEX idx_customers_name_rev_key ON customers(name_rev_key)",
+    'idx_customers_phone_key': "CREATE INDEX idx_customers_phone_key ON customers(phone_key)",
+}
+
+TRIGGERS = {
+    'customers_order_count_insert': """
+        CREATE TRIGGER customers_order_count_insert
+        AFTER INSERT ON orders
+        FOR EACH ROW
+        BEGIN
+            UPDATE customers SET order_count = order_count + 1 WHERE id = NEW.customer_id;
+        END
+    """,
+    'customers_order_count_delete': """
+        CREATE TRIGGER customers_order_count_delete
+        AFTER DELETE ON orders
+        FOR EACH ROW
+        BEGIN
+            UPDATE customers SET order_count = GREATEST(order_count - 1, 0) WHERE id = OLD.customer_id;
+        END
+    """,
+    'customers_order_count_update': """
+        CREATE TRIGGER customers_order_count_update
+        AFTER UPDATE ON orders
+        FOR EACH ROW
+        BEGIN
+            IF NOT (NEW.customer_id <=> OLD.customer_id) THEN
+                UPDATE customers SET order_count = GREATEST(order_count - 1, 0) WHERE id = OLD.customer_id;
+                UPDATE customers SET order_count = order_count + 1 WHERE id = NEW.customer_id;
+            END IF;
+        END
+    """,
+}
+
+def index_exists(cur, index_name):
+    cur.execute("""
+        SELECT INDEX_NAME
+        FROM INFORMATION_SCHEMA.STATISTICS
+        WHERE TABLE_SCHEMA = %s
+        AND TABLE_NAME = 'customers'
+        AND INDEX_NAME = %s
+    """, (Config.MYSQL_DB, index_name))
+    return cur.fetchone() is not None
+
+def run_migration():
+    """Apply scripts/add_customer_lookup_keys.sql step by step, skipping what already exists"""
+
+    # Database connection
+    try:
+        conn = mysql.connector.connect(
+            host=Config.MYSQL_HOST,
+            user=Config.MYSQL_USER,
+            password=Config.MYSQL_PASSWORD,
+            database=Config.MYSQL_DB,
+            port=Config.MYSQL_PORT
+        )
+        cur = conn.cursor()
+
+        print("🔗 Connected to database")
+
+        cur.execute("""
+            SELECT COLUMN_NAME
+            FROM INFORMATION_SCHEMA.COLUMNS
+            WHERE TABLE_SCHEMA = %s
+            AND TABLE_NAME = 'customers'
+        """, (Config.MYSQL_DB,))
+        existing_columns = {row[0].lower() for row in cur.fetchall()}
+
+        missing = [definition for column, definition in KEY_COLUMNS.items() if column not in existing_columns]
+        if missing:
+            print(f"📝 Adding {len(missing)} lookup column(s) to customers...")
+            cur.execute(f"ALTER TABLE customers {', '.join(missing)}")
+            conn.commit()
+            print("✅ Lookup columns added")
+        else:
+            print("⚠️  Lookup columns already exist - skipping")
+
+        # Email key: unique unless existing customers differ only by case/whitespace
+        if not index_exists(cur, 'uq_customers_email_key') and not index_exists(cur, 'idx_customers_email_key'):
+            cur.execute("""
+                SELECT email_key, COUNT(*)
+                FROM customers
+                WHERE email_key IS NOT NULL
+                GROUP BY email_key
+                HAVING COUNT(*) > 1
+            """)
+            duplicates = cur.fetchall()
+            if duplicates:
+                print(f"⚠️  {len(duplicates)} email(s) are shared by several customers - creating a non-unique index:")
+                for email, count in duplicates[:20]:
+                    print(f"   {email}: {count} customers")
+                cur.execute("CREATE INDEX idx_customers_email_key ON customers(email_key)")
+            else:
+                print("📝 Creating uq_customers_email_key...")
+                cur.execute("CREATE UNIQUE INDEX uq_customers_email_key ON customers(email_key)")
+            conn.commit()
+            print("✅ Email key index created")
+
+        for index_name, create_sql in INDEXES.items():
+            if index_exists(cur, index_name):
+                print(f"⚠️  {index_name} already exists - skipping")
+                continue
+            print(f"📝 Creating {index_name}...")
+            cur.execute(create_sql)
+            conn.commit()
+            print(f"✅ {index_name} created")
+
+        for trigger_name, create_sql in TRIGGERS.items():
+            cur.execute("""
+                SELECT TRIGGER_NAME
+                FROM INFORMATION_SCHEMA.TRIGGERS
+                WHERE TRIGGER_SCHEMA = %s
+                AND TRIGGER_NAME = %s
+            """, (Config.MYSQL_DB, trigger_name))
+            if cur.fetchone():
+                print(f"⚠️  {trigger_name} already exists - skipping")
+                continue
+            print(f"📝 Creating trigger {trigger_name}...")
+            cur.execute(create_sql)
+            conn.commit()
+            print(f"✅ {trigger_name} created")
+
+        # Backfill after the triggers exist so orders placed meanwhile are not missed
+        print("📝 Counting existing orders per customer...")
+        cur.execute("""
+            UPDATE customers c
+            SET order_count = (SELECT COUNT(*) FROM orders o WHERE o.customer_id = c.id)
+        """)
+        conn.commit()
+        print(f"✅ order_count set for {cur.rowcount} customer(s) that changed")
+
+        # Verify the migration
+        cur.execute("""
+            SELECT COUNT(*), COUNT(phone_key), COALESCE(SUM(order_count), 0)
+            FROM customers
+        """)
+        customers, with_phone, counted_orders = cur.fetchone()
+        cur.execute("SELECT COUNT(*) FROM orders WHERE customer_id IS NOT NULL")
+        orders = cur.fetchone()[0]
+        print(f"📊 Migration verification:")
+        print(f"   Customers: {customers} ({with_phone} with a phone key)")
+        print(f"   Orders counted: {counted_orders} of {orders}")
+
+        print("🎉 Migration completed successfully!")
+        print("ℹ️  Restart the app so login and customer search use the lookup keys")
+
+    except Exception as e:
+        print(f"💥 Migration failed: {e}")
+        raise
+    finally:
+        if 'cur' in locals():
+            cur.close()
+        if 'conn' in locals():
+            conn.close()
+
+if __name__ == "__main__":
+    run_migration()
@@ -0,0 +1,73 @@
+#!/usr/bin/env python3
+"""
+Migration script to add the staff customer list indexes
+Lets the customer list read one page in index order and search through a FULLTEXT index instead of scanning every customer
+"""
+
+import mysql.connector
+from config import Config
+
+INDEXES = {
+    'idx_customers_created_at_id': "CREATE INDEX idx_customers_created_at_id ON customers(created_at, id)",
+    'ft_customers_search': "CREATE FULLTEXT INDEX ft_customers_search ON customers(first_name, last_name, email, phone)",
+}
+
+def run_migration():
+    """Create the indexes from scripts/add_customer_search_indexes.sql that are missing"""
+
+    # Database connection
+    try:
+        conn = mysql.connector.connect(
+            host=Config.MYSQL_HOST,
+            user=Config.MYSQL_USER,
+            password=Config.MYSQL_PASSWORD,
+            database=Config.MYSQL_DB,
+            port=Config.MYSQL_PORT
+        )
+        cur = conn.cursor()
+
+        print("🔗 Connected to database")
+
+        for index_name, create_sql in INDEXES.items():
+            cur.execute("""
+                SELECT INDEX_NAME
+                FROM INFORMATION_SCHEMA.STATISTICS
+                WHERE TABLE_SCHEMA = %s
+                AND TABLE_NAME = 'customers'
+                AND INDEX_NAME = %s
+            """, (Config.MYSQL_DB, index_name))
+
+            if cur.fetchone():
+                print(f"⚠️  {index_name} already exists - skipping")
+                continue
+
+            print(f"📝 Creating {index_name}...")
+            cur.execute(create_sql)
+            conn.commit()
+            print(f"✅ {index_name} created")
+
+        # Verify the migration
+        cur.execute("""
+            EXPLAIN SELECT id FROM customers
+            ORDER BY created_at DESC, id DESC
+            LIMIT 10
+        """)
+        plan = cur.fetchall()
+        print(f"📊 Migration verification:")
+        for row in plan:
+            print(f"   {row}")
+
+        print("🎉 Migration completed successfully!")
+        print("ℹ️  Restart the app so customer search picks up the FULLTEXT index")
+
+    except Exception as e:
+        print(f"💥 Migration failed: {e}")
+        raise
+    finally:
+        if 'cur' in locals():
+            cur.close()
+        if 'conn' in locals():
+            conn.close()
+
+if __name__ == "__main__":
+    run_migration()
@@ -0,0 +1,69 @@
+#!/usr/bin/env python3
+"""
+Migration script to create the idempotency_keys table
+Pending QR orders hold their stock here instead of decrementing products.stock at checkout
+"""
+
+import os
+import mysql.connector
+from config import Config
+
+def run_migration():
+    """Create idempotency_keys from scripts/create_idempotency_keys_table.sql"""
+
+    # Database connection
+    try:
+        conn = mysql.connector.connect(
+            host=Config.MYSQL_HOST,
+            user=Config.MYSQL_USER,
+            password=Config.MYSQL_PASSWORD,
+            database=Config.MYSQL_DB,
+            port=Config.MYSQL_PORT
+        )
+        cur = conn.cursor()
+
+        print("🔗 Connected to database")
+
+        cur.execute("""
+            SELECT TABLE_NAME
+            FROM INFORMATION_SCHEMA.TABLES
+            WHERE TABLE_SCHEMA = %s
+            AND TABLE_NAME = 'idempotency_keys'
+        """, (Config.MYSQL_DB,))
+
+        if cur.fetchone():
+            print("⚠️  idempotency_keys table already exists - nothing to do")
+        else:
+            sql_path = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'scripts', 'create_idempotency_keys_table.sql')
+            with open(sql_path) as f:
+                create_sql = '\n'.join(line for line in f if not line.strip().startswith('--'))
+
+            print("📝 Creating idempotency_keys table...")
+            cur.execute(create_sql)
+            conn.commit()
+            print("✅ idempotency_keys table created")
+
+        # Verify the migration
+        cur.execute("""
+            SELECT COUNT(*), COALESCE(SUM(state = 'in_progress'), 0)
+            FROM idempotency_keys
+        """)
+        total, in_progress = cur.fetchone()
+        print(f"📊 Migration verification:")
+        print(f"   Stored keys: {total}")
+        print(f"   In progress: {in_progress}")
+
+        print("🎉 Migration completed successfully!")
+        print("ℹ️  Restart the app so idempotency keys are shared between workers")
+
+    except Exception as e:
+        print(f"💥 Migration failed: {e}")
+        raise
+    finally:
+        if 'cur' in locals():
+            cur.close()
+        if 'conn' in locals():
+            conn.close()
+
+if __name__ == "__main__":
+    run_migration()
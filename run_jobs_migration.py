@@ -0,0 +1,69 @@
+#!/usr/bin/env python3
+"""
+Migration script to create the jobs table
+Background staff export jobs are tracked here so every worker can report their progress
+"""
+
+import os
+import mysql.connector
+from config import Config
+
+def run_migration():
+    """Create the jobs table from scripts/create_jobs_table.sql"""
+
+    # Database connection
+    try:
+        conn = mysql.connector.connect(
+            host=Config.MYSQL_HOST,
+            user=Config.MYSQL_USER,
+            password=Config.MYSQL_PASSWORD,
+            database=Config.MYSQL_DB,
+            port=Config.MYSQL_PORT
+        )
+        cur = conn.cursor()
+
+        print("🔗 Connected to database")
+
+        cur.execute("""
+            SELECT TABLE_NAME
+            FROM INFORMATION_SCHEMA.TABLES
+            WHERE TABLE_SCHEMA = %s
+            AND TABLE_NAME = 'jobs'
+        """, (Config.MYSQL_DB,))
+
+        if cur.fetchone():
+            print("⚠️  jobs table already exists - nothing to do")
+        else:
+            sql_path = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'scripts', 'create_jobs_table.sql')
+            with open(sql_path) as f:
+                create_sql = '\n'.join(line for line in f if not line.strip().startswith('--'))
+
+            print("📝 Creating jobs table...")
+            cur.execute(create_sql)
+            conn.commit()
+            print("✅ jobs table created")
+
+        # Verify the migration
+        cur.execute("""
+            SELECT COUNT(*), COALESCE(SUM(status IN ('queued', 'running')), 0)
+            FROM jobs
+        """)
+        total, active = cur.fetchone()
+        print(f"📊 Migration verification:")
+        print(f"   Stored jobs: {total}")
+        print(f"   Queued/running: {active}")
+
+        print("🎉 Migration completed successfully!")
+        print("ℹ️  Restart the app so export job status is shared between workers")
+
+    except Exception as e:
+        print(f"💥 Migration failed: {e}")
+        raise
+    finally:
+        if 'cur' in locals():
+            cur.close()
+        if 'conn' in locals():
+            conn.close()
+
+if __name__ == "__main__":
+    run_migration()
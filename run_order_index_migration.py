@@ -0,0 +1,72 @@
+#!/usr/bin/env python3
+"""
+Migration script to add the staff order list indexes
+Lets keyset pagination and status/date filters read orders in index order instead of sorting the table
+"""
+
+import mysql.connector
+from config import Config
+
+INDEXES = {
+    'idx_orders_order_date_id': "CREATE INDEX idx_orders_order_date_id ON orders(order_date, id)",
+    'idx_orders_status_order_date_id': "CREATE INDEX idx_orders_status_order_date_id ON orders(status, order_date, id)",
+}
+
+def run_migration():
+    """Create the indexes from scripts/add_order_listing_indexes.sql that are missing"""
+
+    # Database connection
+    try:
+        conn = mysql.connector.connect(
+            host=Config.MYSQL_HOST,
+            user=Config.MYSQL_USER,
+            password=Config.MYSQL_PASSWORD,
+            database=Config.MYSQL_DB,
+            port=Config.MYSQL_PORT
+        )
+        cur = conn.cursor()
+
+        print("🔗 Connected to database")
+
+        for index_name, create_sql in INDEXES.items():
+            cur.execute("""
+                SELECT INDEX_NAME
+                FROM INFORMATION_SCHEMA.STATISTICS
+                WHERE TABLE_SCHEMA = %s
+                AND TABLE_NAME = 'orders'
+                AND INDEX_NAME = %s
+            """, (Config.MYSQL_DB, index_name))
+
+            if cur.fetchone():
+                print(f"⚠️  {index_name} already exists - skipping")
+                continue
+
+            print(f"📝 Creating {index_name}...")
+            cur.execute(create_sql)
+            conn.commit()
+            print(f"✅ {index_name} created")
+
+        # Verify the migration
+        cur.execute("""
+            EXPLAIN SELECT id FROM orders
+            ORDER BY order_date DESC, id DESC
+            LIMIT 10
+        """)
+        plan = cur.fetchall()
+        print(f"📊 Migration verification:")
+        for row in plan:
+            print(f"   {row}")
+
+        print("🎉 Migration completed successfully!")
+
+    except Exception as e:
+        print(f"💥 Migration failed: {e}")
+        raise
+    finally:
+        if 'cur' in locals():
+            cur.close()
+        if 'conn' in locals():
+            conn.close()
+
+if __name__ == "__main__":
+    run_migration()
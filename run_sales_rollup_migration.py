@@ -0,0 +1,67 @@
+#!/usr/bin/env python3
+"""
+Migration script to create the sales_daily rollup tables
+Creates the tables and backfills them from the existing completed orders
+"""
+
+import os
+import mysql.connector
+from config import Config
+from utils.sales_rollup import SalesRollup
+
+def run_migration():
+    """Create sales_daily / sales_daily_totals from scripts/create_sales_daily_tables.sql and backfill them"""
+
+    # Database connection
+    try:
+        conn = mysql.connector.connect(
+            host=Config.MYSQL_HOST,
+            user=Config.MYSQL_USER,
+            password=Config.MYSQL_PASSWORD,
+            database=Config.MYSQL_DB,
+            port=Config.MYSQL_PORT
+        )
+        cur = conn.cursor()
+
+        print("🔗 Connected to database")
+
+        sql_path = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'scripts', 'create_sales_daily_tables.sql')
+        with open(sql_path) as f:
+            create_sql = '\n'.join(line for line in f if not line.strip().startswith('--'))
+
+        print("📝 Creating sales rollup tables...")
+        for statement in create_sql.split(';'):
+            if statement.strip():
+                cur.execute(statement)
+        conn.commit()
+        print("✅ sales_daily and sales_daily_totals tables ready")
+
+        print("📝 Backfilling from completed orders...")
+        rollup = SalesRollup(connect=lambda: conn, is_enabled=lambda: True)
+        start, end = rollup.rebuild(conn, progress=lambda s, e: print(f"   {s} - {e}"))
+
+        # Verify the migration
+        cur.execute("SELECT COUNT(*), COALESCE(SUM(revenue), 0) FROM sales_daily")
+        rows, revenue = cur.fetchone()
+        cur.execute("SELECT COALESCE(SUM(order_count), 0) FROM sales_daily_totals")
+        orders = cur.fetchone()[0]
+        print(f"📊 Migration verification:")
+        print(f"   Range: {start} to {end}")
+        print(f"   Rollup rows: {rows}")
+        print(f"   Completed orders: {orders}")
+        print(f"   Revenue: ${float(revenue):,.2f}")
+
+        print("🎉 Migration completed successfully!")
+        print("ℹ️  Restart the app so the reports start reading the rollup")
+
+    except Exception as e:
+        print(f"💥 Migration failed: {e}")
+        raise
+    finally:
+        if 'cur' in locals():
+            cur.close()
+        if 'conn' in locals():
+            conn.close()
+
+if __name__ == "__main__":
+    run_migration()
@@ -0,0 +1,107 @@
+#!/usr/bin/env python3
+"""
+Migration script to add a persisted, unique slug column to products
+Backfills slugs for existing products so Product.get_by_slug is a single indexed query
+"""
+
+import mysql.connector
+from config import Config
+from models import generate_slug
+
+def run_migration():
+    """Add products.slug, backfill it and create the unique index"""
+
+    # Database connection
+    try:
+        conn = mysql.connector.connect(
+            host=Config.MYSQL_HOST,
+            user=Config.MYSQL_USER,
+            password=Config.MYSQL_PASSWORD,
+            database=Config.MYSQL_DB,
+            port=Config.MYSQL_PORT
+        )
+        cur = conn.cursor()
+
+        print("🔗 Connected to database")
+
+        # Add the column if it does not exist yet
+        cur.execute("""
+            SELECT COLUMN_NAME
+            FROM INFORMATION_SCHEMA.COLUMNS
+            WHERE TABLE_SCHEMA = %s
+            AND TABLE_NAME = 'products'
+            AND COLUMN_NAME = 'slug'
+        """, (Config.MYSQL_DB,))
+
+        if cur.fetchone():
+            print("⚠️  slug column already exists in products table - backfilling missing slugs only")
+        else:
+            print("📝 Adding slug column...")
+            cur.execute("ALTER TABLE products ADD COLUMN slug VARCHAR(255) NULL AFTER name")
+            conn.commit()
+            print("✅ slug column added")
+
+        # Backfill. Active products are processed first (oldest first) so they keep the plain slug
+        # that the old name-matching lookup resolved to; later duplicates get -2, -3, ...
+        cur.execute("""
+            SELECT id, name, slug
+            FROM products
+            ORDER BY (archived IS NOT NULL AND archived = TRUE) ASC, id ASC
+        """)
+        products = cur.fetchall()
+
+        taken = {slug for _, _, slug in products if slug}
+        updates = []
+        for product_id, name, slug in products:
+            if slug:
+                continue
+            base = generate_slug(name) or 'product'
+            candidate = base
+            suffix = 2
+            while candidate in taken:
+                candidate = f"{base}-{suffix}"
+                suffix += 1
+            taken.add(candidate)
+            updates.append((candidate, product_id))
+
+        if updates:
+            print(f"📝 Backfilling slugs for {len(updates)} products...")
+            cur.executemany("UPDATE products SET slug = %s WHERE id = %s", updates)
+            conn.commit()
+            print("✅ Slugs backfilled")
+        else:
+            print("✅ All products already have slugs")
+
+        # Unique index for the lookup
+        try:
+            print("📝 Creating unique index on products.slug...")
+            cur.execute("CREATE UNIQUE INDEX idx_products_slug ON products(slug)")
+            conn.commit()
+            print("✅ Index created")
+        except mysql.connector.Error as e:
+            if "Duplicate key name" in str(e) or "already exists" in str(e):
+                print("⚠️  Index step skipped - idx_products_slug already exists")
+            else:
+                raise
+
+        # Verify the migration
+        cur.execute("SELECT COUNT(*), COUNT(slug), COUNT(DISTINCT slug) FROM products")
+        total, with_slug, distinct_slugs = cur.fetchone()
+        print(f"📊 Migration verification:")
+        print(f"   Total products: {total}")
+        print(f"   Products with slug: {with_slug}")
+        print(f"   Distinct slugs: {distinct_slugs}")
+
+        print("🎉 Migration completed successfully!")
+
+    except Exception as e:
+        print(f"💥 Migration failed: {e}")
+        raise
+    finally:
+        if 'cur' in locals():
+            cur.close()
+        if 'conn' in locals():
+            conn.close()
+
+if __name__ == "__main__":
+    run_migration()
@@ -0,0 +1,69 @@
+#!/usr/bin/env python3
+"""
+Migration script to create the stock_reservations table
+Pending QR orders hold their stock here instead of decrementing products.stock at checkout
+"""
+
+import os
+import mysql.connector
+from config import Config
+
+def run_migration():
+    """Create stock_reservations from scripts/create_stock_reservations_table.sql"""
+
+    # Database connection
+    try:
+        conn = mysql.connector.connect(
+            host=Config.MYSQL_HOST,
+            user=Config.MYSQL_USER,
+            password=Config.MYSQL_PASSWORD,
+            database=Config.MYSQL_DB,
+            port=Config.MYSQL_PORT
+        )
+        cur = conn.cursor()
+
+        print("🔗 Connected to database")
+
+        cur.execute("""
+            SELECT TABLE_NAME
+            FROM INFORMATION_SCHEMA.TABLES
+            WHERE TABLE_SCHEMA = %s
+            AND TABLE_NAME = 'stock_reservations'
+        """, (Config.MYSQL_DB,))
+
+        if cur.fetchone():
+            print("⚠️  stock_reservations table already exists - nothing to do")
+        else:
+            sql_path = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'scripts', 'create_stock_reservations_table.sql')
+            with open(sql_path) as f:
+                create_sql = '\n'.join(line for line in f if not line.strip().startswith('--'))
+
+            print("📝 Creating stock_reservations table...")
+            cur.execute(create_sql)
+            conn.commit()
+            print("✅ stock_reservations table created")
+
+        # Verify the migration
+        cur.execute("""
+            SELECT COUNT(*), COALESCE(SUM(status = 'active'), 0)
+            FROM stock_reservations
+        """)
+        total, active = cur.fetchone()
+        print(f"📊 Migration verification:")
+        print(f"   Reservations: {total}")
+        print(f"   Active holds: {active}")
+
+        print("🎉 Migration completed successfully!")
+        print("ℹ️  Restart the app so new QR checkouts start holding stock")
+
+    except Exception as e:
+        print(f"💥 Migration failed: {e}")
+        raise
+    finally:
+        if 'cur' in locals():
+            cur.close()
+        if 'conn' in locals():
+            conn.close()
+
+if __name__ == "__main__":
+    run_migration()
@@ -0,0 +1,52 @@
+-- Migration script to add the customer lookup keys and order counter
+-- Normalized, indexed keys let login and the staff quick search resolve a customer by email,
+-- phone or name (either order) with index lookups; generated columns keep them in sync.
+-- order_count is maintained by triggers on orders, replacing per-row COUNT(*) subqueries.
+-- Requires MySQL 8.0 (REGEXP_REPLACE in a generated column).
+
+ALTER TABLE customers
+    ADD COLUMN email_key VARCHAR(255)
+        AS (LOWER(TRIM(email))) STORED,
+    ADD COLUMN name_key VARCHAR(511)
+        AS (LOWER(TRIM(CONCAT(TRIM(COALESCE(first_name, '')), ' ', TRIM(COALESCE(last_name, '')))))) STORED,
+    ADD COLUMN name_rev_key VARCHAR(511)
+        AS (LOWER(TRIM(CONCAT(TRIM(COALESCE(last_name, '')), ' ', TRIM(COALESCE(first_name, '')))))) STORED,
+    ADD COLUMN phone_key VARCHAR(32)
+        AS (NULLIF(REGEXP_REPLACE(COALESCE(phone, ''), '[^0-9]', ''), '')) STORED,
+    ADD COLUMN order_count INT NOT NULL DEFAULT 0;
+
+-- Unique unless existing rows differ only by case/whitespace (run_customer_lookup_migration.py checks)
+CREATE UNIQUE INDEX uq_customers_email_key ON customers(email_key);
+CREATE INDEX idx_customers_name_key ON customers(name_key);
+CREATE INDEX idx_customers_name_rev_key ON customers(name_rev_key);
+CREATE INDEX idx_customers_phone_key ON customers(phone_key);
+
+DELIMITER //
+CREATE TRIGGER customers_order_count_insert
+AFTER INSERT ON orders
+FOR EACH ROW
+BEGIN
+    UPDATE customers SET order_count = order_count + 1 WHERE id = NEW.customer_id;
+END//
+
+CREATE TRIGGER customers_order_count_delete
+AFTER DELETE ON orders
+FOR EACH ROW
+BEGIN
+    UPDATE customers SET order_count = GREATEST(order_count - 1, 0) WHERE id = OLD.customer_id;
+END//
+
+CREATE TRIGGER customers_order_count_update
+AFTER UPDATE ON orders
+FOR EACH ROW
+BEGIN
+    IF NOT (NEW.customer_id <=> OLD.customer_id) THEN
+        UPDATE customers SET order_count = GREATEST(order_count - 1, 0) WHERE id = OLD.customer_id;
+        UPDATE customers SET order_count = order_count + 1 WHERE id = NEW.customer_id;
+    END IF;
+END//
+DELIMITER ;
+
+-- Backfill after the triggers exist so orders placed meanwhile are not missed
+UPDATE customers c
+SET order_count = (SELECT COUNT(*) FROM orders o WHERE o.customer_id = c.id);
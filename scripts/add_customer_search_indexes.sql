@@ -0,0 +1,5 @@
+-- Migration script to index the staff customer list
+-- The list pages newest first on (created_at, id); the search matches word prefixes through a FULLTEXT index
+
+CREATE INDEX idx_customers_created_at_id ON customers(created_at, id);
+CREATE FULLTEXT INDEX ft_customers_search ON customers(first_name, last_name, email, phone);
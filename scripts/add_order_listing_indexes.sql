@@ -0,0 +1,5 @@
+-- Migration script to index the staff order list
+-- Keyset pagination seeks on (order_date, id); status filters seek on (status, order_date, id)
+
+CREATE INDEX idx_orders_order_date_id ON orders(order_date, id);
+CREATE INDEX idx_orders_status_order_date_id ON orders(status, order_date, id);
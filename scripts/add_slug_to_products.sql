@@ -0,0 +1,9 @@
+-- Persisted URL slug for products so /products/<slug> is a single indexed lookup
+-- Run run_slug_migration.py instead to also backfill slugs for existing products
+
+ALTER TABLE products
+ADD COLUMN slug VARCHAR(255) NULL AFTER name;
+
+-- Backfill happens in run_slug_migration.py (slugs are generated in Python by models.generate_slug)
+
+CREATE UNIQUE INDEX idx_products_slug ON products(slug);
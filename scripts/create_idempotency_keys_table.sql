@@ -0,0 +1,17 @@
+-- Stored responses for /api/cart/checkout and /api/walk-in/process-sale, keyed by the
+-- client's Idempotency-Key header so double-clicks and retries replay instead of re-running
+-- state: in_progress (claimed by a running request) -> completed (response stored)
+
+CREATE TABLE IF NOT EXISTS idempotency_keys (
+    id BIGINT AUTO_INCREMENT PRIMARY KEY,
+    scope VARCHAR(100) NOT NULL,
+    idempotency_key VARCHAR(100) NOT NULL,
+    fingerprint CHAR(64) NOT NULL,
+    state ENUM('in_progress', 'completed') NOT NULL DEFAULT 'in_progress',
+    response_status SMALLINT NULL,
+    response_body MEDIUMTEXT NULL,
+    created_at DATETIME NOT NULL DEFAULT CURRENT_TIMESTAMP,
+    expires_at DATETIME NOT NULL,
+    UNIQUE KEY uq_idempotency_scope_key (scope, idempotency_key),
+    INDEX idx_idempotency_expires (expires_at)
+);
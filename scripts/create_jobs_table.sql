@@ -0,0 +1,22 @@
+-- Background staff export jobs (customer/order CSV and PDF), shared by every worker so a
+-- status poll can be answered by any of them; result files live in Config.EXPORT_JOB_DIR
+-- status: queued -> running -> completed | failed
+
+CREATE TABLE IF NOT EXISTS jobs (
+    id CHAR(32) PRIMARY KEY,
+    kind VARCHAR(50) NOT NULL,
+    owner_id INT NULL,
+    params TEXT NULL,
+    cache_key CHAR(64) NOT NULL,
+    status ENUM('queued', 'running', 'completed', 'failed') NOT NULL DEFAULT 'queued',
+    progress TINYINT UNSIGNED NOT NULL DEFAULT 0,
+    message VARCHAR(255) NULL,
+    error TEXT NULL,
+    file_name VARCHAR(255) NULL,
+    content_type VARCHAR(100) NULL,
+    created_at DATETIME NOT NULL DEFAULT CURRENT_TIMESTAMP,
+    updated_at DATETIME NOT NULL DEFAULT CURRENT_TIMESTAMP,
+    finished_at DATETIME NULL,
+    INDEX idx_jobs_owner_created (owner_id, created_at),
+    INDEX idx_jobs_status_updated (status, updated_at)
+);
@@ -0,0 +1,22 @@
+-- Pre-aggregated sales for the staff reports, rebuilt per day from completed orders
+-- sales_daily: one row per day x product x category (0 = product deleted since the sale)
+-- sales_daily_totals: completed order count and order total (after discounts) per day
+
+CREATE TABLE IF NOT EXISTS sales_daily (
+    sale_date DATE NOT NULL,
+    product_id INT NOT NULL,
+    category_id INT NOT NULL DEFAULT 0,
+    revenue DECIMAL(14,2) NOT NULL DEFAULT 0,
+    profit DECIMAL(14,2) NOT NULL DEFAULT 0,
+    units INT NOT NULL DEFAULT 0,
+    order_count INT NOT NULL DEFAULT 0,
+    PRIMARY KEY (sale_date, product_id, category_id),
+    INDEX idx_sales_daily_product (product_id, sale_date),
+    INDEX idx_sales_daily_category (category_id, sale_date)
+);
+
+CREATE TABLE IF NOT EXISTS sales_daily_totals (
+    sale_date DATE NOT NULL PRIMARY KEY,
+    order_count INT NOT NULL DEFAULT 0,
+    order_total DECIMAL(14,2) NOT NULL DEFAULT 0
+);
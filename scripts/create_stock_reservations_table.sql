@@ -0,0 +1,19 @@
+-- TTL stock holds for orders waiting for a QR payment
+-- status: active -> converted (payment confirmed) | released (order cancelled) | expired (TTL ran out)
+-- Available stock = products.stock - SUM(quantity) of active holds with expires_at > NOW()
+
+CREATE TABLE IF NOT EXISTS stock_reservations (
+    id INT AUTO_INCREMENT PRIMARY KEY,
+    order_id INT NOT NULL,
+    product_id INT NOT NULL,
+    quantity INT NOT NULL,
+    status ENUM('active', 'converted', 'released', 'expired') NOT NULL DEFAULT 'active',
+    expires_at DATETIME NOT NULL,
+    created_at DATETIME NOT NULL DEFAULT CURRENT_TIMESTAMP,
+    released_at DATETIME NULL,
+    INDEX idx_reservations_product_status (product_id, status, expires_at),
+    INDEX idx_reservations_order (order_id, status),
+    INDEX idx_reservations_status_expiry (status, expires_at),
+    FOREIGN KEY (order_id) REFERENCES orders(id) ON DELETE CASCADE,
+    FOREIGN KEY (product_id) REFERENCES products(id) ON DELETE CASCADE
+);
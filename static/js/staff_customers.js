@@ -107,32 +107,53 @@ function exportAllCustomers() {
     exportCustomersToCSV('all');
 }
 
+// Run an export as a background job: submit it, poll its progress, then fetch the finished file
+async function fetchExportJob(type, customerIds) {
+    const submitResponse = await fetch('/staff/exports/jobs', {
+        method: 'POST',
+        headers: {
+            'Content-Type': 'application/json'
+        },
+        body: JSON.stringify({ type: type, customer_ids: customerIds })
+    });
+    let result = await submitResponse.json();
+    if (!submitResponse.ok || !result.success) {
+        throw new Error(result.error || `HTTP error! status: ${submitResponse.status}`);
+    }
+
+    let lastProgress = -1;
+    while (result.job.status === 'queued' || result.job.status === 'running') {
+        if (result.job.progress !== lastProgress && result.job.status === 'running') {
+            lastProgress = result.job.progress;
+            showMessage(`Preparing export... ${lastProgress}%`, 'info');
+        }
+        await new Promise(resolve => setTimeout(resolve, 1000));
+        const statusResponse = await fetch(result.status_url);
+        result = await statusResponse.json();
+        if (!statusResponse.ok || !result.success) {
+            throw new Error(result.error || `HTTP error! status: ${statusResponse.status}`);
+        }
+    }
+
+    if (result.job.status !== 'completed') {
+        throw new Error(result.job.error || 'Export failed');
+    }
+
+    const fileResponse = await fetch(result.download_url);
+    if (!fileResponse.ok) {
+        throw new Error(`HTTP error! status: ${fileResponse.status}`);
+    }
+    return fileResponse.text();
+}
+
 // Function to export customers to CSV
 async function exportCustomersToCSV(customerIds) {
     try {
         // Show loading message
         showMessage('Generating CSV file...', 'info');
         
-        // Prepare the request
-        const requestData = {
-            customer_ids: customerIds === 'all' ? 'all' : customerIds
-        };
-        
-        // Make API call to get customer data
-        const response = await fetch('/staff/customers/export', {
-            method: 'POST',
-            headers: {
-                'Content-Type': 'application/json'
-            },
-            body: JSON.stringify(requestData)
-        });
-        
-        if (!response.ok) {
-            throw new Error(`HTTP error! status: ${response.status}`);
-        }
-        
-        // Get the CSV data
-        const csvData = await response.text();
+        // Get the CSV data (generated by a background export job)
+        const csvData = await fetchExportJob('customers_csv', customerIds === 'all' ? 'all' : customerIds);
         
         // Create and download the CSV file
         const blob = new Blob([csvData], { type: 'text/csv;charset=utf-8;' });
@@ -1492,30 +1513,14 @@ async function exportCustomerOrders(format) {
     try {
         showMessage(`Preparing ${format.toUpperCase()} export for ${selectedIds.length} customers...`, 'info');
         
-        const requestData = {
-            customer_ids: selectedIds,
-            format: format
-        };
-        
-        const response = await fetch('/staff/customers/export-orders', {
-            method: 'POST',
-            headers: {
-                'Content-Type': 'application/json'
-            },
-            body: JSON.stringify(requestData)
-        });
-        
-        if (!response.ok) {
-            throw new Error(`HTTP error! status: ${response.status}`);
-        }
+        // Orders CSV is generated by a background export job; the PDF is built from it client-side
+        const csvData = await fetchExportJob('customer_orders_csv', selectedIds);
         
         if (format === 'pdf') {
             // Generate PDF client-side using jsPDF
-            const csvData = await response.text();
             generateCustomerOrdersPDF(csvData, selectedIds.length);
         } else {
             // Handle CSV download
-            const csvData = await response.text();
             const blob = new Blob([csvData], { type: 'text/csv;charset=utf-8;' });
             const link = document.createElement('a');
             const url = URL.createObjectURL(blob);
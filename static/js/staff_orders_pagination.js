@@ -8,6 +8,9 @@ document.addEventListener('DOMContentLoaded', () => {
 
     let currentPage = 1;
     const pageSize = 10;
+    // Keyset cursors for pages already reached (page -> cursor); reset whenever the filters change
+    let pageCursors = {};
+    let cursorFilterKey = '';
     
     // Auto-apply completed filter on page load
     if (statusFilter && statusFilter.value === 'completed') {
@@ -23,6 +26,12 @@ document.addEventListener('DOMContentLoaded', () => {
         const date = dateFilter.value;
         const approval = document.getElementById('approval-filter')?.value || 'all';
 
+        const filterKey = [search, status, date, approval].join('|');
+        if (filterKey !== cursorFilterKey) {
+            pageCursors = {};
+            cursorFilterKey = filterKey;
+        }
+
         const params = new URLSearchParams({
             page: page,
             page_size: pageSize,
@@ -31,12 +40,18 @@ document.addEventListener('DOMContentLoaded', () => {
             date: date,
             approval: approval
         });
+        if (pageCursors[page]) {
+            params.set('cursor', pageCursors[page]);
+        }
 
         fetch(`/auth/staff/api/orders?${params.toString()}`)
             .then(response => response.json())
             .then(data => {
                 console.log('API response:', data);
                 if (data.success) {
+                    if (data.next_cursor) {
+                        pageCursors[page + 1] = data.next_cursor;
+                    }
                     renderOrders(data.orders);
                     renderPagination(data.total_orders, page);
                     currentPage = page; // Update current page
@@ -1338,10 +1338,18 @@ class WalkInSales {
                 cash_received: this.paymentMethod === 'cash' ? parseFloat(document.getElementById('cash-received').value) : null
             };
 
+            // Reuse the key for retries of this sale so the server never records it twice
+            if (!this.saleIdempotencyKey) {
+                this.saleIdempotencyKey = (window.crypto && crypto.randomUUID)
+                    ? crypto.randomUUID()
+                    : Date.now().toString(36) + '-' + Math.random().toString(36).slice(2);
+            }
+
             const response = await fetch('/api/walk-in/process-sale', {
                 method: 'POST',
                 headers: {
-                    'Content-Type': 'application/json'
+                    'Content-Type': 'application/json',
+                    'Idempotency-Key': this.saleIdempotencyKey
                 },
                 body: JSON.stringify(saleData)
             });
@@ -1349,6 +1357,7 @@ class WalkInSales {
             const result = await response.json();
 
             if (result.success) {
+                this.saleIdempotencyKey = null;
                 // Clear payment ID after successful sale processing
                 this.currentPaymentId = null;
                 
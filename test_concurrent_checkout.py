@@ -0,0 +1,115 @@
+#!/usr/bin/env python3
+"""
+Concurrency test for the checkout engine (utils/checkout_engine.py)
+Fires parallel checkouts at the same SKU and verifies stock never goes negative:
+exactly `stock` buyers succeed, the rest get InsufficientStockError.
+
+Creates a temporary product and removes it (and its inventory rows) afterwards.
+Usage: python test_concurrent_checkout.py [stock] [buyers]
+"""
+
+import sys
+import threading
+
+import mysql.connector
+from config import Config
+from utils import checkout_engine
+
+
+def connect():
+    return mysql.connector.connect(
+        host=Config.MYSQL_HOST,
+        user=Config.MYSQL_USER,
+        password=Config.MYSQL_PASSWORD,
+        database=Config.MYSQL_DB,
+        port=Config.MYSQL_PORT
+    )
+
+
+def checkout_one(product_id, results, start_barrier):
+    """One buyer: lock, validate and decrement in its own transaction"""
+    conn = connect()
+    cur = conn.cursor(dictionary=True)
+    start_barrier.wait()
+    try:
+        conn.start_transaction()
+        quantities = {product_id: 1}
+        locked = checkout_engine.lock_products(cur, quantities)
+        checkout_engine.check_stock(locked, quantities)
+        checkout_engine.apply_stock_changes(cur, quantities)
+        conn.commit()
+        results.append('ok')
+    except checkout_engine.InsufficientStockError:
+        conn.rollback()
+        results.append('out_of_stock')
+    except Exception as e:
+        conn.rollback()
+        results.append(f'error: {e}')
+    finally:
+        cur.close()
+        conn.close()
+
+
+def test_concurrent_checkout(stock=5, buyers=20):
+    print(f"🧪 Testing {buyers} concurrent checkouts against one SKU with stock {stock}")
+    print("=" * 60)
+
+    conn = connect()
+    cur = conn.cursor()
+    cur.execute("""
+        INSERT INTO products (name, description, price, stock)
+        VALUES ('Concurrency Test SKU', 'Temporary product for test_concurrent_checkout.py', 1.00, %s)
+    """, (stock,))
+    product_id = cur.lastrowid
+    conn.commit()
+    print(f"📦 Created temporary product {product_id}")
+
+    try:
+        results = []
+        start_barrier = threading.Barrier(buyers)
+        threads = [threading.Thread(target=checkout_one, args=(product_id, results, start_barrier))
+                   for _ in range(buyers)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        cur.execute("SELECT stock FROM products WHERE id = %s", (product_id,))
+        final_stock = cur.fetchone()[0]
+        cur.execute("SELECT COALESCE(SUM(changes), 0) FROM inventory WHERE product_id = %s", (product_id,))
+        ledger_total = int(cur.fetchone()[0])
+
+        succeeded = results.count('ok')
+        rejected = results.count('out_of_stock')
+        errors = [r for r in results if r.startswith('error')]
+
+        print(f"✅ Succeeded: {succeeded}")
+        print(f"⛔ Rejected (out of stock): {rejected}")
+        print(f"📉 Final stock: {final_stock}, inventory ledger total: {ledger_total}")
+        for error in errors:
+            print(f"❌ {error}")
+
+        assert not errors, f"{len(errors)} checkout(s) failed unexpectedly: {errors[0]}"
+        assert succeeded == min(stock, buyers), f"expected {min(stock, buyers)} successful orders, got {succeeded}"
+        assert rejected == buyers - succeeded, f"expected {buyers - succeeded} out-of-stock rejections, got {rejected}"
+        assert final_stock == stock - succeeded, f"expected final stock {stock - succeeded}, got {final_stock}"
+        assert final_stock >= 0, f"stock went negative: {final_stock}"
+        assert ledger_total == -succeeded, f"expected inventory ledger total {-succeeded}, got {ledger_total}"
+        print("\n✅ PASSED: no overselling")
+    finally:
+        cur.execute("DELETE FROM inventory WHERE product_id = %s", (product_id,))
+        cur.execute("DELETE FROM products WHERE id = %s", (product_id,))
+        conn.commit()
+        cur.close()
+        conn.close()
+        print(f"🧹 Removed temporary product {product_id}")
+
+
+if __name__ == "__main__":
+    stock = int(sys.argv[1]) if len(sys.argv) > 1 else 5
+    buyers = int(sys.argv[2]) if len(sys.argv) > 2 else 20
+    try:
+        test_concurrent_checkout(stock, buyers)
+    except AssertionError as e:
+        print(f"\n❌ FAILED: {e}")
+        sys.exit(1)
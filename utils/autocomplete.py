@@ -0,0 +1,119 @@
+"""
+Product Name Autocomplete
+Sorted-array prefix index over product names and brand/word tokens for /api/search_suggestions.
+Lookups are a bisect plus a short scan, with a per-prefix result cache.
+"""
+
+import re
+import threading
+from bisect import bisect_left, insort
+from collections import OrderedDict
+from typing import Dict, List, Tuple
+
+WORD_START_RE = re.compile(r'(?<![a-z0-9])[a-z0-9]')
+
+
+def normalize_prefix(text) -> str:
+    """Lowercase and collapse whitespace so 'Mac  ', 'mac' and 'MAC' share one cache entry"""
+    return ' '.join(str(text or '').lower().split())
+
+
+class AutocompleteIndex:
+    """
+    Two sorted arrays of (key, product_id):
+    - names: the full normalized product name, so names starting with the prefix rank first
+    - words: every suffix of the name that starts at a word boundary (brand, model, ...)
+    """
+
+    def __init__(self, limit: int = 10, cache_size: int = 2048):
+        self.limit = limit
+        self.cache_size = cache_size
+        self._lock = threading.RLock()
+        self._names: List[Tuple[str, int]] = []
+        self._words: List[Tuple[str, int]] = []
+        self._entries: Dict[int, Dict] = {}
+        self._cache: 'OrderedDict[str, List[Dict]]' = OrderedDict()
+
+    @staticmethod
+    def _keys(name: str) -> Tuple[str, List[str]]:
+        full = normalize_prefix(name)
+        words = [full[m.start():] for m in WORD_START_RE.finditer(full) if m.start() > 0]
+        return full, words
+
+    def _remove_locked(self, product_id: int):
+        entry = self._entries.pop(product_id, None)
+        if entry is None:
+            return
+        full, words = self._keys(entry['name'])
+        self._discard(self._names, (full, product_id))
+        for word in words:
+            self._discard(self._words, (word, product_id))
+
+    @staticmethod
+    def _discard(array: List, item):
+        i = bisect_left(array, item)
+        if i < len(array) and array[i] == item:
+            array.pop(i)
+
+    def _add_locked(self, product: Dict):
+        if product.get('archived') or not product.get('name'):
+            return
+        product_id = product['id']
+        full, words = self._keys(product['name'])
+        self._entries[product_id] = {'id': product_id, 'name': product['name']}
+        insort(self._names, (full, product_id))
+        for word in words:
+            insort(self._words, (word, product_id))
+
+    def build(self, products):
+        with self._lock:
+            self._names, self._words, self._entries = [], [], {}
+            for product in products:
+                self._add_locked(product)
+            self._names.sort()
+            self._words.sort()
+            self._cache.clear()
+
+    def upsert(self, product: Dict):
+        with self._lock:
+            self._remove_locked(product['id'])
+            self._add_locked(product)
+            self._cache.clear()
+
+    def remove(self, product_id: int):
+        with self._lock:
+            self._remove_locked(product_id)
+            self._cache.clear()
+
+    @staticmethod
+    def _scan(array: List, prefix: str, seen: set, out: List[int], limit: int):
+        i = bisect_left(array, (prefix, -1))
+        while i < len(array) and len(out) < limit:
+            key, product_id = array[i]
+            if not key.startswith(prefix):
+                break
+            if product_id not in seen:
+                seen.add(product_id)
+                out.append(product_id)
+            i += 1
+
+    def suggest(self, text) -> List[Dict]:
+        """Top suggestions for a typed prefix: names starting with it first, then word matches"""
+        prefix = normalize_prefix(text)
+        if not prefix:
+            return []
+        with self._lock:
+            cached = self._cache.get(prefix)
+            if cached is not None:
+                self._cache.move_to_end(prefix)
+                return cached
+
+            seen, ids = set(), []
+            self._scan(self._names, prefix, seen, ids, self.limit)
+            self._scan(self._words, prefix, seen, ids, self.limit)
+            result = [dict(self._entries[product_id]) for product_id in ids]
+
+            self._cache[prefix] = result
+            if len(self._cache) > self.cache_size:
+                self._cache.popitem(last=False)
+            return result
@@ -0,0 +1,154 @@
+"""
+Catalog Cache
+Read-through cache with TTL and generation-based invalidation.
+Uses an in-process backend by default; set CACHE_REDIS_URL to share entries across gunicorn workers.
+"""
+
+import logging
+import pickle
+import threading
+import time
+from typing import Any, Callable, Optional
+
+logger = logging.getLogger(__name__)
+
+_MISSING = object()
+
+
+class InProcessBackend:
+    """Dictionary backend with per-entry expiry. Entries are local to one worker process."""
+
+    def __init__(self, max_entries: int = 1024):
+        self.max_entries = max_entries
+        self._data = {}
+        self._counters = {}  # kept apart from _data so eviction never resets a generation
+        self._lock = threading.Lock()
+
+    def get(self, key: str):
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is None:
+                return _MISSING
+            expires_at, value = entry
+            if expires_at is not None and expires_at < time.time():
+                del self._data[key]
+                return _MISSING
+            return value
+
+    def set(self, key: str, value, ttl: Optional[float] = None):
+        with self._lock:
+            if len(self._data) >= self.max_entries:
+                now = time.time()
+                for stale_key in [k for k, (exp, _) in self._data.items() if exp is not None and exp < now]:
+                    del self._data[stale_key]
+                if len(self._data) >= self.max_entries:
+                    self._data.pop(next(iter(self._data)))
+            self._data[key] = (time.time() + ttl if ttl else None, value)
+
+    def counter(self, key: str) -> int:
+        with self._lock:
+            return self._counters.get(key, 0)
+
+    def incr(self, key: str) -> int:
+        with self._lock:
+            self._counters[key] = self._counters.get(key, 0) + 1
+            return self._counters[key]
+
+    def delete(self, key: str):
+        with self._lock:
+            self._data.pop(key, None)
+            self._counters.pop(key, None)
+
+
+class RedisBackend:
+    """Shared backend for multi-worker deployments. Requires the optional `redis` package."""
+
+    def __init__(self, url: str):
+        import redis  # optional dependency, only needed when CACHE_REDIS_URL is set
+        self._client = redis.Redis.from_url(url)
+
+    def get(self, key: str):
+        raw = self._client.get(key)
+        return _MISSING if raw is None else pickle.loads(raw)
+
+    def set(self, key: str, value, ttl: Optional[float] = None):
+        self._client.set(key, pickle.dumps(value), ex=int(ttl) if ttl else None)
+
+    def counter(self, key: str) -> int:
+        return int(self._client.get(key) or 0)
+
+    def incr(self, key: str) -> int:
+        return int(self._client.incr(key))
+
+    def delete(self, key: str):
+        self._client.delete(key)
+
+
+class NamespaceCache:
+    """
+    Read-through cache for one namespace (e.g. 'catalog').
+    invalidate() bumps a generation counter that is part of every key, so all
+    entries of the namespace become unreachable at once without scanning.
+    """
+
+    def __init__(self, namespace: str, backend, default_ttl: float = 300):
+        self.namespace = namespace
+        self.backend = backend
+        self.default_ttl = default_ttl
+
+    def _generation(self) -> int:
+        return self.backend.counter(f"{self.namespace}:generation")
+
+    def _key(self, key: str) -> str:
+        return f"{self.namespace}:{self._generation()}:{key}"
+
+    def get_or_load(self, key: str, loader: Callable[[], Any], ttl: Optional[float] = None):
+        try:
+            full_key = self._key(key)
+            value = self.backend.get(full_key)
+        except Exception as e:
+            logger.warning(f"Cache read failed for {self.namespace}:{key}, loading from database: {e}")
+            return loader()
+        if value is not _MISSING:
+            return value
+
+        value = loader()
+        try:
+            self.backend.set(full_key, value, ttl if ttl is not None else self.default_ttl)
+        except Exception as e:
+            logger.warning(f"Cache write failed for {full_key}: {e}")
+        return value
+
+    def delete(self, key: str):
+        """Drop a single entry of the current generation"""
+        try:
+            self.backend.delete(self._key(key))
+        except Exception as e:
+            logger.warning(f"Cache delete failed for {self.namespace}:{key}: {e}")
+
+    def invalidate(self):
+        try:
+            self.backend.incr(f"{self.namespace}:generation")
+        except Exception as e:
+            logger.warning(f"Cache invalidation failed for namespace {self.namespace}: {e}")
+
+
+_backend = None
+_backend_lock = threading.Lock()
+
+
+def get_backend(redis_url: Optional[str] = None):
+    """Process-wide cache backend: Redis when configured and importable, otherwise in-process"""
+    global _backend
+    if _backend is not None:
+        return _backend
+    with _backend_lock:
+        if _backend is None:
+            if redis_url:
+                try:
+                    _backend = RedisBackend(redis_url)
+                except Exception as e:
+                    logger.warning(f"Redis cache unavailable ({e}), using in-process cache")
+            if _backend is None:
+                _backend = InProcessBackend()
+        return _backend
@@ -0,0 +1,77 @@
+"""
+Category Tree
+Immutable snapshot of the categories table with precomputed descendant lists,
+so navigation and category pages never re-query or rebuild the hierarchy per request.
+"""
+
+import copy
+from typing import Dict, List, Optional
+
+
+class CategoryTree:
+    """
+    Built once from all category rows (id, name, description, parent_id, sort_order, is_active).
+    Accessors return copies so callers can annotate the results freely.
+    """
+
+    def __init__(self, rows: List[Dict]):
+        self._by_id: Dict[int, Dict] = {row['id']: dict(row) for row in rows}
+
+        # Children ordered the same way the old queries did: sort_order, then name
+        children: Dict[Optional[int], List[Dict]] = {}
+        for row in sorted(self._by_id.values(), key=lambda r: (r.get('sort_order') or 0, r['name'] or '')):
+            children.setdefault(row['parent_id'], []).append(row)
+        self._children = children
+
+        self._descendants: Dict[int, List[Dict]] = {}
+        for category_id in self._by_id:
+            self._descendants[category_id] = self._collect_descendants(category_id)
+
+    def _collect_descendants(self, parent_id: int) -> List[Dict]:
+        """Depth-first list of active descendants with their nesting level (0 = direct child)"""
+        result = []
+        stack = [(child, 0) for child in reversed(self._active_children(parent_id))]
+        seen = {parent_id}
+        while stack:
+            category, level = stack.pop()
+            if category['id'] in seen:  # guard against parent_id cycles
+                continue
+            seen.add(category['id'])
+            result.append({'id': category['id'], 'name': category['name'], 'description': category['description'],
+                           'parent_id': category['parent_id'], 'sort_order': category.get('sort_order'),
+                           'level': level})
+            stack.extend((child, level + 1) for child in reversed(self._active_children(category['id'])))
+        return result
+
+    def _active_children(self, parent_id) -> List[Dict]:
+        return [c for c in self._children.get(parent_id, []) if c.get('is_active')]
+
+    def get(self, category_id: int) -> Optional[Dict]:
+        category = self._by_id.get(category_id)
+        return dict(category) if category else None
+
+    def all_by_name(self) -> List[Dict]:
+        return [{'id': c['id'], 'name': c['name'], 'description': c['description']}
+                for c in sorted(self._by_id.values(), key=lambda c: c['name'] or '')]
+
+    def descendants(self, category_id: int) -> List[Dict]:
+        """All active subcategories below category_id (nested levels included), depth-first"""
+        return copy.deepcopy(self._descendants.get(category_id, []))
+
+    def descendant_ids(self, category_id: int) -> List[int]:
+        """category_id followed by every active descendant id"""
+        return [category_id] + [c['id'] for c in self._descendants.get(category_id, [])]
+
+    def hierarchical(self) -> List[Dict]:
+        """Nested root categories with 'children', including categories whose is_active is NULL"""
+        def visible(category):
+            return category.get('is_active') is None or bool(category.get('is_active'))
+
+        def build(category, seen):
+            node = {key: category[key] for key in ('id', 'name', 'description', 'parent_id', 'sort_order', 'is_active')}
+            node['children'] = [build(child, seen | {child['id']})
+                                for child in self._children.get(category['id'], [])
+                                if visible(child) and child['id'] not in seen]
+            return node
+
+        return [build(root, {root['id']}) for root in self._children.get(None, []) if visible(root)]
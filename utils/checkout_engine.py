@@ -0,0 +1,116 @@
+"""
+Checkout Engine
+Set-based order writes for checkout: lock every product row involved in one
+SELECT ... FOR UPDATE (ordered by id so concurrent checkouts cannot deadlock),
+validate stock under the lock, then write order items, stock and inventory
+ledger rows with a fixed number of statements regardless of cart size.
+
+All functions take a cursor on a connection that is already inside a
+transaction (e.g. `with mysql.transaction():`); nothing here commits.
+"""
+
+from typing import Dict, Iterable, List, Optional
+
+
+class InsufficientStockError(Exception):
+    """Raised when a locked product row has less stock than the checkout needs"""
+
+    def __init__(self, product_id: int, name: Optional[str], available: int, requested: int):
+        self.product_id = product_id
+        self.name = name
+        self.available = available
+        self.requested = requested
+        super().__init__(f"Only {available} items available for {name or f'product {product_id}'}")
+
+
+class ProductNotFoundError(Exception):
+    """Raised when a product in the checkout no longer exists"""
+
+    def __init__(self, product_id: int):
+        self.product_id = product_id
+        super().__init__(f"Product {product_id} not found")
+
+
+def total_quantities(lines: Iterable[Dict]) -> Dict[int, int]:
+    """Sum quantities per product_id over order lines"""
+    quantities: Dict[int, int] = {}
+    for line in lines:
+        product_id = int(line['product_id'])
+        quantities[product_id] = quantities.get(product_id, 0) + int(line['quantity'])
+    return quantities
+
+
+def lock_products(cur, product_ids: Iterable[int]) -> Dict[int, Dict]:
+    """Lock the product rows with one SELECT ... FOR UPDATE in id order; returns {id: row}"""
+    ids = sorted({int(product_id) for product_id in product_ids})
+    if not ids:
+        return {}
+    cur.execute(f"""
+        SELECT id, name, stock
+        FROM products
+        WHERE id IN ({','.join(['%s'] * len(ids))})
+        ORDER BY id
+        FOR UPDATE
+    """, ids)
+    rows = cur.fetchall()
+    if rows and not isinstance(rows[0], dict):
+        rows = [dict(zip(('id', 'name', 'stock'), row)) for row in rows]
+    return {row['id']: row for row in rows}
+
+
+def check_stock(locked: Dict[int, Dict], quantities: Dict[int, int], held: Optional[Dict[int, int]] = None):
+    """Validate requested quantities against the locked rows, less any units held by stock reservations"""
+    held = held or {}
+    for product_id, quantity in sorted(quantities.items()):
+        row = locked.get(product_id)
+        if row is None:
+            raise ProductNotFoundError(product_id)
+        available = max(0, int(row['stock'] or 0) - held.get(product_id, 0))
+        if available < quantity:
+            raise InsufficientStockError(product_id, row['name'], available, quantity)
+
+
+def insert_order_items(cur, order_id: int, items: List[Dict], item_type: Optional[str] = None):
+    """
+    Insert all order_items rows with one executemany.
+    Each item needs product_id, product_name, product_description, product_category,
+    quantity, price, original_price, discount_percentage and discount_amount.
+    """
+    if not items:
+        return
+    columns = ['order_id', 'product_id', 'product_name', 'product_description', 'product_category',
+               'quantity', 'price', 'original_price', 'discount_percentage', 'discount_amount']
+    if item_type is not None:
+        columns.append('type')
+    rows = []
+    for item in items:
+        row = [order_id] + [item[column] for column in columns[1:10]]
+        if item_type is not None:
+            row.append(item_type)
+        rows.append(tuple(row))
+    cur.executemany(f"""
+        INSERT INTO order_items ({', '.join(columns)})
+        VALUES ({', '.join(['%s'] * len(columns))})
+    """, rows)
+
+
+def apply_stock_changes(cur, quantities: Dict[int, int]):
+    """Decrement stock for every product in a single UPDATE and write the inventory ledger in one batch"""
+    if not quantities:
+        return
+    ids = sorted(quantities)
+    case_sql = ' '.join(['WHEN %s THEN %s'] * len(ids))
+    params: List = []
+    for product_id in ids:
+        params.extend((product_id, quantities[product_id]))
+    params.extend(ids)
+    cur.execute(f"""
+        UPDATE products
+        SET stock = stock - CASE id {case_sql} END
+        WHERE id IN ({','.join(['%s'] * len(ids))})
+    """, params)
+
+    cur.executemany("""
+        INSERT INTO inventory (product_id, changes, change_date)
+        VALUES (%s, %s, NOW())
+    """, [(product_id, -quantities[product_id]) for product_id in ids])
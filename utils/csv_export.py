@@ -0,0 +1,102 @@
+"""
+Streaming CSV Export
+Writes large exports straight from an unbuffered (server-side) cursor to the HTTP response:
+rows are pulled with fetchmany() and flushed through the csv module a chunk at a time, so
+worker memory stays flat however many rows the query returns.
+
+The cursor runs on its own pooled connection, not the request's shared (buffered) one, because
+an unbuffered result has to be read to the end before that connection can run anything else.
+"""
+
+import csv
+import io
+import itertools
+import logging
+from typing import Callable, Dict, Iterable, Iterator, List, Optional, Sequence
+
+from flask import Response, stream_with_context
+
+logger = logging.getLogger(__name__)
+
+# Rows fetched from the server and written to the response per round trip
+DEFAULT_CHUNK_SIZE = 500
+
+
+class EmptyExport(Exception):
+    """Raised by stream_query() when the query returned no rows"""
+
+
+def _iter_rows(conn, cursor, chunk_size: int) -> Iterator[Dict]:
+    try:
+        while True:
+            rows = cursor.fetchmany(chunk_size)
+            if not rows:
+                break
+            for row in rows:
+                yield row
+    finally:
+        try:
+            cursor.close()
+        except Exception as e:
+            # Closing mid-result (client went away) - the pool drains or discards the connection
+            logger.debug(f"Export cursor closed with unread rows: {e}")
+        conn.close()
+
+
+def stream_query(connect: Callable, query: str, params: Sequence = (),
+                 chunk_size: int = DEFAULT_CHUNK_SIZE) -> Iterator[Dict]:
+    """
+    Execute `query` on a fresh connection from `connect` with an unbuffered dictionary cursor
+    and return an iterator over its rows. The first chunk is read eagerly so query errors and
+    EmptyExport surface in the caller (before any response has been sent); the connection is
+    released when the iterator is exhausted or closed.
+    """
+    conn = connect()
+    try:
+        cursor = conn.cursor(dictionary=True, buffered=False)
+        cursor.execute(query, tuple(params))
+        rows = _iter_rows(conn, cursor, chunk_size)
+    except Exception:
+        conn.close()
+        raise
+    first = next(rows, None)
+    if first is None:
+        raise EmptyExport("Query returned no rows")
+    return itertools.chain([first], rows)
+
+
+def csv_chunks(header: List[str], rows: Iterable, to_row: Callable[[Dict], Optional[List]],
+               chunk_rows: int = DEFAULT_CHUNK_SIZE) -> Iterator[str]:
+    """
+    CSV text for header + to_row(row) of every row, yielded every `chunk_rows` rows.
+    Text fields are quoted and numbers are not, like the exports have always been written;
+    to_row may return None to skip a row.
+    """
+    buffer = io.StringIO()
+    # '\n' line endings: the staff pages split the CSV on '\n' to build the client-side PDF
+    writer = csv.writer(buffer, quoting=csv.QUOTE_NONNUMERIC, lineterminator='\n')
+    writer.writerow(header)
+    pending = 1
+    for row in rows:
+        values = to_row(row)
+        if values is None:
+            continue
+        writer.writerow(values)
+        pending += 1
+        if pending >= chunk_rows:
+            yield buffer.getvalue()
+            buffer.seek(0)
+            buffer.truncate()
+            pending = 0
+    if pending:
+        yield buffer.getvalue()
+
+
+def csv_response(chunks: Iterable[str], filename: str) -> Response:
+    """Chunked text/csv attachment response streaming `chunks`"""
+    response = Response(stream_with_context(chunks), mimetype='text/csv')
+    response.headers['Content-Type'] = 'text/csv; charset=utf-8'
+    response.headers['Content-Disposition'] = f'attachment; filename={filename}'
+    # Keep reverse proxies (nginx) from buffering the whole export before passing it on
+    response.headers['X-Accel-Buffering'] = 'no'
+    return response
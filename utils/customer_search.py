@@ -0,0 +1,133 @@
+"""
+Customer Search
+Builds the WHERE clause for the staff customer list search. With the ft_customers_search
+FULLTEXT index (run_customer_search_migration.py) every searched word is matched as an
+indexed word prefix first, and the original substring conditions only run on those
+candidates, so a search costs the same however many customers there are. Without the
+index (or when no word is long enough to be indexed) the substring conditions run alone.
+
+The index only knows word prefixes, so a term found only inside a word ("ohn" in "John")
+is missed by it. Digit-only words (usually the middle or end of a phone number) are never
+required from the index, and Customer.get_page falls back to the substring conditions
+alone when the prefix match finds nobody.
+
+Customer lookup (login, staff quick search) goes through normalized keys instead
+(run_customer_lookup_migration.py): email_key, name_key ("first last"), name_rev_key
+("last first") and phone_key (digits only), each indexed, so exact, prefix and
+swapped-name matches are all index lookups.
+"""
+
+import re
+from typing import Dict, List, Optional, Tuple
+
+# innodb_ft_min_token_size: shorter words are not in the index
+MIN_TOKEN_SIZE = 3
+
+# InnoDB's default full-text stopwords are never indexed, so requiring one would match nothing
+STOPWORDS = frozenset("""
+    a about an are as at be by com de en for from how i in is it la of on or that the this to
+    was what when where who will with und www
+""".split())
+
+SEARCH_COLUMNS = ('first_name', 'last_name', 'email', 'phone')
+
+
+def fulltext_query(search: str) -> Optional[str]:
+    """BOOLEAN MODE query requiring a prefix match of every indexable, non-numeric word, or None if there is none"""
+    words = [word for word in re.split(r'[\W_]+', search.lower())
+             if len(word) >= MIN_TOKEN_SIZE and word not in STOPWORDS and not word.isdigit()]
+    if not words:
+        return None
+    return ' '.join(f'+{word}*' for word in dict.fromkeys(words))
+
+
+def search_clause(search: str, use_fulltext: bool, alias: str = '') -> Tuple[str, List]:
+    """
+    ' AND ...' fragment and params matching `search` against name, full name, email and phone.
+    Returns ('', []) for an empty search.
+    """
+    clean = ' '.join((search or '').split())
+    if not clean:
+        return '', []
+    prefix = f'{alias}.' if alias else ''
+    like = f'%{clean}%'
+    conditions = [f"{prefix}{column} LIKE %s" for column in SEARCH_COLUMNS]
+    conditions.append(f"CONCAT({prefix}first_name, ' ', {prefix}last_name) LIKE %s")
+    clause = f" AND ({' OR '.join(conditions)})"
+    params = [like] * len(conditions)
+
+    boolean_query = fulltext_query(clean) if use_fulltext else None
+    if boolean_query:
+        columns = ', '.join(f'{prefix}{column}' for column in SEARCH_COLUMNS)
+        clause = f" AND MATCH({columns}) AGAINST (%s IN BOOLEAN MODE)" + clause
+        params = [boolean_query] + params
+    return clause, params
+
+
+# Lookup key columns, and the expressions computing the same values before the migration has run
+LOOKUP_KEY_COLUMNS = {
+    'email': 'email_key',
+    'name': 'name_key',
+    'name_rev': 'name_rev_key',
+    'phone': 'phone_key',
+}
+LOOKUP_KEY_EXPRESSIONS = {
+    'email': "LOWER(TRIM(email))",
+    'name': "LOWER(TRIM(CONCAT(TRIM(COALESCE(first_name, '')), ' ', TRIM(COALESCE(last_name, '')))))",
+    'name_rev': "LOWER(TRIM(CONCAT(TRIM(COALESCE(last_name, '')), ' ', TRIM(COALESCE(first_name, '')))))",
+    'phone': "NULLIF(REGEXP_REPLACE(COALESCE(phone, ''), '[^0-9]', ''), '')",
+}
+
+# Shortest digit run treated as a phone number rather than part of a name
+MIN_PHONE_DIGITS = 3
+_PHONE_CHARS = re.compile(r'[\d\s()+.-]+')
+
+
+def email_key(value: str) -> str:
+    return (value or '').strip().lower()
+
+
+def name_key(value: str) -> str:
+    """Lower-cased words separated by single spaces; matches name_key / name_rev_key"""
+    return ' '.join((value or '').split()).lower()
+
+
+def phone_key(value: str) -> str:
+    return re.sub(r'\D', '', value or '')
+
+
+def _like_prefix(value: str) -> str:
+    return value.replace('\\', '\\\\').replace('%', '\\%').replace('_', '\\_') + '%'
+
+
+def lookup_conditions(term: str, keys: Dict[str, str], prefix: bool = False) -> List[Tuple[int, str, List]]:
+    """
+    (rank, condition, params) for each indexed lookup `term` can match, best rank first:
+    an email (term contains @), a phone number (digits and separators only) or a name in
+    either order. With prefix=True, prefix matches follow the exact ones (and names are
+    also tried as the start of an email).
+    """
+    term = (term or '').strip()
+    if not term:
+        return []
+    conditions = []
+    if '@' in term:
+        email = email_key(term)
+        conditions.append((0, f"{keys['email']} = %s", [email]))
+        if prefix:
+            conditions.append((3, f"{keys['email']} LIKE %s", [_like_prefix(email)]))
+    elif _PHONE_CHARS.fullmatch(term) and len(phone_key(term)) >= MIN_PHONE_DIGITS:
+        phone = phone_key(term)
+        conditions.append((0, f"{keys['phone']} = %s", [phone]))
+        if prefix:
+            conditions.append((3, f"{keys['phone']} LIKE %s", [_like_prefix(phone)]))
+    else:
+        name = name_key(term)
+        # "first last" typed in order, then swapped ("last first")
+        conditions.append((1, f"{keys['name']} = %s", [name]))
+        conditions.append((2, f"{keys['name_rev']} = %s", [name]))
+        if prefix:
+            conditions.append((4, f"{keys['name']} LIKE %s", [_like_prefix(name)]))
+            conditions.append((5, f"{keys['name_rev']} LIKE %s", [_like_prefix(name)]))
+            conditions.append((6, f"{keys['email']} LIKE %s", [_like_prefix(name)]))
+    return conditions
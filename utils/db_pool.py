@@ -0,0 +1,231 @@
+"""
+MySQL Connection Pool
+Keeps a bounded set of mysql.connector connections alive between calls to get_db()
+"""
+
+import logging
+import os
+import threading
+import time
+from collections import deque
+from typing import Any, Dict, Optional
+
+import mysql.connector
+
+logger = logging.getLogger(__name__)
+
+
+class PoolTimeoutError(Exception):
+    """Raised when no connection could be checked out before the pool timeout"""
+
+
+class PooledConnection:
+    """
+    Thin proxy around a raw mysql.connector connection.
+    Calling close() hands the connection back to the pool instead of closing the socket,
+    so existing model code (conn.close() in every finally block) works unchanged.
+    """
+
+    def __init__(self, pool: 'ConnectionPool', raw_conn):
+        self._pool = pool
+        self._raw = raw_conn
+        self._released = False
+
+    def __getattr__(self, name):
+        if self._raw is None:
+            raise mysql.connector.errors.OperationalError("Connection has been returned to the pool")
+        return getattr(self._raw, name)
+
+    def close(self):
+        if self._released:
+            return
+        self._released = True
+        raw, self._raw = self._raw, None
+        self._pool._release(raw)
+
+    def __del__(self):
+        # Connections dropped without close() still give their slot back
+        if not getattr(self, '_released', True):
+            self.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+        return False
+
+
+class ConnectionPool:
+    """
+    Thread-safe connection pool with overflow, checkout health checks and idle recycling.
+
+    - pool_size: connections kept open while idle
+    - max_overflow: extra connections allowed under load, closed when returned
+    - recycle: seconds after which an idle connection is replaced instead of reused
+    - pre_ping: ping connections on checkout and replace dead ones
+    - timeout: seconds to wait for a free slot before raising PoolTimeoutError
+    """
+
+    def __init__(self, connect_kwargs: Dict[str, Any], pool_size: int = 5, max_overflow: int = 10,
+                 recycle: int = 1800, pre_ping: bool = True, timeout: float = 30):
+        self.connect_kwargs = dict(connect_kwargs)
+        self.pool_size = max(0, int(pool_size))
+        self.max_overflow = max(0, int(max_overflow))
+        self.recycle = recycle
+        self.pre_ping = pre_ping
+        self.timeout = timeout
+        self.pid = os.getpid()
+
+        self._idle = deque()  # (raw_conn, returned_at)
+        self._lock = threading.RLock()
+        self._slots = threading.BoundedSemaphore(max(1, self.pool_size + self.max_overflow))
+        self._checked_out = 0
+
+    def _connect(self):
+        conn = mysql.connector.connect(**self.connect_kwargs)
+        logger.info("Database connection established successfully.")
+        return conn
+
+    @staticmethod
+    def _discard(raw_conn):
+        try:
+            raw_conn.close()
+        except Exception:
+            pass
+
+    def _is_usable(self, raw_conn, returned_at: float) -> bool:
+        if self.recycle and self.recycle > 0 and time.time() - returned_at > self.recycle:
+            return False
+        if self.pre_ping:
+            try:
+                return raw_conn.is_connected()
+            except Exception:
+                return False
+        return True
+
+    def get_connection(self) -> PooledConnection:
+        """Check out a connection, reusing a healthy idle one when possible"""
+        if not self._slots.acquire(timeout=self.timeout):
+            raise PoolTimeoutError(
+                f"Timed out after {self.timeout}s waiting for a database connection "
+                f"(pool_size={self.pool_size}, max_overflow={self.max_overflow})"
+            )
+        try:
+            raw_conn = None
+            while raw_conn is None:
+                with self._lock:
+                    entry = self._idle.pop() if self._idle else None
+                if entry is None:
+                    raw_conn = self._connect()
+                    break
+                candidate, returned_at = entry
+                if self._is_usable(candidate, returned_at):
+                    raw_conn = candidate
+                else:
+                    self._discard(candidate)
+
+            with self._lock:
+                self._checked_out += 1
+            return PooledConnection(self, raw_conn)
+        except Exception:
+            self._slots.release()
+            raise
+
+    def _release(self, raw_conn):
+        """Return a connection to the idle set, or close it if the pool is full or it is dirty"""
+        try:
+            keep = raw_conn is not None
+            if keep:
+                try:
+                    if raw_conn.unread_result:
+                        raw_conn.consume_results()
+                    if raw_conn.in_transaction:
+                        raw_conn.rollback()
+                    if not raw_conn.autocommit:
+                        raw_conn.autocommit = self.connect_kwargs.get('autocommit', False)
+                except Exception as e:
+                    logger.warning(f"Discarding pooled connection that could not be reset: {e}")
+                    keep = False
+
+            with self._lock:
+                self._checked_out -= 1
+                if keep and len(self._idle) < self.pool_size:
+                    self._idle.append((raw_conn, time.time()))
+                    raw_conn = None
+
+            if raw_conn is not None:
+                self._discard(raw_conn)
+        finally:
+            self._slots.release()
+
+    def dispose(self):
+        """Close every idle connection (checked-out connections are closed as they return)"""
+        with self._lock:
+            idle, self._idle = list(self._idle), deque()
+        for raw_conn, _ in idle:
+            self._discard(raw_conn)
+
+    def status(self) -> Dict[str, int]:
+        with self._lock:
+            return {
+                'pool_size': self.pool_size,
+                'max_overflow': self.max_overflow,
+                'idle': len(self._idle),
+                'checked_out': self._checked_out,
+            }
+
+
+def c_extension_available() -> bool:
+    try:
+        from mysql.connector import HAVE_CEXT
+    except ImportError:
+        return False
+    return bool(HAVE_CEXT)
+
+
+_cext_fallback_logged = False
+
+
+def resolve_use_pure(prefer_c_extension: bool) -> bool:
+    """
+    Value for mysql.connector's use_pure flag.
+    Falls back to the pure-Python driver (logging once) when the C extension is requested but missing.
+    """
+    global _cext_fallback_logged
+    if not prefer_c_extension:
+        return True
+    if c_extension_available():
+        return False
+    if not _cext_fallback_logged:
+        logger.warning("mysql.connector C extension not available, falling back to pure Python driver")
+        _cext_fallback_logged = True
+    return True
+
+
+_pool: Optional[ConnectionPool] = None
+_pool_lock = threading.Lock()
+
+
+def get_pool(connect_kwargs: Dict[str, Any], **pool_options) -> ConnectionPool:
+    """
+    Return the process-wide pool, creating it on first use.
+    A new pool is built after a fork (e.g. gunicorn workers) so sockets are never shared across processes.
+    """
+    global _pool
+    pool = _pool
+    if pool is not None and pool.pid == os.getpid():
+        return pool
+    with _pool_lock:
+        if _pool is None or _pool.pid != os.getpid():
+            _pool = ConnectionPool(connect_kwargs, **pool_options)
+        return _pool
+
+
+def dispose_pool():
+    """Close the process-wide pool so the next get_pool() call builds a fresh one (e.g. after config changes)"""
+    global _pool
+    with _pool_lock:
+        pool, _pool = _pool, None
+    if pool is not None:
+        pool.dispose()
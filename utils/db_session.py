@@ -0,0 +1,126 @@
+"""
+Request-Scoped Database Session
+One pooled connection per Flask app context, shared by every model method and
+the legacy mysql.connection cursor sites, released in teardown_appcontext
+"""
+
+from contextlib import contextmanager
+from typing import Callable, Optional
+
+from flask import g
+
+
+class TransactionRolledBack(Exception):
+    """Raised when a nested operation rolled back a transaction() block that was about to commit"""
+
+
+class _Scope:
+    """State of the connection checked out for the current app context"""
+
+    def __init__(self, raw_conn):
+        self.raw = raw_conn
+        self.transactional = False
+        self.rollback_only = False
+
+
+class RequestConnection:
+    """
+    Handle returned to callers for the request's shared connection.
+
+    - close() is a no-op: the connection is released once, in teardown_appcontext
+    - cursors are buffered so interleaved model calls never trip over unread results
+    - inside transaction(), commit() is deferred to the end of the block and
+      rollback() marks the whole unit of work as failed
+    """
+
+    def __init__(self, scope: _Scope):
+        self._scope = scope
+
+    def __getattr__(self, name):
+        return getattr(self._scope.raw, name)
+
+    def cursor(self, *args, **kwargs):
+        kwargs.setdefault('buffered', True)
+        return self._scope.raw.cursor(*args, **kwargs)
+
+    def commit(self):
+        if self._scope.transactional:
+            return
+        self._scope.raw.commit()
+
+    def rollback(self):
+        if self._scope.transactional:
+            self._scope.rollback_only = True
+        self._scope.raw.rollback()
+
+    def close(self):
+        pass
+
+
+class RequestDatabase:
+    """
+    Drop-in replacement for flask_mysqldb's MySQL object.
+
+    `mysql.connection` and models.get_db() both resolve to the same connection for the
+    lifetime of the app context. Use `with mysql.transaction():` to run several writes
+    (model calls included) as one atomic unit.
+    """
+
+    _G_KEY = '_db_scope'
+
+    def __init__(self, connect: Optional[Callable] = None, app=None):
+        self._connect = connect
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        app.teardown_appcontext(self.teardown)
+
+    def _scope(self) -> _Scope:
+        scope = g.get(self._G_KEY)
+        if scope is None:
+            scope = _Scope(self._connect())
+            setattr(g, self._G_KEY, scope)
+        return scope
+
+    @property
+    def connection(self) -> RequestConnection:
+        return RequestConnection(self._scope())
+
+    @contextmanager
+    def transaction(self):
+        """
+        Run the enclosed block in a single transaction on the request connection.
+        Nested transaction() blocks join the outer one.
+        """
+        scope = self._scope()
+        if scope.transactional:
+            yield RequestConnection(scope)
+            return
+
+        scope.raw.start_transaction()
+        scope.transactional = True
+        scope.rollback_only = False
+        try:
+            yield RequestConnection(scope)
+            if scope.rollback_only:
+                raise TransactionRolledBack("Transaction was rolled back by a nested operation")
+            scope.raw.commit()
+        except Exception:
+            if scope.raw.in_transaction:
+                scope.raw.rollback()
+            raise
+        finally:
+            scope.transactional = False
+            scope.rollback_only = False
+
+    def teardown(self, exception=None):
+        scope = g.pop(self._G_KEY, None)
+        if scope is None:
+            return
+        try:
+            if scope.raw.in_transaction:
+                scope.raw.rollback()
+        except Exception:
+            pass
+        scope.raw.close()
@@ -0,0 +1,228 @@
+"""
+Idempotency Keys
+Replays the stored response when a client repeats a request with the same
+Idempotency-Key header (double-clicked checkout, retried KHQR calls) instead of
+running it twice. Keys are claimed in an in-process map first and in the
+idempotency_keys table (unique on scope + key) so duplicates hitting other
+workers are caught as well.
+"""
+
+import functools
+import hashlib
+import logging
+import threading
+import time
+from collections import OrderedDict
+from typing import Callable, Dict, Optional
+
+import mysql.connector
+from flask import current_app, jsonify, make_response, request
+
+logger = logging.getLogger(__name__)
+
+# A claim older than this is treated as abandoned (worker died mid-request) and can be taken over
+IN_PROGRESS_TIMEOUT = 120
+PURGE_EVERY = 500
+MAX_KEY_LENGTH = 100
+
+
+class IdempotencyStore:
+    """
+    Entries are {'state': 'in_progress' | 'completed', 'fingerprint', 'status', 'body'}.
+    Only successful (2xx) responses are stored; failed requests release their claim so
+    the client can retry with the same key.
+    """
+
+    def __init__(self, connect: Callable, is_enabled: Callable[[], bool], ttl: int = 86400,
+                 max_local_entries: int = 4096):
+        self._connect = connect
+        self._is_enabled = is_enabled
+        self.ttl = ttl
+        self.max_local_entries = max_local_entries
+        self._local: 'OrderedDict[tuple, tuple]' = OrderedDict()  # (scope, key) -> (expires_at, entry)
+        self._lock = threading.Lock()
+        self._claims = 0
+
+    def _db_enabled(self) -> bool:
+        try:
+            return bool(self._is_enabled())
+        except Exception as e:
+            logger.warning(f"Could not check for idempotency_keys table: {e}")
+            return False
+
+    # In-process fast path
+
+    def _local_get(self, scope: str, key: str) -> Optional[Dict]:
+        item = self._local.get((scope, key))
+        if item is None:
+            return None
+        expires_at, entry = item
+        if expires_at < time.time() or (entry['state'] == 'in_progress'
+                                        and entry['claimed_at'] < time.time() - IN_PROGRESS_TIMEOUT):
+            del self._local[(scope, key)]
+            return None
+        return entry
+
+    def _local_set(self, scope: str, key: str, entry: Dict):
+        self._local[(scope, key)] = (time.time() + self.ttl, entry)
+        self._local.move_to_end((scope, key))
+        while len(self._local) > self.max_local_entries:
+            self._local.popitem(last=False)
+
+    # Shared table
+
+    def _db_claim(self, scope: str, key: str, fingerprint: str) -> Optional[Dict]:
+        conn = self._connect()
+        cur = conn.cursor(dictionary=True)
+        try:
+            self._claims += 1
+            if self._claims % PURGE_EVERY == 0:
+                cur.execute("DELETE FROM idempotency_keys WHERE expires_at < NOW() LIMIT 1000")
+
+            try:
+                cur.execute("""
+                    INSERT INTO idempotency_keys (scope, idempotency_key, fingerprint, state, expires_at)
+                    VALUES (%s, %s, %s, 'in_progress', NOW() + INTERVAL %s SECOND)
+                """, (scope, key, fingerprint, self.ttl))
+                conn.commit()
+                return None
+            except mysql.connector.IntegrityError:
+                conn.rollback()
+
+            # Take over an expired key or an abandoned claim
+            cur.execute("""
+                UPDATE idempotency_keys
+                SET fingerprint = %s, state = 'in_progress', response_status = NULL, response_body = NULL,
+                    created_at = NOW(), expires_at = NOW() + INTERVAL %s SECOND
+                WHERE scope = %s AND idempotency_key = %s
+                AND (expires_at < NOW() OR (state = 'in_progress' AND created_at < NOW() - INTERVAL %s SECOND))
+            """, (fingerprint, self.ttl, scope, key, IN_PROGRESS_TIMEOUT))
+            conn.commit()
+            if cur.rowcount:
+                return None
+
+            cur.execute("""
+                SELECT state, fingerprint, response_status, response_body
+                FROM idempotency_keys
+                WHERE scope = %s AND idempotency_key = %s
+            """, (scope, key))
+            row = cur.fetchone()
+            if row is None:
+                return None
+            return {'state': row['state'], 'fingerprint': row['fingerprint'],
+                    'status': row['response_status'], 'body': row['response_body'],
+                    'claimed_at': time.time()}
+        finally:
+            cur.close()
+            conn.close()
+
+    def _db_execute(self, sql: str, params: tuple):
+        conn = self._connect()
+        cur = conn.cursor()
+        try:
+            cur.execute(sql, params)
+            conn.commit()
+        finally:
+            cur.close()
+            conn.close()
+
+    # API
+
+    def claim(self, scope: str, key: str, fingerprint: str) -> Optional[Dict]:
+        """Claim the key for this request. Returns None when claimed, else the existing entry."""
+        with self._lock:
+            existing = self._local_get(scope, key)
+            if existing is not None:
+                return existing
+            self._local_set(scope, key, {'state': 'in_progress', 'fingerprint': fingerprint,
+                                         'status': None, 'body': None, 'claimed_at': time.time()})
+
+        if not self._db_enabled():
+            return None
+        try:
+            existing = self._db_claim(scope, key, fingerprint)
+        except Exception as e:
+            logger.warning(f"Idempotency key claim failed for {scope}, continuing without it: {e}")
+            return None
+        if existing is not None:
+            with self._lock:
+                if existing['state'] == 'completed':
+                    self._local_set(scope, key, existing)
+                else:
+                    self._local.pop((scope, key), None)
+        return existing
+
+    def complete(self, scope: str, key: str, fingerprint: str, status: int, body: str):
+        with self._lock:
+            self._local_set(scope, key, {'state': 'completed', 'fingerprint': fingerprint,
+                                         'status': status, 'body': body, 'claimed_at': time.time()})
+        if not self._db_enabled():
+            return
+        try:
+            self._db_execute("""
+                UPDATE idempotency_keys
+                SET state = 'completed', response_status = %s, response_body = %s
+                WHERE scope = %s AND idempotency_key = %s
+            """, (status, body, scope, key))
+        except Exception as e:
+            logger.warning(f"Could not store idempotent response for {scope}: {e}")
+
+    def release(self, scope: str, key: str):
+        """Forget a claim whose request failed so a retry runs again"""
+        with self._lock:
+            self._local.pop((scope, key), None)
+        if not self._db_enabled():
+            return
+        try:
+            self._db_execute("""
+                DELETE FROM idempotency_keys
+                WHERE scope = %s AND idempotency_key = %s AND state = 'in_progress'
+            """, (scope, key))
+        except Exception as e:
+            logger.warning(f"Could not release idempotency key for {scope}: {e}")
+
+
+def idempotent(store: IdempotencyStore, scope: Callable[[], str]):
+    """
+    Route decorator. Requests without an Idempotency-Key header run as before.
+    A repeated key replays the first successful response (with an Idempotent-Replayed
+    header); a key that is still being processed gets 409; reusing a key for a
+    different request body gets 422.
+    """
+    def decorator(view):
+        @functools.wraps(view)
+        def wrapper(*args, **kwargs):
+            key = (request.headers.get('Idempotency-Key') or '').strip()
+            if not key:
+                return view(*args, **kwargs)
+            if len(key) > MAX_KEY_LENGTH:
+                return jsonify({'success': False, 'error': 'Idempotency-Key is too long'}), 400
+
+            request_scope = scope()
+            fingerprint = hashlib.sha256(request.get_data()).hexdigest()
+            existing = store.claim(request_scope, key, fingerprint)
+            if existing is not None:
+                if existing['fingerprint'] != fingerprint:
+                    return jsonify({'success': False,
+                                    'error': 'Idempotency-Key was already used for a different request'}), 422
+                if existing['state'] == 'completed':
+                    current_app.logger.info(f"Replaying stored response for {request_scope} key {key}")
+                    response = current_app.response_class(existing['body'], status=existing['status'],
+                                                          mimetype='application/json')
+                    response.headers['Idempotent-Replayed'] = 'true'
+                    return response
+                return jsonify({'success': False, 'in_progress': True,
+                                'error': 'This request is already being processed'}), 409
+
+            try:
+                response = make_response(view(*args, **kwargs))
+            except Exception:
+                store.release(request_scope, key)
+                raise
+            if 200 <= response.status_code < 300:
+                store.complete(request_scope, key, fingerprint, response.status_code, response.get_data(as_text=True))
+            else:
+                store.release(request_scope, key)
+            return response
+        return wrapper
+    return decorator
@@ -0,0 +1,328 @@
+"""
+Background Jobs
+Runs heavy staff exports (customer/order CSV and PDF) on a small thread pool instead of
+inside the request, so a large export no longer ties up a gunicorn worker for the whole
+render. The request submits a job and gets its id back; the page polls the status
+endpoint for progress and downloads the file once it is done.
+
+- Job state lives in the jobs table (run_jobs_migration.py) so any worker can answer a
+  status poll; until the table exists it is kept in this process only.
+- Results are written to result_dir under a key of (kind, params), so submitting the same
+  export again within result_ttl seconds is served from disk without re-running it.
+- A queued/running job whose row has not been touched for stale_after seconds is
+  reported as failed (the worker that owned it died or was restarted).
+"""
+
+import hashlib
+import json
+import logging
+import os
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from typing import Callable, Dict, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+QUEUED = 'queued'
+RUNNING = 'running'
+COMPLETED = 'completed'
+FAILED = 'failed'
+
+# Progress is written to the jobs table at most once per this many percent
+PROGRESS_STEP = 5
+# In-process job entries kept for status lookups when the jobs table does not exist
+MAX_LOCAL_JOBS = 500
+
+
+class UnknownJobKind(ValueError):
+    """Raised when submit() is called with a kind that has no registered handler"""
+
+
+class JobProgress:
+    """Passed to handlers: call update(done, total[, message]) as work is completed"""
+
+    def __init__(self, runner: 'JobRunner', job_id: str):
+        self._runner = runner
+        self._job_id = job_id
+        self._reported = -PROGRESS_STEP
+
+    def update(self, done: int, total: int, message: Optional[str] = None):
+        percent = min(99, int(done * 100 / total)) if total else 0
+        if percent - self._reported < PROGRESS_STEP and message is None:
+            return
+        self._reported = percent
+        self._runner._update(self._job_id, progress=percent, message=message)
+
+
+class JobRunner:
+    """
+    register(kind, handler) where handler(params, path, progress) writes the result file to
+    `path` and returns (download file name, content type).
+    """
+
+    def __init__(self, connect: Callable, is_enabled: Callable[[], bool], result_dir: str,
+                 max_workers: int = 2, result_ttl: int = 600, stale_after: int = 900):
+        self._connect = connect
+        self._is_enabled = is_enabled
+        self.result_dir = result_dir
+        self.max_workers = max_workers
+        self.result_ttl = result_ttl
+        self.stale_after = stale_after
+        self.app = None
+        self._handlers: Dict[str, Callable] = {}
+        self._jobs: Dict[str, Dict] = {}
+        self._lock = threading.Lock()
+        self._executor: Optional[ThreadPoolExecutor] = None
+
+    def init_app(self, app):
+        """Handlers run inside app.app_context() so models.get_db() works in the worker threads"""
+        self.app = app
+
+    def register(self, kind: str, handler: Callable):
+        self._handlers[kind] = handler
+
+    def _db_enabled(self) -> bool:
+        try:
+            return bool(self._is_enabled())
+        except Exception as e:
+            logger.warning(f"Could not check for jobs table: {e}")
+            return False
+
+    def _pool(self) -> ThreadPoolExecutor:
+        with self._lock:
+            if self._executor is None:
+                self._executor = ThreadPoolExecutor(max_workers=self.max_workers,
+                                                    thread_name_prefix='export-job')
+            return self._executor
+
+    # Result files
+
+    @staticmethod
+    def cache_key(kind: str, params: Dict) -> str:
+        payload = json.dumps([kind, params], sort_keys=True, default=str)
+        return hashlib.sha256(payload.encode()).hexdigest()
+
+    def _paths(self, cache_key: str) -> Tuple[str, str]:
+        base = os.path.join(self.result_dir, cache_key)
+        return base + '.out', base + '.json'
+
+    def _cached_result(self, cache_key: str) -> Optional[Dict]:
+        """(file_name, content_type) of a result written less than result_ttl seconds ago"""
+        data_path, meta_path = self._paths(cache_key)
+        try:
+            if time.time() - os.path.getmtime(data_path) > self.result_ttl:
+                return None
+            with open(meta_path) as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return None
+
+    def result_path(self, job: Dict) -> Optional[str]:
+        """Path of a completed job's file, or None if it has been cleaned up"""
+        if job.get('status') != COMPLETED:
+            return None
+        data_path, _ = self._paths(job['cache_key'])
+        return data_path if os.path.exists(data_path) else None
+
+    def purge_results(self):
+        """
+        Delete result files older than result_ttl (and partial files of jobs that died mid-run),
+        and the jobs rows that can no longer be downloaded
+        """
+        self._purge_rows()
+        try:
+            names = os.listdir(self.result_dir)
+        except OSError:
+            return
+        for name in names:
+            cutoff = time.time() - (self.stale_after if name.endswith('.tmp') else self.result_ttl)
+            path = os.path.join(self.result_dir, name)
+            try:
+                if os.path.getmtime(path) < cutoff:
+                    os.remove(path)
+            except OSError:
+                pass
+
+    def _purge_rows(self):
+        """
+        Finished jobs are deleted result_ttl seconds after their last update, when their file
+        expires too. Interrupted ones are kept for result_ttl after going stale, so a poll still
+        reports them as failed rather than unknown.
+        """
+        if not self._db_enabled():
+            return
+        conn = self._connect()
+        cur = conn.cursor()
+        try:
+            cur.execute("""
+                DELETE FROM jobs
+                WHERE (status IN (%s, %s) AND updated_at < NOW() - INTERVAL %s SECOND)
+                OR (status IN (%s, %s) AND updated_at < NOW() - INTERVAL %s SECOND)
+            """, (COMPLETED, FAILED, self.result_ttl,
+                  QUEUED, RUNNING, self.stale_after + self.result_ttl))
+            conn.commit()
+        except Exception as e:
+            logger.warning(f"Could not purge old jobs: {e}")
+        finally:
+            cur.close()
+            conn.close()
+
+    # Job state
+
+    def _save(self, job: Dict, insert: bool = False):
+        with self._lock:
+            self._jobs[job['id']] = job
+            while len(self._jobs) > MAX_LOCAL_JOBS:
+                self._jobs.pop(next(iter(self._jobs)))
+        if not self._db_enabled():
+            return
+        conn = self._connect()
+        cur = conn.cursor()
+        try:
+            if insert:
+                cur.execute("""
+                    INSERT INTO jobs (id, kind, owner_id, params, cache_key, status, progress, message,
+                                      file_name, content_type, created_at, updated_at, finished_at)
+                    VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s, %s, NOW(), NOW(), %s)
+                """, (job['id'], job['kind'], job['owner_id'], json.dumps(job['params'], default=str),
+                      job['cache_key'], job['status'], job['progress'], job['message'],
+                      job['file_name'], job['content_type'], job['finished_at']))
+            else:
+                cur.execute("""
+                    UPDATE jobs
+                    SET status = %s, progress = %s, message = %s, error = %s,
+                        file_name = %s, content_type = %s, finished_at = %s, updated_at = NOW()
+                    WHERE id = %s
+                """, (job['status'], job['progress'], job['message'], job['error'],
+                      job['file_name'], job['content_type'], job['finished_at'], job['id']))
+            conn.commit()
+        except Exception as e:
+            logger.warning(f"Could not persist job {job['id']}: {e}")
+        finally:
+            cur.close()
+            conn.close()
+
+    def _update(self, job_id: str, **changes):
+        with self._lock:
+            job = dict(self._jobs.get(job_id) or {})
+        if not job:
+            return
+        job.update({key: value for key, value in changes.items() if value is not None or key == 'error'})
+        job['updated_at'] = datetime.now()
+        self._save(job)
+
+    def get(self, job_id: str) -> Optional[Dict]:
+        with self._lock:
+            job = self._jobs.get(job_id)
+        if job is None and self._db_enabled():
+            conn = self._connect()
+            cur = conn.cursor(dictionary=True)
+            try:
+                cur.execute("""
+                    SELECT id, kind, owner_id, params, cache_key, status, progress, message, error,
+                           file_name, content_type, created_at, updated_at, finished_at,
+                           TIMESTAMPDIFF(SECOND, updated_at, NOW()) AS idle_seconds
+                    FROM jobs
+                    WHERE id = %s
+                """, (job_id,))
+                job = cur.fetchone()
+            finally:
+                cur.close()
+                conn.close()
+            if job:
+                job['params'] = json.loads(job['params'] or '{}')
+        if job is None:
+            return None
+        job = dict(job)
+        idle_seconds = job.pop('idle_seconds', None)
+        if idle_seconds is None:
+            idle_seconds = (datetime.now() - job['updated_at']).total_seconds()
+        if job['status'] in (QUEUED, RUNNING) and idle_seconds > self.stale_after:
+            job['status'] = FAILED
+            job['error'] = 'Job was interrupted before it finished - please run the export again'
+        return job
+
+    # Submitting and running
+
+    def submit(self, kind: str, params: Dict, owner_id=None) -> Dict:
+        """Queue a job (or reuse a cached result / identical job in flight) and return it"""
+        if kind not in self._handlers:
+            raise UnknownJobKind(f"Unknown job kind: {kind}")
+        cache_key = self.cache_key(kind, params)
+
+        with self._lock:
+            for job in self._jobs.values():
+                if (job['cache_key'] == cache_key and job['owner_id'] == owner_id
+                        and job['status'] in (QUEUED, RUNNING)):
+                    return dict(job)
+
+        now = datetime.now()
+        job = {
+            'id': uuid.uuid4().hex, 'kind': kind, 'owner_id': owner_id, 'params': params,
+            'cache_key': cache_key, 'status': QUEUED, 'progress': 0, 'message': 'Queued',
+            'error': None, 'file_name': None, 'content_type': None,
+            'created_at': now, 'updated_at': now, 'finished_at': None,
+        }
+
+        cached = self._cached_result(cache_key)
+        if cached:
+            job.update(status=COMPLETED, progress=100, message='Served from cache', finished_at=now,
+                       file_name=cached['file_name'], content_type=cached['content_type'])
+            self._save(job, insert=True)
+            return dict(job)
+
+        self._save(job, insert=True)
+        self._pool().submit(self._run, job['id'])
+        return dict(job)
+
+    def _run(self, job_id: str):
+        if self.app is not None:
+            with self.app.app_context():
+                self._execute(job_id)
+        else:
+            self._execute(job_id)
+
+    def _execute(self, job_id: str):
+        with self._lock:
+            job = dict(self._jobs[job_id])
+        self._update(job_id, status=RUNNING, message='Running')
+        started = time.time()
+        data_path, meta_path = self._paths(job['cache_key'])
+        tmp_path = f"{data_path}.{job_id}.tmp"
+        try:
+            os.makedirs(self.result_dir, exist_ok=True)
+            file_name, content_type = self._handlers[job['kind']](job['params'], tmp_path,
+                                                                  JobProgress(self, job_id))
+            os.replace(tmp_path, data_path)
+            with open(meta_path, 'w') as f:
+                json.dump({'file_name': file_name, 'content_type': content_type}, f)
+            self._update(job_id, status=COMPLETED, progress=100, message='Done', error=None,
+                         file_name=file_name, content_type=content_type, finished_at=datetime.now())
+            logger.info(f"Job {job_id} ({job['kind']}) finished in {time.time() - started:.1f}s")
+        except Exception as e:
+            logger.error(f"Job {job_id} ({job['kind']}) failed: {e}")
+            self._update(job_id, status=FAILED, message='Failed', error=str(e), finished_at=datetime.now())
+            try:
+                os.remove(tmp_path)
+            except OSError:
+                pass
+        finally:
+            self.purge_results()
+
+
+def job_status(job: Dict) -> Dict:
+    """JSON-safe public view of a job"""
+    return {
+        'job_id': job['id'],
+        'kind': job['kind'],
+        'status': job['status'],
+        'progress': job['progress'],
+        'message': job.get('message'),
+        'error': job.get('error'),
+        'file_name': job.get('file_name'),
+        'created_at': job['created_at'].isoformat() if job.get('created_at') else None,
+        'finished_at': job['finished_at'].isoformat() if job.get('finished_at') else None,
+    }
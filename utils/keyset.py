@@ -0,0 +1,59 @@
+"""
+Keyset Pagination
+Opaque (order_date, id) cursors for newest-first listings. A page after a cursor is
+`WHERE (date < d OR (date = d AND id < i)) ORDER BY date DESC, id DESC LIMIT n`,
+which walks the (order_date, id) index and costs the same on page 500 as on page 1,
+unlike LIMIT/OFFSET which reads and discards every skipped row.
+"""
+
+import base64
+import json
+from datetime import date, datetime, timedelta
+from typing import Dict, List, Optional, Tuple
+
+
+class InvalidCursorError(ValueError):
+    """Raised when a pagination cursor cannot be decoded"""
+
+
+def encode_cursor(order_date, row_id: int) -> str:
+    """Cursor pointing just after the given row"""
+    if isinstance(order_date, datetime):
+        order_date = order_date.strftime('%Y-%m-%d %H:%M:%S.%f')
+    payload = json.dumps([str(order_date), int(row_id)], separators=(',', ':'))
+    return base64.urlsafe_b64encode(payload.encode()).decode().rstrip('=')
+
+
+def decode_cursor(cursor: str) -> Tuple[str, int]:
+    try:
+        padded = cursor + '=' * (-len(cursor) % 4)
+        order_date, row_id = json.loads(base64.urlsafe_b64decode(padded.encode()).decode())
+        datetime.strptime(order_date[:19], '%Y-%m-%d %H:%M:%S')
+        return order_date, int(row_id)
+    except (ValueError, TypeError, UnicodeDecodeError) as e:
+        raise InvalidCursorError(f"Invalid pagination cursor: {cursor!r}") from e
+
+
+def seek_clause(cursor: str, date_column: str = 'o.order_date', id_column: str = 'o.id') -> Tuple[str, List]:
+    """WHERE fragment and params selecting rows that sort after the cursor (newest first)"""
+    order_date, row_id = decode_cursor(cursor)
+    return (f" AND ({date_column} < %s OR ({date_column} = %s AND {id_column} < %s))",
+            [order_date, order_date, row_id])
+
+
+def next_cursor(rows: List[Dict], page_size: int, date_key: str = 'order_date', id_key: str = 'id') -> Optional[str]:
+    """Cursor for the page after `rows`, or None when this was the last page"""
+    if len(rows) < page_size or not rows:
+        return None
+    return encode_cursor(rows[-1][date_key], rows[-1][id_key])
+
+
+def day_range(day) -> Tuple[str, str]:
+    """[start, end) bounds for one calendar day, so the filter can use an index on the datetime column"""
+    if isinstance(day, str):
+        day = datetime.strptime(day.strip()[:10], '%Y-%m-%d').date()
+    elif isinstance(day, datetime):
+        day = day.date()
+    if not isinstance(day, date):
+        raise ValueError(f"Invalid date: {day!r}")
+    return day.strftime('%Y-%m-%d 00:00:00'), (day + timedelta(days=1)).strftime('%Y-%m-%d 00:00:00')
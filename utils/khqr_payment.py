@@ -365,65 +365,58 @@ class KHQRPaymentHandler:
     def update_existing_order_to_completed(self, order_id: int, payment_data: Dict[str, Any] = None) -> Optional[int]:
         """Update an existing pending order payment confirmation - order remains Pending until staff approval"""
         try:
-            from models import get_db
+            from models import request_db, stock_reservations, invalidate_catalog_cache, sales_rollup
             
             print(f"🔄 Updating order {order_id} to completed and reducing stock...")
             
-            conn = get_db()
-            cur = conn.cursor(dictionary=True)
-            
-            try:
-                # Verify order exists and is pending
-                cur.execute("SELECT id, status FROM orders WHERE id = %s", (order_id,))
-                order = cur.fetchone()
-                
-                if not order:
-                    print(f"❌ Order {order_id} not found")
-                    return None
-                
-                if order['status'] != 'PENDING':
-                    print(f"⚠️ Order {order_id} is already {order['status']}, not updating")
-                    return order_id  # Return the order ID anyway since it exists
-                
-                # Update order status to 'COMPLETED' since payment is confirmed
-                # But keep approval_status as 'Pending Approval' for staff to manually approve
-                # Also update transaction_id with the payment's MD5 hash if available
-                md5_hash = None
-                if payment_data:
-                    md5_hash = payment_data.get('md5_hash')
-                
-                if md5_hash:
-                    cur.execute("UPDATE orders SET status = 'COMPLETED', transaction_id = %s WHERE id = %s", (md5_hash, order_id))
-                    print(f"✅ Order {order_id} payment confirmed, status set to COMPLETED, transaction_id updated to {md5_hash}")
-                else:
-                    cur.execute("UPDATE orders SET status = 'COMPLETED' WHERE id = %s", (order_id,))
-                    print(f"✅ Order {order_id} payment confirmed, status set to COMPLETED")
-                
-                # Get order items to reduce stock
-                cur.execute("""
-                    SELECT product_id, quantity 
-                    FROM order_items 
-                    WHERE order_id = %s
-                """, (order_id,))
-                
-                order_items = cur.fetchall()
-                print(f"📦 Found {len(order_items)} items to reduce stock for")
+            # The order row is locked until commit, so a concurrent confirmation of the same
+            # order waits here and then finds it no longer pending
+            with request_db.transaction() as conn:
+                cur = conn.cursor(dictionary=True)
                 
-                # Stock is already reduced when order was placed at checkout
-                # No need to reduce stock again here
-                print(f"✅ Order {order_id} payment confirmed, status set to COMPLETED, approval_status remains Pending Approval")
-                print(f"📦 Stock already reduced at checkout for {len(order_items)} items")
-                
-                conn.commit()
-                return order_id
-                
-            except Exception as e:
-                conn.rollback()
-                print(f"❌ Error updating order {order_id}: {e}")
-                raise e
-            finally:
-                cur.close()
-                conn.close()
+                try:
+                    # Verify order exists and is pending
+                    cur.execute("SELECT id, status FROM orders WHERE id = %s FOR UPDATE", (order_id,))
+                    order = cur.fetchone()
+                    
+                    if not order:
+                        print(f"❌ Order {order_id} not found")
+                        return None
+                    
+                    if order['status'] != 'PENDING':
+                        print(f"⚠️ Order {order_id} is already {order['status']}, not updating")
+                        return order_id  # Return the order ID anyway since it exists
+                    
+                    # Update order status to 'COMPLETED' since payment is confirmed
+                    # But keep approval_status as 'Pending Approval' for staff to manually approve
+                    # Also update transaction_id with the payment's MD5 hash if available
+                    md5_hash = None
+                    if payment_data:
+                        md5_hash = payment_data.get('md5_hash')
+                    
+                    if md5_hash:
+                        cur.execute("UPDATE orders SET status = 'COMPLETED', transaction_id = %s WHERE id = %s", (md5_hash, order_id))
+                        print(f"✅ Order {order_id} payment confirmed, status set to COMPLETED, transaction_id updated to {md5_hash}")
+                    else:
+                        cur.execute("UPDATE orders SET status = 'COMPLETED' WHERE id = %s", (order_id,))
+                        print(f"✅ Order {order_id} payment confirmed, status set to COMPLETED")
+                    
+                    # Convert the order's stock reservation into a real decrement
+                    # (orders placed without a reservation had their stock reduced at checkout)
+                    converted = stock_reservations.convert(cur, order_id)
+                    print(f"✅ Order {order_id} payment confirmed, status set to COMPLETED, approval_status remains Pending Approval")
+                    print(f"📦 Reserved stock converted for {len(converted)} products")
+                    
+                except Exception as e:
+                    print(f"❌ Error updating order {order_id}: {e}")
+                    raise e
+                finally:
+                    cur.close()
+            
+            sales_rollup.refresh_orders([order_id])
+            if converted:
+                invalidate_catalog_cache()
+            return order_id
                 
         except Exception as e:
             print(f"❌ Error in update_existing_order_to_completed: {str(e)}")
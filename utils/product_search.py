@@ -0,0 +1,181 @@
+"""
+Product Search Index
+In-process inverted index over product name, brand, specs and category.
+Replaces LIKE '%q%' table scans with ranked prefix matching and supports incremental updates.
+"""
+
+import re
+import threading
+import time
+from bisect import bisect_left, insort
+from typing import Dict, Iterable, List, Optional
+
+TOKEN_RE = re.compile(r'[a-z0-9]+')
+
+# Relative weight of a match in each field
+FIELD_WEIGHTS = {
+    'name': 5.0,
+    'brand': 3.0,
+    'category': 2.0,
+    'cpu': 1.5,
+    'ram': 1.5,
+    'storage': 1.5,
+    'graphics': 1.5,
+    'description': 0.5,
+}
+
+EXACT_MATCH_FACTOR = 1.0
+PREFIX_MATCH_FACTOR = 0.6
+NAME_PREFIX_BONUS = 2.0
+MAX_PREFIX_EXPANSIONS = 200
+
+
+def tokenize(text) -> List[str]:
+    if not text:
+        return []
+    return TOKEN_RE.findall(str(text).lower())
+
+
+class ProductSearchIndex:
+    """
+    Inverted index: token -> {product_id: field weight}.
+    A sorted vocabulary gives prefix matching with bisect; every query token must match (AND).
+    """
+
+    def __init__(self):
+        self._lock = threading.RLock()
+        self._postings: Dict[str, Dict[int, float]] = {}
+        self._vocabulary: List[str] = []
+        self._doc_tokens: Dict[int, set] = {}
+        self._docs: Dict[int, Dict] = {}
+        self.built_at: Optional[float] = None
+
+    @staticmethod
+    def _document_tokens(product: Dict) -> Dict[str, float]:
+        weights: Dict[str, float] = {}
+        name_tokens = tokenize(product.get('name'))
+        fields = {
+            'name': name_tokens,
+            'brand': name_tokens[:1],
+            'category': tokenize(product.get('category_name')),
+            'cpu': tokenize(product.get('cpu')),
+            'ram': tokenize(product.get('ram')),
+            'storage': tokenize(product.get('storage')),
+            'graphics': tokenize(product.get('graphics')),
+            'description': tokenize(product.get('description')),
+        }
+        for field, tokens in fields.items():
+            for token in set(tokens):
+                weights[token] = weights.get(token, 0.0) + FIELD_WEIGHTS[field]
+        return weights
+
+    def _remove_locked(self, product_id: int):
+        for token in self._doc_tokens.pop(product_id, ()):
+            postings = self._postings.get(token)
+            if postings is None:
+                continue
+            postings.pop(product_id, None)
+            if not postings:
+                del self._postings[token]
+                i = bisect_left(self._vocabulary, token)
+                if i < len(self._vocabulary) and self._vocabulary[i] == token:
+                    self._vocabulary.pop(i)
+        self._docs.pop(product_id, None)
+
+    def _add_locked(self, product: Dict):
+        product_id = product['id']
+        weights = self._document_tokens(product)
+        for token, weight in weights.items():
+            postings = self._postings.get(token)
+            if postings is None:
+                postings = self._postings[token] = {}
+                insort(self._vocabulary, token)
+            postings[product_id] = weight
+        self._doc_tokens[product_id] = set(weights)
+        self._docs[product_id] = {
+            'id': product_id,
+            'name': product.get('name') or '',
+            'archived': bool(product.get('archived')),
+        }
+
+    def build(self, products: Iterable[Dict]):
+        """Replace the whole index"""
+        with self._lock:
+            self._postings = {}
+            self._vocabulary = []
+            self._doc_tokens = {}
+            self._docs = {}
+            for product in products:
+                self._add_locked(product)
+            self.built_at = time.time()
+
+    def upsert(self, product: Dict):
+        """Add or re-index a single product"""
+        with self._lock:
+            self._remove_locked(product['id'])
+            self._add_locked(product)
+
+    def remove(self, product_id: int):
+        with self._lock:
+            self._remove_locked(product_id)
+
+    def is_stale(self, ttl: float) -> bool:
+        return self.built_at is None or (ttl and time.time() - self.built_at > ttl)
+
+    def get(self, product_id: int) -> Optional[Dict]:
+        return self._docs.get(product_id)
+
+    def _expand(self, query_token: str):
+        """Yield (indexed token, match factor) for an exact match and prefix matches"""
+        i = bisect_left(self._vocabulary, query_token)
+        expansions = 0
+        while i < len(self._vocabulary) and expansions < MAX_PREFIX_EXPANSIONS:
+            token = self._vocabulary[i]
+            if not token.startswith(query_token):
+                break
+            yield token, EXACT_MATCH_FACTOR if token == query_token else PREFIX_MATCH_FACTOR
+            i += 1
+            expansions += 1
+
+    def search(self, query: str, limit: Optional[int] = None, include_archived: bool = False) -> List[int]:
+        """
+        Product ids matching every query token (as a word or word prefix), best match first.
+        Falls back to a substring match on names so queries like 'book' still find 'zenbook'.
+        """
+        query_tokens = tokenize(query)
+        if not query_tokens:
+            return []
+
+        with self._lock:
+            scores: Optional[Dict[int, float]] = None
+            for query_token in dict.fromkeys(query_tokens):
+                token_scores: Dict[int, float] = {}
+                for token, factor in self._expand(query_token):
+                    for product_id, weight in self._postings[token].items():
+                        score = weight * factor
+                        if score > token_scores.get(product_id, 0.0):
+                            token_scores[product_id] = score
+                if scores is None:
+                    scores = token_scores
+                else:
+                    scores = {pid: s + token_scores[pid] for pid, s in scores.items() if pid in token_scores}
+                if not scores:
+                    break
+
+            if not scores:
+                needle = query.strip().lower()
+                scores = {pid: 1.0 for pid, doc in self._docs.items() if needle in doc['name'].lower()}
+
+            normalized_query = ' '.join(query_tokens)
+            ranked = []
+            for product_id, score in scores.items():
+                doc = self._docs[product_id]
+                if doc['archived'] and not include_archived:
+                    continue
+                if ' '.join(tokenize(doc['name'])).startswith(normalized_query):
+                    score += NAME_PREFIX_BONUS
+                ranked.append((-score, doc['name'].lower(), product_id))
+
+        ranked.sort()
+        ids = [product_id for _, _, product_id in ranked]
+        return ids[:limit] if limit else ids
@@ -6,7 +6,7 @@ Handles payment recovery from QR screenshots when server crashes or customer pay
 import re
 import hashlib
 from typing import Dict, Any, Optional, Tuple
-from models import get_db
+from models import get_db, sales_rollup
 from utils.payment_session_manager import PaymentSessionManager
 
 class QRRecoverySystem:
@@ -246,6 +246,7 @@ class QRRecoverySystem:
                 """, (order_id,))
                 
                 conn.commit()
+                sales_rollup.refresh_orders([order_id])
                 
                 # If screenshot provided, create payment session record
                 if screenshot_path:
@@ -0,0 +1,55 @@
+"""
+Sales Analytics
+Column-wise aggregation for the staff report endpoints: values are reduced in a single
+pass over columns instead of per-row float() conversions and dict bookkeeping in the route.
+
+NumPy is optional: when it is installed (`pip install numpy`) the reductions run vectorized,
+otherwise the same functions fall back to plain Python with identical results.
+"""
+
+from collections import Counter
+from typing import Dict, Iterable, List
+
+try:
+    import numpy as np  # optional dependency
+except ImportError:
+    np = None
+
+
+def _floats(values: Iterable) -> List[float]:
+    return [float(value) if value is not None else 0.0 for value in values]
+
+
+def discount_insights(history: List[Dict]) -> Dict:
+    """
+    Customer discount insights from purchase history rows (newest first) with
+    discount_percentage, savings and date: most common and average discount,
+    purchases, total savings and last visit.
+    """
+    insights = {
+        'most_common_discount': None,
+        'total_purchases': 0,
+        'total_savings': 0,
+        'average_discount': 0,
+        'last_visit': None
+    }
+    if not history:
+        return insights
+
+    discounts = [row['discount_percentage'] for row in history]
+    savings = _floats(row['savings'] for row in history)
+    discounted = [discount for discount in discounts if discount]
+
+    if discounted:
+        # Counter keeps first-seen order, so ties resolve like the original loop's max()
+        insights['most_common_discount'] = Counter(discounted).most_common(1)[0][0]
+        if np is not None:
+            total_discount = float(np.sum(np.asarray(_floats(discounted))))
+        else:
+            total_discount = sum(_floats(discounted))
+        insights['average_discount'] = round(total_discount / len(history), 1)
+
+    insights['total_purchases'] = len(history)
+    insights['total_savings'] = float(np.sum(np.asarray(savings))) if np is not None else sum(savings)
+    insights['last_visit'] = history[0]['date']  # history is ordered by date DESC
+    return insights
@@ -0,0 +1,190 @@
+"""
+Daily Sales Rollup
+Pre-aggregated sales for the staff reports, so they no longer re-join orders x order_items x
+products over the whole history on every dashboard load.
+
+- sales_daily: revenue, profit, units and order count per day x product x category
+  (product_id/category_id 0 for lines whose product was deleted)
+- sales_daily_totals: completed order count and order total (after discounts) per day,
+  since distinct orders cannot be summed across product rows
+
+A day is rebuilt from the completed orders of that day, so refreshing is idempotent:
+call refresh_orders() after committing a completion, cancellation or item change, and
+rebuild() (rebuild_sales_rollup.py) to repair or backfill any range. on_change is told
+which days changed (also before the tables exist) so report caches can drop them. Until the tables
+exist, source()/totals_source() return the same aggregation as a live derived table so
+report queries have a single shape either way.
+"""
+
+import logging
+from datetime import date, datetime, timedelta
+from typing import Callable, Iterable, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+# Rows of one day x product x category, shared by the refresh INSERT and the live fallback
+_PRODUCT_ROWS_SQL = """
+    SELECT DATE(o.order_date) AS sale_date,
+           COALESCE(oi.product_id, 0) AS product_id,
+           COALESCE(p.category_id, 0) AS category_id,
+           SUM(oi.quantity * oi.price) AS revenue,
+           COALESCE(SUM(oi.quantity * (oi.price - p.original_price)), 0) AS profit,
+           SUM(oi.quantity) AS units,
+           COUNT(DISTINCT o.id) AS order_count
+    FROM orders o
+    JOIN order_items oi ON oi.order_id = o.id
+    LEFT JOIN products p ON p.id = oi.product_id
+    WHERE o.status = 'COMPLETED'
+    AND o.order_date >= %s AND o.order_date < %s
+    GROUP BY DATE(o.order_date), COALESCE(oi.product_id, 0), COALESCE(p.category_id, 0)
+"""
+
+_TOTALS_SQL = """
+    SELECT DATE(o.order_date) AS sale_date,
+           COUNT(*) AS order_count,
+           COALESCE(SUM(o.total_amount), 0) AS order_total
+    FROM orders o
+    WHERE o.status = 'COMPLETED'
+    AND o.order_date >= %s AND o.order_date < %s
+    GROUP BY DATE(o.order_date)
+"""
+
+
+def _as_date(value) -> date:
+    if isinstance(value, datetime):
+        return value.date()
+    if isinstance(value, date):
+        return value
+    return datetime.strptime(str(value).strip()[:10], '%Y-%m-%d').date()
+
+
+def _bounds(start, end) -> Tuple[str, str]:
+    """[start 00:00, day after end 00:00) for an inclusive day range"""
+    return (_as_date(start).strftime('%Y-%m-%d 00:00:00'),
+            (_as_date(end) + timedelta(days=1)).strftime('%Y-%m-%d 00:00:00'))
+
+
+class SalesRollup:
+    """Refreshes and reads the rollup tables; is_enabled reports whether the migration has run"""
+
+    def __init__(self, connect: Callable, is_enabled: Callable[[], bool],
+                 on_change: Optional[Callable[[List[date]], None]] = None):
+        self._connect = connect
+        self._is_enabled = is_enabled
+        self._on_change = on_change
+
+    def enabled(self) -> bool:
+        try:
+            return bool(self._is_enabled())
+        except Exception as e:
+            logger.warning(f"Could not check for sales_daily table: {e}")
+            return False
+
+    # Read side
+
+    def source(self, start, end) -> Tuple[str, List]:
+        """FROM fragment (aliased sd) of product rows covering at least [start, end]"""
+        if self.enabled():
+            return "sales_daily sd", []
+        return f"({_PRODUCT_ROWS_SQL}) sd", list(_bounds(start, end))
+
+    def totals_source(self, start, end) -> Tuple[str, List]:
+        """FROM fragment (aliased st) of per-day order totals covering at least [start, end]"""
+        if self.enabled():
+            return "sales_daily_totals st", []
+        return f"({_TOTALS_SQL}) st", list(_bounds(start, end))
+
+    # Write side
+
+    def _refresh_range(self, cur, start, end):
+        """Replace the rollup rows of every day in [start, end] from the orders tables"""
+        start_day, end_day = _as_date(start), _as_date(end)
+        bounds = _bounds(start_day, end_day)
+        cur.execute("DELETE FROM sales_daily WHERE sale_date BETWEEN %s AND %s", (start_day, end_day))
+        cur.execute("DELETE FROM sales_daily_totals WHERE sale_date BETWEEN %s AND %s", (start_day, end_day))
+        cur.execute(f"""
+            INSERT INTO sales_daily (sale_date, product_id, category_id, revenue, profit, units, order_count)
+            {_PRODUCT_ROWS_SQL}
+        """, bounds)
+        cur.execute(f"""
+            INSERT INTO sales_daily_totals (sale_date, order_count, order_total)
+            {_TOTALS_SQL}
+        """, bounds)
+
+    def refresh_days(self, days: Iterable):
+        """Rebuild the given days in their own transaction; failures are logged, not raised"""
+        days = sorted({_as_date(day) for day in days if day})
+        if not days:
+            return
+        if self._on_change:
+            try:
+                self._on_change(days)
+            except Exception as e:
+                logger.warning(f"Sales change callback failed for {days}: {e}")
+        if not self.enabled():
+            return
+        conn = self._connect()
+        cur = conn.cursor()
+        try:
+            for day in days:
+                self._refresh_range(cur, day, day)
+            conn.commit()
+        except Exception as e:
+            conn.rollback()
+            logger.warning(f"Could not refresh sales rollup for {days}: {e} - run rebuild_sales_rollup.py to repair")
+        finally:
+            cur.close()
+            conn.close()
+
+    def refresh_orders(self, order_ids: Iterable[int]):
+        """
+        Rebuild the days of the given orders. Call after the status or item change has been
+        committed: the refresh commits on the same request connection.
+        """
+        ids = sorted({int(order_id) for order_id in order_ids if order_id})
+        if not ids or (self._on_change is None and not self.enabled()):
+            return
+        conn = self._connect()
+        cur = conn.cursor()
+        try:
+            cur.execute(f"""
+                SELECT DISTINCT DATE(order_date)
+                FROM orders
+                WHERE id IN ({','.join(['%s'] * len(ids))})
+            """, ids)
+            days = [row[0] for row in cur.fetchall()]
+        except Exception as e:
+            logger.warning(f"Could not look up order dates for sales rollup: {e}")
+            return
+        finally:
+            cur.close()
+            conn.close()
+        self.refresh_days(days)
+
+    def rebuild(self, conn, start=None, end=None, progress: Optional[Callable] = None) -> Tuple[Optional[date], Optional[date]]:
+        """Rebuild [start, end] (defaults: first to last order), committing one month at a time"""
+        cur = conn.cursor()
+        try:
+            if start is None or end is None:
+                cur.execute("SELECT MIN(order_date), MAX(order_date) FROM orders")
+                first, last = cur.fetchone()
+                if first is None:
+                    return None, None
+                start = start or first
+                end = end or last
+            start_day, end_day = _as_date(start), _as_date(end)
+            chunk_start = start_day
+            while chunk_start <= end_day:
+                next_month = (chunk_start.replace(day=1) + timedelta(days=32)).replace(day=1)
+                chunk_end = min(end_day, next_month - timedelta(days=1))
+                self._refresh_range(cur, chunk_start, chunk_end)
+                conn.commit()
+                if progress:
+                    progress(chunk_start, chunk_end)
+                chunk_start = chunk_end + timedelta(days=1)
+            return start_day, end_day
+        except Exception:
+            conn.rollback()
+            raise
+        finally:
+            cur.close()
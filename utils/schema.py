@@ -0,0 +1,95 @@
+"""
+Schema Capabilities Registry
+Introspects optional columns and indexes (added by the migration scripts) once per process so
+model methods can check for them in memory instead of running SHOW COLUMNS on every call.
+"""
+
+import threading
+from typing import Callable, Dict, Set
+
+# Columns that only exist after a migration script has been run
+OPTIONAL_COLUMNS = {
+    'products': ('archived', 'deleted', 'deleted_at', 'deleted_by', 'discount_percentage', 'slug'),
+    'orders': ('approval_status', 'approval_date', 'approved_by', 'approval_notes',
+               'payment_method', 'payment_session_id', 'payment_verification_status',
+               'payment_screenshot_path', 'transaction_id'),
+    'customers': ('email_key', 'name_key', 'name_rev_key', 'phone_key', 'order_count'),
+    # Tables created by migration scripts (checked with has_table)
+    'stock_reservations': ('order_id',),
+    'idempotency_keys': ('idempotency_key',),
+    'sales_daily': ('sale_date',),
+    'sales_daily_totals': ('sale_date',),
+    'jobs': ('id',),
+}
+
+# Indexes that only exist after a migration script has been run (checked with has_index)
+OPTIONAL_INDEXES = {
+    'customers': ('ft_customers_search',),
+}
+
+
+class SchemaCapabilities:
+    """Column sets of the tables in OPTIONAL_COLUMNS (and index names of OPTIONAL_INDEXES), loaded from information_schema"""
+
+    def __init__(self, connect: Callable):
+        self._connect = connect
+        self._columns: Dict[str, Set[str]] = {}
+        self._indexes: Dict[str, Set[str]] = {}
+        self._loaded = False
+        self._lock = threading.Lock()
+
+    def load(self):
+        """(Re)introspect the schema. Call again after running a migration in a live process."""
+        tables = tuple(OPTIONAL_COLUMNS)
+        conn = self._connect()
+        cur = conn.cursor()
+        try:
+            cur.execute(f"""
+                SELECT TABLE_NAME, COLUMN_NAME
+                FROM INFORMATION_SCHEMA.COLUMNS
+                WHERE TABLE_SCHEMA = DATABASE()
+                AND TABLE_NAME IN ({','.join(['%s'] * len(tables))})
+            """, tables)
+            columns: Dict[str, Set[str]] = {table: set() for table in tables}
+            for table_name, column_name in cur.fetchall():
+                columns.setdefault(table_name.lower(), set()).add(column_name.lower())
+
+            index_tables = tuple(OPTIONAL_INDEXES)
+            cur.execute(f"""
+                SELECT DISTINCT TABLE_NAME, INDEX_NAME
+                FROM INFORMATION_SCHEMA.STATISTICS
+                WHERE TABLE_SCHEMA = DATABASE()
+                AND TABLE_NAME IN ({','.join(['%s'] * len(index_tables))})
+            """, index_tables)
+            indexes: Dict[str, Set[str]] = {table: set() for table in index_tables}
+            for table_name, index_name in cur.fetchall():
+                indexes.setdefault(table_name.lower(), set()).add(index_name.lower())
+        finally:
+            cur.close()
+            conn.close()
+        with self._lock:
+            self._columns = columns
+            self._indexes = indexes
+            self._loaded = True
+
+    def has_column(self, table: str, column: str) -> bool:
+        if not self._loaded:
+            self.load()
+        return column.lower() in self._columns.get(table.lower(), ())
+
+    def has_table(self, table: str) -> bool:
+        if not self._loaded:
+            self.load()
+        return bool(self._columns.get(table.lower()))
+
+    def has_index(self, table: str, index: str) -> bool:
+        if not self._loaded:
+            self.load()
+        return index.lower() in self._indexes.get(table.lower(), ())
+
+    def snapshot(self) -> Dict[str, Dict[str, bool]]:
+        """Which optional columns are present, e.g. for a diagnostics endpoint or startup log"""
+        return {
+            table: {column: self.has_column(table, column) for column in columns}
+            for table, columns in OPTIONAL_COLUMNS.items()
+        }
@@ -0,0 +1,277 @@
+"""
+Stock Reservations
+TTL holds on product stock for orders that are waiting for a QR payment.
+
+Available stock is products.stock minus active, unexpired holds. A hold turns into
+a real stock decrement when the payment is confirmed ('converted'); holds of abandoned
+payments stop counting once expires_at passes and are marked 'expired' in bulk by
+ReservationSweeper; holds of orders cancelled before payment are 'released'.
+"""
+
+import logging
+import threading
+import time
+from typing import Callable, Dict, Iterable, Optional
+
+from utils import checkout_engine
+
+logger = logging.getLogger(__name__)
+
+SWEEP_BATCH_SIZE = 1000
+
+
+def _row_values(row, *keys):
+    """Read columns from either a dictionary or a tuple cursor row"""
+    if isinstance(row, dict):
+        return tuple(row[key] for key in keys)
+    return tuple(row[:len(keys)])
+
+
+def restore_quantity(released: Dict[int, int], product_id: int, quantity: int) -> int:
+    """
+    How much of a cancelled line must go back to products.stock.
+    Held units were never taken from stock, so they are consumed from `released` first.
+    """
+    held = min(released.get(product_id, 0), quantity)
+    if held:
+        released[product_id] -= held
+    return quantity - held
+
+
+class StockReservations:
+    """
+    Hold, convert and release operations on the stock_reservations table.
+    Every method works on the caller's cursor and never commits. All methods are
+    no-ops until the table exists (run_stock_reservation_migration.py).
+    """
+
+    def __init__(self, is_enabled: Callable[[], bool], hold_ttl: int = 900):
+        self._is_enabled = is_enabled
+        self.hold_ttl = hold_ttl
+
+    def enabled(self) -> bool:
+        try:
+            return bool(self._is_enabled())
+        except Exception as e:
+            logger.warning(f"Could not check for stock_reservations table: {e}")
+            return False
+
+    def held_quantities(self, cur, product_ids: Iterable[int]) -> Dict[int, int]:
+        """Units held by active, unexpired reservations per product"""
+        ids = sorted({int(product_id) for product_id in product_ids if product_id is not None})
+        if not ids or not self.enabled():
+            return {}
+        cur.execute(f"""
+            SELECT product_id, SUM(quantity) AS held
+            FROM stock_reservations
+            WHERE status = 'active' AND expires_at > NOW()
+            AND product_id IN ({','.join(['%s'] * len(ids))})
+            GROUP BY product_id
+        """, ids)
+        held = {}
+        for row in cur.fetchall():
+            product_id, quantity = _row_values(row, 'product_id', 'held')
+            held[product_id] = int(quantity or 0)
+        return held
+
+    def attach_available_stock(self, cur, products: Iterable[Dict]):
+        """Set product['available_stock'] = stock - held on each product dict"""
+        products = [product for product in products if product]
+        held = self.held_quantities(cur, (product['id'] for product in products))
+        for product in products:
+            product['available_stock'] = max(0, int(product.get('stock') or 0) - held.get(product['id'], 0))
+
+    def hold(self, cur, order_id: int, quantities: Dict[int, int], ttl: Optional[int] = None):
+        """Create one hold per product for an order, expiring after ttl seconds"""
+        if not quantities or not self.enabled():
+            return
+        ttl = int(ttl if ttl is not None else self.hold_ttl)
+        cur.executemany("""
+            INSERT INTO stock_reservations (order_id, product_id, quantity, status, expires_at)
+            VALUES (%s, %s, %s, 'active', NOW() + INTERVAL %s SECOND)
+        """, [(order_id, product_id, quantity, ttl) for product_id, quantity in sorted(quantities.items())])
+
+    def has_holds(self, cur, order_id: int) -> bool:
+        """Whether the order's stock is (or was) held rather than decremented at checkout"""
+        if not self.enabled():
+            return False
+        cur.execute("SELECT 1 FROM stock_reservations WHERE order_id = %s LIMIT 1", (order_id,))
+        return cur.fetchone() is not None
+
+    def convert(self, cur, order_id: int) -> Dict[int, int]:
+        """
+        Payment confirmed: turn the order's holds into stock decrements (one UPDATE plus
+        ledger rows). Must run inside a transaction: the holds are claimed with
+        SELECT ... FOR UPDATE, so when two confirmations race the second one finds them
+        already converted and decrements nothing. Holds that already expired are converted
+        too, since the customer paid, but only if their units are still available (stock
+        less other orders' active holds); otherwise InsufficientStockError is raised.
+        Returns {product_id: quantity decremented}.
+        """
+        if not self.enabled():
+            return {}
+        cur.execute("""
+            SELECT id, product_id, quantity, (status = 'expired' OR expires_at <= NOW()) AS lapsed
+            FROM stock_reservations
+            WHERE order_id = %s AND status IN ('active', 'expired')
+            ORDER BY id
+            FOR UPDATE
+        """, (order_id,))
+        holds = [_row_values(row, 'id', 'product_id', 'quantity', 'lapsed') for row in cur.fetchall()]
+        if not holds:
+            return {}
+
+        quantities: Dict[int, int] = {}
+        lapsed_products = set()
+        for _, product_id, quantity, lapsed in holds:
+            quantities[product_id] = quantities.get(product_id, 0) + int(quantity)
+            if lapsed:
+                lapsed_products.add(product_id)
+
+        locked = checkout_engine.lock_products(cur, quantities)
+        if lapsed_products:
+            # Lapsed units stopped counting as held, so other orders may have taken them since
+            checkout_engine.check_stock(
+                locked,
+                {product_id: quantities[product_id] for product_id in lapsed_products},
+                self._held_by_others(cur, order_id, lapsed_products),
+            )
+
+        hold_ids = [hold_id for hold_id, _, _, _ in holds]
+        cur.execute(f"""
+            UPDATE stock_reservations
+            SET status = 'converted', released_at = NOW()
+            WHERE id IN ({','.join(['%s'] * len(hold_ids))}) AND status IN ('active', 'expired')
+        """, hold_ids)
+        checkout_engine.apply_stock_changes(cur, quantities)
+        return quantities
+
+    def _held_by_others(self, cur, order_id: int, product_ids: Iterable[int]) -> Dict[int, int]:
+        """Units of each product held by other orders' active, unexpired reservations"""
+        ids = sorted(product_ids)
+        cur.execute(f"""
+            SELECT product_id, SUM(quantity) AS held
+            FROM stock_reservations
+            WHERE status = 'active' AND expires_at > NOW() AND order_id <> %s
+            AND product_id IN ({','.join(['%s'] * len(ids))})
+            GROUP BY product_id
+        """, [order_id] + ids)
+        held = {}
+        for row in cur.fetchall():
+            product_id, quantity = _row_values(row, 'product_id', 'held')
+            held[product_id] = int(quantity or 0)
+        return held
+
+    def release(self, cur, order_id: int, quantities: Optional[Dict[int, int]] = None) -> Dict[int, int]:
+        """
+        Order (or part of it) cancelled before payment: release its unconverted holds,
+        at most `quantities` per product when given. Returns {product_id: units released},
+        i.e. units that were never taken from products.stock and must not be restored.
+        """
+        if not self.enabled():
+            return {}
+        cur.execute("""
+            SELECT id, product_id, quantity
+            FROM stock_reservations
+            WHERE order_id = %s AND status IN ('active', 'expired')
+            ORDER BY id
+            FOR UPDATE
+        """, (order_id,))
+        holds = [_row_values(row, 'id', 'product_id', 'quantity') for row in cur.fetchall()]
+
+        released: Dict[int, int] = {}
+        remaining = dict(quantities) if quantities is not None else None
+        release_ids = []
+        for hold_id, product_id, quantity in holds:
+            if remaining is None:
+                take = quantity
+            else:
+                take = min(quantity, remaining.get(product_id, 0))
+                if not take:
+                    continue
+                remaining[product_id] -= take
+            released[product_id] = released.get(product_id, 0) + take
+            if take == quantity:
+                release_ids.append(hold_id)
+            else:
+                cur.execute("UPDATE stock_reservations SET quantity = quantity - %s WHERE id = %s", (take, hold_id))
+
+        if release_ids:
+            cur.execute(f"""
+                UPDATE stock_reservations
+                SET status = 'released', released_at = NOW()
+                WHERE id IN ({','.join(['%s'] * len(release_ids))})
+            """, release_ids)
+        return released
+
+    def release_expired(self, cur, batch_size: int = SWEEP_BATCH_SIZE) -> int:
+        """Mark up to batch_size expired holds as released in one statement; returns the count"""
+        if not self.enabled():
+            return 0
+        cur.execute("""
+            UPDATE stock_reservations
+            SET status = 'expired', released_at = NOW()
+            WHERE status = 'active' AND expires_at <= NOW()
+            LIMIT %s
+        """, (batch_size,))
+        return cur.rowcount
+
+
+class ReservationSweeper:
+    """Background thread that releases expired holds in bulk every `interval` seconds"""
+
+    def __init__(self, reservations: StockReservations, connect: Callable, app=None,
+                 interval: int = 60, on_release: Optional[Callable[[int], None]] = None):
+        self.reservations = reservations
+        self.connect = connect
+        self.app = app
+        self.interval = interval
+        self.on_release = on_release
+        self.running = False
+        self.thread = None
+
+    def start(self):
+        if self.running:
+            return
+        self.running = True
+        self.thread = threading.Thread(target=self._loop, daemon=True)
+        self.thread.start()
+        logger.info(f"Stock reservation sweeper started (every {self.interval} seconds)")
+
+    def stop(self):
+        self.running = False
+        if self.thread:
+            self.thread.join()
+
+    def sweep(self) -> int:
+        """Release every expired hold, in batches; returns the number released"""
+        total = 0
+        conn = self.connect()
+        cur = conn.cursor()
+        try:
+            while True:
+                released = self.reservations.release_expired(cur)
+                conn.commit()
+                total += released
+                if released < SWEEP_BATCH_SIZE:
+                    break
+        finally:
+            cur.close()
+            conn.close()
+        if total:
+            logger.info(f"Released {total} expired stock reservations")
+            if self.on_release:
+                self.on_release(total)
+        return total
+
+    def _loop(self):
+        while self.running:
+            try:
+                if self.app:
+                    with self.app.app_context():
+                        self.sweep()
+                else:
+                    self.sweep()
+            except Exception as e:
+                logger.error(f"Error releasing expired stock reservations: {e}")
+            time.sleep(self.interval)
@@ -0,0 +1,48 @@
+"""
+Volume Discount Rules
+Active volume discount rules kept in a sorted array so the best rule for a cart total
+is a binary search instead of a volume_discount_rules query on every order and cart change.
+"""
+
+from bisect import bisect_right
+from typing import Dict, Iterable, Optional
+
+
+class VolumeDiscountIndex:
+    """Active rules sorted by minimum_amount; the best rule is the one with the highest minimum <= total"""
+
+    def __init__(self, rules: Iterable[Dict] = ()):
+        self.rules = sorted(
+            ({'id': rule['id'], 'name': rule['name'],
+              'minimum_amount': float(rule['minimum_amount']),
+              'discount_percentage': float(rule['discount_percentage'])} for rule in rules),
+            key=lambda rule: (rule['minimum_amount'], rule['id'])
+        )
+        self.minimums = [rule['minimum_amount'] for rule in self.rules]
+
+    def best_rule(self, amount: float) -> Optional[Dict]:
+        i = bisect_right(self.minimums, float(amount))
+        return dict(self.rules[i - 1]) if i else None
+
+    def tiers(self):
+        """Rules in ascending order, e.g. for the cart page to show the next tier"""
+        return [dict(rule) for rule in self.rules]
+
+
+def quote_volume_discount(subtotal: float, index: VolumeDiscountIndex) -> Dict:
+    """
+    Pure pricing function: the volume discount for a subtotal under the given rules.
+    Amounts are not rounded, matching what checkout stores on the order.
+    """
+    subtotal = float(subtotal)
+    rule = index.best_rule(subtotal) if subtotal > 0 else None
+    percentage = rule['discount_percentage'] if rule else 0.0
+    discount_amount = subtotal * (percentage / 100.0)
+    return {
+        'applicable': rule is not None,
+        'rule_id': rule['id'] if rule else None,
+        'rule_name': rule['name'] if rule else None,
+        'discount_percentage': percentage,
+        'discount_amount': discount_amount,
+        'final_total': subtotal - discount_amount,
+    }